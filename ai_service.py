@@ -73,7 +73,8 @@ Kullanici mesajlarini analiz et ve asagidaki JSON formatinda yanit ver:
     "target": "Hedef aciklamasi (varsa)",
     "days": 7,
     "reminder_title": "Hatirlatma basligi",
-    "remind_at": "HH:MM formatinda saat",
+    "remind_at": "HH:MM veya HH:MM:SS formatinda saat",
+    "remind_in_seconds": "Goreli sure istenirse ('90 saniye sonra', '10 dakika sonra') saniye cinsinden sayi, yoksa null",
     "remind_date": "YYYY-MM-DD formatinda tarih",
     "is_recurring": false,
     "task_title": "Gorev basligi",
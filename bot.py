@@ -7,7 +7,11 @@ from telegram import Update
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
 
 import database
-from config import TELEGRAM_BOT_TOKEN
+import storage
+from config import (
+    TELEGRAM_BOT_TOKEN, ADMIN_USER_IDS, REMINDER_START_HOUR, REMINDER_END_HOUR,
+    HOMEWORK_REMINDER_TIME, VOCAB_REMINDER_TIME, WORD_GOAL_REMINDER_TIME, JOURNAL_REMINDER_TIME
+)
 import scheduler
 import voice_service
 import logging
@@ -38,6 +42,18 @@ modules = {
 }
 
 
+async def get_db_user(user) -> dict:
+    """Telegram kullanıcısının kaydını getir (bilinen kullanıcılar önbellekten, thread'e gitmeden)"""
+    db_user = database.get_cached_user(user.id, user.username, user.first_name)
+    if db_user is None:
+        db_user = await database.aio.get_or_create_user(
+            telegram_id=user.id,
+            username=user.username,
+            first_name=user.first_name
+        )
+    return db_user
+
+
 # ==================== ANA MENÜ ====================
 
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -45,11 +61,7 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     
     # Kullanıcıyı veritabanına kaydet
-    db_user = database.get_or_create_user(
-        telegram_id=user.id,
-        username=user.username,
-        first_name=user.first_name
-    )
+    db_user = await get_db_user(user)
     
     # Timezone bilgisini al
     user_tz = db_user.get('timezone', 'Europe/Istanbul')
@@ -107,8 +119,8 @@ async def timezone_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return
 
-    db_user = database.get_or_create_user(user.id)
-    database.update_user_timezone(db_user['id'], new_timezone)
+    db_user = await get_db_user(user)
+    await database.aio.update_user_timezone(db_user['id'], new_timezone)
     
     await update.message.reply_text(
         f"✅ Zaman dilimi güncellendi: `{new_timezone}`\n"
@@ -117,14 +129,123 @@ async def timezone_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
 
 
+async def digest_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Bildirim özetini aç/kapat (aynı anda gelen bildirimler tek mesajda)"""
+    user = update.effective_user
+    db_user = await get_db_user(user)
+    
+    choice = context.args[0].lower() if context.args else None
+    if choice not in ('ac', 'aç', 'kapat'):
+        status = "açık ✅" if db_user.get('digest_enabled') else "kapalı"
+        await update.message.reply_text(
+            f"🔔 *Bildirim Özeti:* {status}\n\n"
+            f"Açıkken aynı anda gelen hatırlatmalar (alışkanlık, ödev, kelime...) tek mesajda toplanır.\n\n"
+            f"`/ozet ac` - Aç\n"
+            f"`/ozet kapat` - Kapat",
+            parse_mode='Markdown'
+        )
+        return
+    
+    enabled = choice != 'kapat'
+    await database.aio.set_user_digest(db_user['id'], enabled)
+    
+    await update.message.reply_text(
+        "✅ Bildirim özeti açıldı. Aynı anda gelen bildirimler tek mesajda gelecek."
+        if enabled else
+        "✅ Bildirim özeti kapatıldı. Her bildirim ayrı mesaj olarak gelecek."
+    )
+
+
+# /bildirim <tür> <saat>: tür -> (user_settings kolonu, varsayılan saat, açıklama)
+NOTIFICATION_TIMES = {
+    'odev': ('homework_time', HOMEWORK_REMINDER_TIME, "📚 Ödev hatırlatması"),
+    'kelime': ('vocab_time', VOCAB_REMINDER_TIME, "🇬🇧 Kelime tekrarı"),
+    'hedef': ('goal_time', WORD_GOAL_REMINDER_TIME, "🎯 Kelime hedefi"),
+    'gunluk': ('journal_time', JOURNAL_REMINDER_TIME, "📔 Günlük hatırlatması"),
+}
+RESET_WORDS = ('varsayilan', 'varsayılan', 'sifirla', 'sıfırla')
+
+
+def _parse_hhmm(text: str):
+    """'9:30' / '09.30' -> '09:30'; geçersizse None"""
+    parts = text.replace('.', ':').split(':')
+    if len(parts) != 2 or not all(part.isdigit() for part in parts):
+        return None
+    hour, minute = int(parts[0]), int(parts[1])
+    return f"{hour:02d}:{minute:02d}" if hour < 24 and minute < 60 else None
+
+
+def _format_notification_settings(settings: dict, db_user: dict) -> str:
+    quiet_start = REMINDER_END_HOUR if settings['quiet_start'] is None else settings['quiet_start']
+    quiet_end = REMINDER_START_HOUR if settings['quiet_end'] is None else settings['quiet_end']
+    lines = ["🔔 *Bildirim Ayarların*\n"]
+    for column, default, label in NOTIFICATION_TIMES.values():
+        lines.append(f"{label}: {settings[column] or default}" + ("" if settings[column] else " (varsayılan)"))
+    lines.append(f"🌙 Sessiz saatler: {quiet_start:02d}:00 - {quiet_end:02d}:00")
+    muted = settings['muted_modules']
+    lines.append(f"🔕 Susturulan modüller: {', '.join(muted) if muted else 'yok'}")
+    lines.append(f"📨 Özet: {'açık' if db_user.get('digest_enabled') else 'kapalı'} (`/ozet`)")
+    lines.append(
+        "\n*Değiştirmek için:*\n"
+        "`/bildirim odev 19:30` (kelime, hedef, gunluk)\n"
+        "`/bildirim odev varsayilan`\n"
+        "`/bildirim sessiz 23 7` - Alışkanlık hatırlatması 23:00-07:00 arası gelmez\n"
+        f"`/bildirim kapat ders` / `/bildirim ac ders` ({', '.join(database.MUTABLE_MODULES)})"
+    )
+    return "\n".join(lines)
+
+
+async def notification_settings_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Bildirim saatleri, sessiz saatler ve modül susturma"""
+    user = update.effective_user
+    db_user = await get_db_user(user)
+    args = [arg.lower() for arg in context.args or []]
+    
+    settings = await database.aio.get_user_settings(db_user['id'])
+    changes = None
+    
+    if len(args) == 2 and args[0] in NOTIFICATION_TIMES:
+        column = NOTIFICATION_TIMES[args[0]][0]
+        value = None if args[1] in RESET_WORDS else _parse_hhmm(args[1])
+        if value is None and args[1] not in RESET_WORDS:
+            await update.message.reply_text("❌ Saat HH:MM biçiminde olmalı. Örnek: `/bildirim odev 19:30`",
+                                            parse_mode='Markdown')
+            return
+        changes = {column: value}
+    elif args[:1] == ['sessiz'] and len(args) in (2, 3):
+        if len(args) == 2 and args[1] in RESET_WORDS:
+            changes = {'quiet_start': None, 'quiet_end': None}
+        elif len(args) == 3 and all(arg.isdigit() and int(arg) < 24 for arg in args[1:]):
+            changes = {'quiet_start': int(args[1]), 'quiet_end': int(args[2])}
+        else:
+            await update.message.reply_text("❌ Örnek: `/bildirim sessiz 23 7` (saat 0-23)", parse_mode='Markdown')
+            return
+    elif len(args) == 2 and args[0] in ('kapat', 'ac', 'aç'):
+        if args[1] not in database.MUTABLE_MODULES:
+            await update.message.reply_text(
+                f"❌ Bildirimi olan modüller: {', '.join(database.MUTABLE_MODULES)}"
+            )
+            return
+        muted = set(settings['muted_modules'])
+        if args[0] == 'kapat':
+            muted.add(args[1])
+        else:
+            muted.discard(args[1])
+        changes = {'muted_modules': muted}
+    
+    if changes is not None:
+        settings = await database.aio.update_user_settings(db_user['id'], **changes)
+    
+    await update.message.reply_text(
+        ("✅ Kaydedildi.\n\n" if changes is not None else "") + _format_notification_settings(settings, db_user),
+        parse_mode='Markdown'
+    )
+
+
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Yardım komutu"""
     user = update.effective_user
-    db_user = database.get_or_create_user(
-        telegram_id=user.id,
-        username=user.username,
-        first_name=user.first_name
-    )
+    db_user = await get_db_user(user)
     
     current_module = database.get_user_current_module(db_user['id'])
     
@@ -145,6 +266,8 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 `/start` - Ana menü
 `/help` - Yardım
 `/timezone` - Saat ayarı
+`/ozet` - Bildirim özeti (aç/kapat)
+`/bildirim` - Bildirim saatleri, sessiz saatler, modül susturma
 `/modul` - Aktif modül
 
 Modül değiştirmek için yukarıdaki komutları kullan!
@@ -156,11 +279,7 @@ Modül değiştirmek için yukarıdaki komutları kullan!
 async def modul_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Aktif modülü göster"""
     user = update.effective_user
-    db_user = database.get_or_create_user(
-        telegram_id=user.id,
-        username=user.username,
-        first_name=user.first_name
-    )
+    db_user = await get_db_user(user)
     
     current_module = database.get_user_current_module(db_user['id'])
     module_instance = modules[current_module]
@@ -209,14 +328,10 @@ async def switch_module(update: Update, context: ContextTypes.DEFAULT_TYPE, modu
     user = update.effective_user
     
     # Kullanıcıyı al veya oluştur
-    db_user = database.get_or_create_user(
-        telegram_id=user.id,
-        username=user.username,
-        first_name=user.first_name
-    )
+    db_user = await get_db_user(user)
     
     # Modülü değiştir
-    database.set_user_current_module(db_user['id'], module_name)
+    await database.aio.set_user_current_module(db_user['id'], module_name)
     
     # Modülün start komutunu çağır
     module_instance = modules[module_name]
@@ -230,11 +345,7 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     
     # Kullanıcıyı al veya oluştur
-    db_user = database.get_or_create_user(
-        telegram_id=user.id,
-        username=user.username,
-        first_name=user.first_name
-    )
+    db_user = await get_db_user(user)
     
     # Kullanıcının aktif modülünü al
     current_module = database.get_user_current_module(db_user['id'])
@@ -249,11 +360,7 @@ async def handle_voice_message(update: Update, context: ContextTypes.DEFAULT_TYP
     user = update.effective_user
     
     # Kullanıcıyı al
-    db_user = database.get_or_create_user(
-        telegram_id=user.id,
-        username=user.username,
-        first_name=user.first_name
-    )
+    db_user = await get_db_user(user)
     
     # İşleniyor mesajı
     processing_msg = await update.message.reply_text("🎤 Sesli mesaj işleniyor...")
@@ -339,6 +446,29 @@ async def test_reminders_command(update: Update, context: ContextTypes.DEFAULT_T
         await update.message.reply_text(f"❌ Hata: {str(e)}", parse_mode='Markdown')
 
 
+async def cache_stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Kullanıcı önbelleği istatistikleri (yalnızca yöneticiler); /onbellek temizle ile boşaltılır"""
+    if update.effective_user.id not in ADMIN_USER_IDS:
+        return
+    
+    if context.args and context.args[0].lower() == 'temizle':
+        database.clear_user_cache()
+        await update.message.reply_text("🧹 Kullanıcı önbelleği temizlendi.")
+        return
+    
+    stats = database.get_user_cache_stats()
+    lookups = stats['hits'] + stats['misses']
+    ratio = f"%{100 * stats['hits'] / lookups:.1f}" if lookups else "-"
+    await update.message.reply_text(
+        f"🗂 *Kullanıcı Önbelleği*\n\n"
+        f"Kayıt: {stats['size']} / {database.USER_CACHE_SIZE}\n"
+        f"İsabet: {stats['hits']}\n"
+        f"Iska: {stats['misses']}\n"
+        f"İsabet oranı: {ratio}",
+        parse_mode='Markdown'
+    )
+
+
 async def post_init(application: Application):
     """Bot başlatıldıktan sonra çalışacak"""
     # Zamanlayıcıya bot'u set et
@@ -349,6 +479,13 @@ async def post_init(application: Application):
     print("⏰ Zamanlayıcı post_init içinde başlatıldı")
 
 
+async def post_shutdown(application: Application):
+    """Bot kapanırken veritabanı thread havuzunu ve bağlantıları kapat"""
+    # Tamponda bekleyen konuşma mesajlarını kaybetme
+    await database.aio.flush_conversation_messages()
+    storage.shutdown()
+
+
 # ==================== ANA FONKSİYON ====================
 
 def main():
@@ -359,8 +496,14 @@ def main():
     database.init_database()
     print("📦 Veritabanı hazır")
     
-    # Bot uygulamamasını oluştur (post_init ile)
-    application = Application.builder().token(TELEGRAM_BOT_TOKEN).post_init(post_init).build()
+    # Bot uygulamamasını oluştur (post_init / post_shutdown ile)
+    application = (
+        Application.builder()
+        .token(TELEGRAM_BOT_TOKEN)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
     
     # Genel komut işleyicileri
     application.add_handler(CommandHandler("start", start_command))
@@ -368,9 +511,12 @@ def main():
     application.add_handler(CommandHandler("yardim", help_command))
     application.add_handler(CommandHandler("modul", modul_command))
     application.add_handler(CommandHandler("timezone", timezone_command))
+    application.add_handler(CommandHandler("ozet", digest_command))
+    application.add_handler(CommandHandler("bildirim", notification_settings_command))
     
     # Debug komutu
     application.add_handler(CommandHandler("test_reminders", test_reminders_command))
+    application.add_handler(CommandHandler("onbellek", cache_stats_command))
     
     # Modül komut işleyicileri
     application.add_handler(CommandHandler("asistan", switch_to_asistan))
@@ -28,6 +28,22 @@ REMINDER_START_HOUR = int(os.getenv("REMINDER_START_HOUR", "8"))
 REMINDER_END_HOUR = int(os.getenv("REMINDER_END_HOUR", "22"))
 REMINDER_ENABLED = os.getenv("REMINDER_ENABLED", "true").lower() == "true"
 
+# Ödev hatırlatması: her gün yerel HOMEWORK_REMINDER_TIME'da, teslimine HOMEWORK_LEAD_DAYS
+# günden biri kadar kalmış ödevler (0 = teslim günü)
+HOMEWORK_REMINDER_TIME = os.getenv("HOMEWORK_REMINDER_TIME", "18:00")
+HOMEWORK_LEAD_DAYS = sorted({int(d) for d in os.getenv("HOMEWORK_LEAD_DAYS", "3,1,0").split(",") if d.strip()})
+
+# Ders başlangıç hatırlatması: dersten kaç dakika önce
+LESSON_REMINDER_LEAD_MINUTES = int(os.getenv("LESSON_REMINDER_LEAD_MINUTES", "15"))
+
+# Varsayılan günlük bildirim saatleri (yerel); kullanıcı /bildirim ile kendi saatini seçebilir
+VOCAB_REMINDER_TIME = os.getenv("VOCAB_REMINDER_TIME", "10:00")
+WORD_GOAL_REMINDER_TIME = os.getenv("WORD_GOAL_REMINDER_TIME", "20:00")
+JOURNAL_REMINDER_TIME = os.getenv("JOURNAL_REMINDER_TIME", "21:30")
+
+# Yönetici Telegram id'leri (virgülle ayrılmış) - ör. çok kullanıcılı ders programı CSV'si yükleyebilir
+ADMIN_USER_IDS = {int(i) for i in os.getenv("ADMIN_USER_IDS", "").split(",") if i.strip()}
+
 # Timezone
 TIMEZONE = os.getenv("TIMEZONE", "Europe/Istanbul")
 
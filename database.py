@@ -2,16 +2,157 @@
 Veritabanı işlemleri - SQLite ile alışkanlık ve kullanıcı yönetimi
 """
 import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
 from datetime import datetime, date, timedelta
-from typing import Optional, List, Dict, Any
-from config import DATABASE_PATH
+from typing import Optional, List, Dict, Any, Callable, Iterable, Tuple
+from config import DATABASE_PATH, TIMEZONE, REMINDER_START_HOUR, REMINDER_END_HOUR
+import storage
+import name_index
+from name_index import NameIndex
+from text_utils import normalize_turkish
+import time_utils
+import pytz
+
+
+_db = storage.register('asistan', DATABASE_PATH)
+
+# Async handler'lar için: await <modül>.aio.<fonksiyon>(...)
+aio = storage.AsyncFacade(__name__)
 
 
 def get_connection():
-    """Veritabanı bağlantısı oluştur"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """Veritabanı bağlantısını getir (thread başına havuzlanmış, kapatılmaz)"""
+    return _db.connection()
+
+
+# ==================== MİGRASYONLAR ====================
+
+def _add_user_timezone(cursor: sqlite3.Cursor):
+    """Eski veritabanlarında users.timezone kolonu yok"""
+    storage.add_column(cursor, 'users', 'timezone', "TEXT DEFAULT 'Europe/Istanbul'")
+
+
+def _add_user_digest(cursor: sqlite3.Cursor):
+    """Bildirim özeti tercihi (varsayılan kapalı)"""
+    storage.add_column(cursor, 'users', 'digest_enabled', "BOOLEAN DEFAULT 0")
+
+
+def _add_normalized_names(cursor: sqlite3.Cursor):
+    """İsim aramaları için normalize edilmiş kolonları ekle ve mevcut kayıtları doldur"""
+    for table, column, source in NORMALIZED_COLUMNS:
+        storage.add_column(cursor, table, column, "TEXT")
+    _fill_normalized_names(cursor)
+
+
+def _fill_normalized_names(cursor: sqlite3.Cursor):
+    """Normalize edilmiş kolonları kaynak kolonlardan yeniden hesapla"""
+    for table, column, source in NORMALIZED_COLUMNS:
+        cursor.execute(f"SELECT id, {', '.join(source)} FROM {table}")
+        rows = cursor.fetchall()
+        cursor.executemany(
+            f"UPDATE {table} SET {column} = ? WHERE id = ?",
+            [(_normalize_fields(*row[1:]), row[0]) for row in rows]
+        )
+
+
+def _add_reminder_next_fire(cursor: sqlite3.Cursor):
+    """Hatırlatmalara bir sonraki çalma anını (UTC) ekle; is_sent bayrağı artık kullanılmıyor"""
+    storage.add_column(cursor, 'reminders', 'next_fire_utc', "TEXT")
+    if storage.column_exists(cursor, 'reminders', 'is_sent'):
+        cursor.execute("ALTER TABLE reminders DROP COLUMN is_sent")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_reminders_next_fire ON reminders(next_fire_utc)")
+
+    cursor.execute("""
+        SELECT r.id, r.remind_at, r.remind_date, r.is_recurring, u.timezone
+        FROM reminders r LEFT JOIN users u ON u.id = r.user_id
+    """)
+    cursor.executemany(
+        "UPDATE reminders SET next_fire_utc = ? WHERE id = ?",
+        [(_reminder_next_fire(row['remind_at'], row['timezone'], row['remind_date'], row['is_recurring']), row['id'])
+         for row in cursor.fetchall()]
+    )
+
+
+# Yeni migrasyonlar listenin sonuna, artan versiyon numarasıyla eklenir
+MIGRATIONS = [
+    (1, "users.timezone kolonu", _add_user_timezone),
+    (2, "Sorgu indeksleri", """
+        CREATE INDEX IF NOT EXISTS idx_habits_user_active ON habits(user_id, is_active);
+        CREATE INDEX IF NOT EXISTS idx_habit_completions_period ON habit_completions(period_date, habit_id);
+        CREATE INDEX IF NOT EXISTS idx_reminders_user_time ON reminders(user_id, remind_at);
+        CREATE INDEX IF NOT EXISTS idx_tasks_user_completed ON tasks(user_id, is_completed);
+        CREATE INDEX IF NOT EXISTS idx_notes_user_created ON notes(user_id, created_at);
+        CREATE INDEX IF NOT EXISTS idx_conversation_user_created ON conversation_history(user_id, created_at);
+    """),
+    # Aynı güne ait tekrarlardan ilki tutulur; notları ona taşınır
+    (3, "Alışkanlık başına günde tek tamamlama (UNIQUE)", """
+        UPDATE habit_completions
+        SET notes = (
+            SELECT GROUP_CONCAT(notes, char(10)) FROM (
+                SELECT DISTINCT d.notes FROM habit_completions d
+                WHERE d.habit_id = habit_completions.habit_id
+                  AND d.period_date = habit_completions.period_date
+                  AND d.notes != ''
+            )
+        )
+        WHERE id IN (
+            SELECT MIN(id) FROM habit_completions
+            GROUP BY habit_id, period_date HAVING COUNT(*) > 1
+        );
+        DELETE FROM habit_completions
+        WHERE id NOT IN (
+            SELECT MIN(id) FROM habit_completions GROUP BY habit_id, period_date
+        );
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_habit_completions_habit_period
+            ON habit_completions(habit_id, period_date);
+    """),
+    (4, "Normalize edilmiş isim kolonları", _add_normalized_names),
+    # text_utils'e geçişte 'İ' artık 'i' oluyor; eski değerler yeniden hesaplanır
+    (5, "Normalize kolonlarını yeniden hesapla", _fill_normalized_names),
+    (6, "reminders.next_fire_utc kolonu ve indeksi", _add_reminder_next_fire),
+    (7, "Bildirim kuyruğu (outbox) ve zamanlayıcı durumu", """
+        CREATE TABLE IF NOT EXISTS notification_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            local_date DATE NOT NULL,
+            text TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_utc TEXT NOT NULL,
+            expires_utc TEXT,
+            last_error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            sent_at TIMESTAMP,
+            UNIQUE (chat_id, kind, local_date)
+        );
+        CREATE INDEX IF NOT EXISTS idx_outbox_pending
+            ON notification_outbox(next_attempt_utc) WHERE status = 'pending';
+        CREATE TABLE IF NOT EXISTS scheduler_state (
+            key TEXT PRIMARY KEY,
+            value TEXT,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """),
+    (8, "users.digest_enabled kolonu", _add_user_digest),
+    # Sadece varsayılanı değiştiren kullanıcıların satırı olur; NULL = config'deki varsayılan
+    (9, "Kullanıcı bildirim tercihleri", """
+        CREATE TABLE IF NOT EXISTS user_settings (
+            user_id INTEGER PRIMARY KEY,
+            quiet_start INTEGER,
+            quiet_end INTEGER,
+            homework_time TEXT,
+            vocab_time TEXT,
+            goal_time TEXT,
+            journal_time TEXT,
+            muted_modules TEXT NOT NULL DEFAULT '',
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        );
+    """),
+]
 
 
 def init_database():
@@ -27,17 +168,11 @@ def init_database():
             username TEXT,
             first_name TEXT,
             timezone TEXT DEFAULT 'Europe/Istanbul',
+            digest_enabled BOOLEAN DEFAULT 0,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
     """)
     
-    # Migrasyon: timezone kolonu yoksa ekle
-    try:
-        cursor.execute("SELECT timezone FROM users LIMIT 1")
-    except sqlite3.OperationalError:
-        print("Migrasyon: users tablosuna timezone kolonu ekleniyor...")
-        cursor.execute("ALTER TABLE users ADD COLUMN timezone TEXT DEFAULT 'Europe/Istanbul'")
-
     # Alışkanlıklar tablosu
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS habits (
@@ -74,7 +209,6 @@ def init_database():
             remind_at TEXT NOT NULL,
             remind_date DATE,
             is_recurring BOOLEAN DEFAULT 0,
-            is_sent BOOLEAN DEFAULT 0,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             FOREIGN KEY (user_id) REFERENCES users(id)
         )
@@ -130,7 +264,340 @@ def init_database():
     """)
     
     conn.commit()
-    conn.close()
+    
+    storage.migrate(conn, MIGRATIONS)
+
+
+# ==================== KULLANICI ÖNBELLEĞİ ====================
+
+# Her update'te get_or_create_user çağrılıyor; bilinen kullanıcılar bellekten döner
+USER_CACHE_SIZE = 10000
+
+_user_cache: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()  # telegram_id -> user (LRU)
+_user_cache_ids: Dict[int, int] = {}  # users.id -> telegram_id
+_user_cache_lock = threading.Lock()
+_user_cache_stats = {'hits': 0, 'misses': 0}
+
+
+def _cache_user(user: Dict[str, Any]):
+    """Kullanıcıyı önbelleğe yaz (en yeni olarak işaretle, gerekirse en eskiyi at)"""
+    with _user_cache_lock:
+        _user_cache[user['telegram_id']] = user
+        _user_cache.move_to_end(user['telegram_id'])
+        _user_cache_ids[user['id']] = user['telegram_id']
+        while len(_user_cache) > USER_CACHE_SIZE:
+            _, evicted = _user_cache.popitem(last=False)
+            _user_cache_ids.pop(evicted['id'], None)
+
+
+def _is_stale(user: Dict[str, Any], username: str = None, first_name: str = None) -> bool:
+    """Telegram'dan gelen isim bilgisi kayıttakinden farklı mı"""
+    return ((username is not None and username != user['username']) or
+            (first_name is not None and first_name != user['first_name']))
+
+
+def _cache_lookup(telegram_id: int, username: str = None, first_name: str = None,
+                  count_miss: bool = True) -> Optional[Dict[str, Any]]:
+    with _user_cache_lock:
+        user = _user_cache.get(telegram_id)
+        if user is None or _is_stale(user, username, first_name):
+            if count_miss:
+                _user_cache_stats['misses'] += 1
+            return None
+        _user_cache.move_to_end(telegram_id)
+        _user_cache_stats['hits'] += 1
+        return dict(user)
+
+
+def get_cached_user(telegram_id: int, username: str = None, first_name: str = None) -> Optional[Dict[str, Any]]:
+    """Kullanıcıyı sadece önbellekten getir (veritabanına gitmez)
+
+    Kayıt yoksa veya isim bilgisi değişmişse None döner; bu durumda
+    get_or_create_user çağrılmalı (ıska orada sayılır).
+    """
+    return _cache_lookup(telegram_id, username, first_name, count_miss=False)
+
+
+def get_user_cache_stats() -> Dict[str, int]:
+    """Önbellek isabet/ıska sayıları ve boyutu"""
+    with _user_cache_lock:
+        return {**_user_cache_stats, 'size': len(_user_cache)}
+
+
+def clear_user_cache():
+    """Kullanıcı önbelleğini boşalt"""
+    with _user_cache_lock:
+        _user_cache.clear()
+        _user_cache_ids.clear()
+
+
+# ==================== TIMEZONE İNDEKSİ ====================
+
+# Zamanlayıcı her tikte kullanıcıları değil timezone'ları dolaşır: timezone -> users.id
+# İlk kullanımda yüklenir; kayıt ve /timezone değişikliğinde güncellenir.
+_tz_users: Optional[Dict[str, set]] = None
+_user_tz: Dict[int, str] = {}  # users.id -> timezone
+_telegram_user_ids: Dict[int, int] = {}  # telegram_id -> users.id
+_tz_lock = threading.Lock()
+
+
+def _load_timezone_index():
+    global _tz_users
+    cursor = get_connection().cursor()
+    cursor.execute("SELECT id, telegram_id, COALESCE(timezone, ?) AS tz FROM users", (TIMEZONE,))
+    rows = cursor.fetchall()
+    with _tz_lock:
+        if _tz_users is not None:
+            return
+        buckets: Dict[str, set] = {}
+        for row in rows:
+            buckets.setdefault(row['tz'], set()).add(row['id'])
+            _user_tz[row['id']] = row['tz']
+            _telegram_user_ids[row['telegram_id']] = row['id']
+        _tz_users = buckets
+
+
+def _index_user_timezone(user_id: int, timezone: Optional[str], telegram_id: int = None):
+    """Kullanıcıyı timezone kovasına koy (eski kovasından çıkararak)"""
+    timezone = timezone or TIMEZONE
+    with _tz_lock:
+        if _tz_users is None:
+            return  # henüz yüklenmedi, yüklenirken veritabanından okunur
+        if telegram_id is not None:
+            _telegram_user_ids[telegram_id] = user_id
+        old = _user_tz.get(user_id)
+        if old == timezone:
+            return
+        if old is not None:
+            bucket = _tz_users.get(old)
+            if bucket is not None:
+                bucket.discard(user_id)
+                if not bucket:
+                    del _tz_users[old]
+        _tz_users.setdefault(timezone, set()).add(user_id)
+        _user_tz[user_id] = timezone
+
+
+def get_user_timezones() -> List[str]:
+    """En az bir kullanıcısı olan timezone'lar (bellekten)"""
+    if _tz_users is None:
+        _load_timezone_index()
+    with _tz_lock:
+        return list(_tz_users)
+
+
+def get_telegram_timezones(telegram_ids: Iterable[int]) -> Dict[int, str]:
+    """telegram_id -> timezone (bellekten; kayıtlı olmayanlar sonuçta yer almaz)"""
+    if _tz_users is None:
+        _load_timezone_index()
+    with _tz_lock:
+        return {
+            telegram_id: _user_tz[_telegram_user_ids[telegram_id]]
+            for telegram_id in telegram_ids if telegram_id in _telegram_user_ids
+        }
+
+
+# ==================== BİLDİRİM ÖZETİ TERCİHİ ====================
+
+# Bildirimlerini tek mesajda toplamak isteyen kullanıcıların telegram_id'leri
+# İlk kullanımda yüklenir; /ozet ile değişince güncellenir.
+_digest_chats: Optional[set] = None
+_digest_lock = threading.Lock()
+
+
+def get_digest_chat_ids() -> frozenset:
+    """Özeti açık kullanıcıların telegram_id'leri (bellekten)"""
+    global _digest_chats
+    if _digest_chats is None:
+        cursor = get_connection().cursor()
+        cursor.execute("SELECT telegram_id FROM users WHERE digest_enabled = 1")
+        chats = {row['telegram_id'] for row in cursor.fetchall()}
+        with _digest_lock:
+            if _digest_chats is None:
+                _digest_chats = chats
+    with _digest_lock:
+        return frozenset(_digest_chats)
+
+
+def set_user_digest(user_id: int, enabled: bool):
+    """Kullanıcının bildirim özeti tercihini kaydet"""
+    conn = get_connection()
+    with conn:
+        row = conn.execute(
+            "UPDATE users SET digest_enabled = ? WHERE id = ? RETURNING telegram_id", (int(enabled), user_id)
+        ).fetchone()
+    if not row:
+        return
+    
+    with _digest_lock:
+        if _digest_chats is not None:
+            if enabled:
+                _digest_chats.add(row['telegram_id'])
+            else:
+                _digest_chats.discard(row['telegram_id'])
+    
+    with _user_cache_lock:
+        if row['telegram_id'] in _user_cache:
+            _user_cache[row['telegram_id']] = {**_user_cache[row['telegram_id']], 'digest_enabled': int(enabled)}
+
+
+# ==================== BİLDİRİM TERCİHLERİ ====================
+
+# Bildirim türü -> (modül, saat kolonu). Saat kolonu olan türlerde kullanıcı kendi yerel
+# saatini seçebilir; alışkanlık hatırlatması sessiz saatler dışında her saat başı çalışır.
+NOTIFICATION_TYPES = {
+    'habits': ('asistan', None),
+    'lessons': ('ders', None),
+    'homework': ('ders', 'homework_time'),
+    'vocab': ('ingilizce', 'vocab_time'),
+    'goal': ('ingilizce', 'goal_time'),
+    'journal': ('notdefteri', 'journal_time'),
+}
+MUTABLE_MODULES = ('asistan', 'ders', 'ingilizce', 'notdefteri')
+SETTINGS_COLUMNS = ('quiet_start', 'quiet_end', 'homework_time', 'vocab_time', 'goal_time',
+                    'journal_time', 'muted_modules')
+
+# Zamanlayıcı bu indekse (timezone, yerel günün dakikası) ile bakar:
+#   slots: (timezone, dakika) -> {tür: o dakikada kendi saati gelen telegram_id'ler}
+#   exclusions: tür -> varsayılan saatteki çalışmada atlanacaklar (modülü susturan veya
+#               kendi saatini seçen); susturulan modülün sorguları bu kullanıcılara hiç bakmaz
+# İlk kullanımda yüklenir; tercih veya timezone değişince atılır.
+_notification_schedule: Optional[Tuple[Dict[Tuple[str, int], Dict[str, frozenset]], Dict[str, frozenset]]] = None
+_notification_schedule_version = 0  # yükleme sırasında temizlenirse eski veri kurulmasın
+_notification_schedule_lock = threading.Lock()
+
+
+def _minute_of_day(hhmm: Optional[str]) -> Optional[int]:
+    """'09:30' -> 570; geçersiz değer için None"""
+    try:
+        hour, minute = (int(part) for part in hhmm.split(':')[:2])
+    except (ValueError, AttributeError):
+        return None
+    return hour * 60 + minute if 0 <= hour < 24 and 0 <= minute < 60 else None
+
+
+def is_quiet_hour(hour: int, quiet_start: int = None, quiet_end: int = None) -> bool:
+    """Saat sessiz aralıkta mı (varsayılan: REMINDER_END_HOUR - REMINDER_START_HOUR, gece yarısını aşabilir)"""
+    start = REMINDER_END_HOUR if quiet_start is None else quiet_start
+    end = REMINDER_START_HOUR if quiet_end is None else quiet_end
+    if start <= end:
+        return start <= hour < end
+    return hour >= start or hour < end
+
+
+def _setting_key(kind: str, settings: Dict[str, Any]) -> Optional[tuple]:
+    """Kullanıcının bu türdeki seçimi (varsayılanı kullanıyorsa None)"""
+    column = NOTIFICATION_TYPES[kind][1]
+    if column:
+        return (settings[column],) if settings[column] else None
+    if kind == 'habits' and (settings['quiet_start'] is not None or settings['quiet_end'] is not None):
+        return (settings['quiet_start'], settings['quiet_end'])
+    return None
+
+
+def _custom_minutes(kind: str, key: tuple) -> List[int]:
+    """Seçimin yerel günün hangi dakikalarında çalıştığı"""
+    if kind == 'habits':
+        return [hour * 60 for hour in range(24) if not is_quiet_hour(hour, *key)]
+    minute = _minute_of_day(key[0])
+    return [] if minute is None else [minute]
+
+
+def _build_notification_schedule():
+    cursor = get_connection().cursor()
+    cursor.execute("""
+        SELECT s.*, u.telegram_id, COALESCE(u.timezone, ?) AS tz
+        FROM user_settings s
+        JOIN users u ON u.id = s.user_id
+    """, (TIMEZONE,))
+    
+    # Aynı timezone'da aynı seçimi yapanlar tek grup: dakikalar grup başına bir kez açılır
+    groups: Dict[Tuple[str, str, tuple], set] = {}
+    exclusions: Dict[str, set] = {kind: set() for kind in NOTIFICATION_TYPES}
+    for row in cursor.fetchall():
+        muted = row['muted_modules'].split(',')
+        for kind, (module, _) in NOTIFICATION_TYPES.items():
+            key = None if module in muted else _setting_key(kind, row)
+            if module in muted or key is not None:
+                exclusions[kind].add(row['telegram_id'])
+            if key is not None:
+                groups.setdefault((row['tz'], kind, key), set()).add(row['telegram_id'])
+    
+    slots: Dict[Tuple[str, int], Dict[str, frozenset]] = {}
+    for (tz, kind, key), ids in groups.items():
+        ids = frozenset(ids)
+        for minute in _custom_minutes(kind, key):
+            kinds = slots.setdefault((tz, minute), {})
+            kinds[kind] = kinds[kind] | ids if kind in kinds else ids
+    
+    return slots, {kind: frozenset(ids) for kind, ids in exclusions.items()}
+
+
+def get_notification_schedule() -> Tuple[Dict[Tuple[str, int], Dict[str, frozenset]], Dict[str, frozenset]]:
+    """(slots, exclusions) - bildirim tercihleri indeksi (bellekten, değiştirilmemeli)
+
+    slots[(timezone, günün dakikası)][tür]: o yerel dakikada kendi saati gelen kullanıcılar
+    exclusions[tür]: varsayılan saatteki çalışmaya girmeyecek kullanıcılar (telegram_id)
+    """
+    global _notification_schedule
+    with _notification_schedule_lock:
+        schedule, version = _notification_schedule, _notification_schedule_version
+    if schedule is None:
+        schedule = _build_notification_schedule()
+        with _notification_schedule_lock:
+            if _notification_schedule is None and version == _notification_schedule_version:
+                _notification_schedule = schedule
+    return schedule
+
+
+def clear_notification_schedule():
+    """Bildirim tercihleri indeksini at (sonraki kullanımda yeniden yüklenir)"""
+    global _notification_schedule, _notification_schedule_version
+    with _notification_schedule_lock:
+        _notification_schedule = None
+        _notification_schedule_version += 1
+
+
+def _settings_dict(row: Optional[sqlite3.Row]) -> Dict[str, Any]:
+    settings = dict(row) if row else {column: None for column in SETTINGS_COLUMNS}
+    settings['muted_modules'] = [m for m in (settings['muted_modules'] or '').split(',') if m]
+    return settings
+
+
+def get_user_settings(user_id: int) -> Dict[str, Any]:
+    """Kullanıcının bildirim tercihleri (None = varsayılan; muted_modules liste)"""
+    cursor = get_connection().cursor()
+    cursor.execute("SELECT * FROM user_settings WHERE user_id = ?", (user_id,))
+    return _settings_dict(cursor.fetchone())
+
+
+def update_user_settings(user_id: int, **changes) -> Dict[str, Any]:
+    """Bildirim tercihlerini güncelle (None = varsayılana dön), güncel tercihleri döndür
+
+    Saatler 'HH:MM', sessiz saatler 0-23, muted_modules MUTABLE_MODULES'ten bir liste.
+    """
+    unknown = set(changes) - set(SETTINGS_COLUMNS)
+    if unknown:
+        raise ValueError(f"Bilinmeyen bildirim ayarı: {', '.join(sorted(unknown))}")
+    if not changes:
+        return get_user_settings(user_id)
+    if 'muted_modules' in changes:
+        changes['muted_modules'] = ','.join(sorted(set(changes['muted_modules'] or ())))
+    
+    columns = list(changes)
+    conn = get_connection()
+    with conn:
+        row = conn.execute(f"""
+            INSERT INTO user_settings (user_id, {', '.join(columns)})
+            VALUES (?, {', '.join('?' for _ in columns)})
+            ON CONFLICT (user_id) DO UPDATE SET
+                {', '.join(f'{column} = excluded.{column}' for column in columns)},
+                updated_at = CURRENT_TIMESTAMP
+            RETURNING *
+        """, (user_id, *changes.values())).fetchone()
+    
+    clear_notification_schedule()
+    return _settings_dict(row)
 
 
 # ==================== KULLANICI İŞLEMLERİ ====================
@@ -141,21 +608,43 @@ def get_all_users() -> List[Dict[str, Any]]:
     cursor = conn.cursor()
     cursor.execute("SELECT * FROM users")
     users = cursor.fetchall()
-    conn.close()
     return [dict(u) for u in users]
 
 
 def update_user_timezone(user_id: int, timezone: str):
     """Kullanıcının zaman dilimini güncelle"""
     conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("UPDATE users SET timezone = ? WHERE id = ?", (timezone, user_id))
-    conn.commit()
-    conn.close()
+    with conn:
+        cursor = conn.cursor()
+        cursor.execute("UPDATE users SET timezone = ? WHERE id = ?", (timezone, user_id))
+        # Hatırlatmaların çalma anları yeni yerel saate göre yeniden hesaplanır
+        cursor.execute(
+            "SELECT id, remind_at, remind_date, is_recurring FROM reminders WHERE user_id = ?", (user_id,)
+        )
+        updates = [
+            (_reminder_next_fire(row['remind_at'], timezone, row['remind_date'], row['is_recurring']), row['id'])
+            for row in cursor.fetchall()
+        ]
+        cursor.executemany("UPDATE reminders SET next_fire_utc = ? WHERE id = ?", updates)
+    
+    _index_user_timezone(user_id, timezone)
+    clear_notification_schedule()  # kendi saatini seçenler yeni timezone'un dakikalarına taşınır
+    for next_fire, reminder_id in updates:
+        _notify_reminder(reminder_id, next_fire)
+    
+    # Önbelleği de güncelle (write-through)
+    with _user_cache_lock:
+        telegram_id = _user_cache_ids.get(user_id)
+        if telegram_id is not None:
+            _user_cache[telegram_id] = {**_user_cache[telegram_id], 'timezone': timezone}
 
 
 def get_or_create_user(telegram_id: int, username: str = None, first_name: str = None) -> Dict[str, Any]:
-    """Kullanıcıyı getir veya oluştur"""
+    """Kullanıcıyı getir veya oluştur (önce önbelleğe bakar)"""
+    cached = _cache_lookup(telegram_id, username, first_name)
+    if cached:
+        return cached
+    
     conn = get_connection()
     cursor = conn.cursor()
     
@@ -163,32 +652,48 @@ def get_or_create_user(telegram_id: int, username: str = None, first_name: str =
     user = cursor.fetchone()
     
     if user:
-        conn.close()
+        user = dict(user)
+        # Kullanıcı adı / isim değiştiyse güncelle
+        if _is_stale(user, username, first_name):
+            user['username'] = username if username is not None else user['username']
+            user['first_name'] = first_name if first_name is not None else user['first_name']
+            with conn:
+                cursor.execute(
+                    "UPDATE users SET username = ?, first_name = ? WHERE id = ?",
+                    (user['username'], user['first_name'], user['id'])
+                )
+        _cache_user(user)
         return dict(user)
     
-    cursor.execute(
-        "INSERT INTO users (telegram_id, username, first_name, timezone) VALUES (?, ?, ?, ?)",
-        (telegram_id, username, first_name, 'Europe/Istanbul')
-    )
-    conn.commit()
-    
-    cursor.execute("SELECT * FROM users WHERE id = ?", (cursor.lastrowid,))
-    user = cursor.fetchone()
-    conn.close()
+    with conn:
+        cursor.execute(
+            "INSERT INTO users (telegram_id, username, first_name, timezone) VALUES (?, ?, ?, ?) RETURNING *",
+            (telegram_id, username, first_name, 'Europe/Istanbul')
+        )
+        user = dict(cursor.fetchone())
+    _cache_user(user)
+    _index_user_timezone(user['id'], user['timezone'], user['telegram_id'])
     
     return dict(user)
 
 
 def get_user_by_telegram_id(telegram_id: int) -> Optional[Dict[str, Any]]:
     """Telegram ID ile kullanıcı getir"""
+    cached = _cache_lookup(telegram_id)
+    if cached:
+        return cached
+    
     conn = get_connection()
     cursor = conn.cursor()
     
     cursor.execute("SELECT * FROM users WHERE telegram_id = ?", (telegram_id,))
     user = cursor.fetchone()
-    conn.close()
     
-    return dict(user) if user else None
+    if not user:
+        return None
+    
+    _cache_user(dict(user))
+    return dict(user)
 
 
 # ==================== ALIŞKANLIK İŞLEMLERİ ====================
@@ -198,16 +703,16 @@ def add_habit(user_id: int, name: str, frequency: str, description: str = None,
     conn = get_connection()
     cursor = conn.cursor()
     
-    cursor.execute(
-        """INSERT INTO habits (user_id, name, description, frequency, target) 
-           VALUES (?, ?, ?, ?, ?)""",
-        (user_id, name, description, frequency, target)
-    )
-    conn.commit()
-    
-    cursor.execute("SELECT * FROM habits WHERE id = ?", (cursor.lastrowid,))
-    habit = cursor.fetchone()
-    conn.close()
+    name_norm = _normalize_fields(name)
+    with conn:
+        cursor.execute(
+            """INSERT INTO habits (user_id, name, description, frequency, target, name_norm) 
+               VALUES (?, ?, ?, ?, ?, ?)
+               RETURNING *""",
+            (user_id, name, description, frequency, target, name_norm)
+        )
+        habit = cursor.fetchone()
+    _habit_names.add(user_id, habit['id'], name_norm)
     
     return dict(habit)
 
@@ -229,68 +734,62 @@ def get_user_habits(user_id: int, active_only: bool = True) -> List[Dict[str, An
         )
     
     habits = cursor.fetchall()
-    conn.close()
     
     return [dict(h) for h in habits]
 
 
-def normalize_turkish(text: str) -> str:
-    """Türkçe karakterleri normalize et ve küçük harfe çevir"""
-    if not text:
-        return ""
-    text = text.lower()
-    # Türkçe karakter dönüşümleri
-    replacements = {
-        'ı': 'i', 'İ': 'i', 'ğ': 'g', 'Ğ': 'g',
-        'ü': 'u', 'Ü': 'u', 'ş': 's', 'Ş': 's',
-        'ö': 'o', 'Ö': 'o', 'ç': 'c', 'Ç': 'c'
-    }
-    for old, new in replacements.items():
-        text = text.replace(old, new)
-    return text
+def _normalize_fields(*fields: Optional[str]) -> str:
+    """Bir veya birden fazla alanı normalize edip aranabilir tek metne çevir"""
+    return "\n".join(normalize_turkish(f or "") for f in fields)
 
 
-def get_habit_by_name(user_id: int, name: str) -> Optional[Dict[str, Any]]:
-    """İsme göre alışkanlık getir (Türkçe karakter ve büyük/küçük harf toleranslı)"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    # Tüm aktif alışkanlıkları getir
-    cursor.execute(
-        "SELECT * FROM habits WHERE user_id = ? AND is_active = 1",
-        (user_id,)
-    )
-    habits = cursor.fetchall()
-    conn.close()
-    
-    if not habits:
+# (tablo, normalize kolon, kaynak kolonlar) - yazma sırasında doldurulur
+NORMALIZED_COLUMNS = [
+    ('habits', 'name_norm', ('name',)),
+    ('reminders', 'title_norm', ('title',)),
+    ('tasks', 'title_norm', ('title',)),
+    ('notes', 'search_norm', ('content', 'title')),
+]
+
+
+def _load_names(sql: str) -> Callable[[int], List[tuple]]:
+    def loader(user_id: int) -> List[tuple]:
+        cursor = get_connection().cursor()
+        cursor.execute(sql, (user_id,))
+        return [tuple(row) for row in cursor.fetchall()]
+    return loader
+
+
+# Kullanıcı başına bellekteki isim indeksleri (ilk aramada yüklenir, yazmalarda güncellenir)
+_habit_names = NameIndex(_load_names("SELECT id, name_norm FROM habits WHERE user_id = ? AND is_active = 1"))
+_reminder_names = NameIndex(_load_names("SELECT id, title_norm FROM reminders WHERE user_id = ?"))
+_task_names = NameIndex(_load_names("SELECT id, title_norm FROM tasks WHERE user_id = ? AND is_completed = 0"))
+_note_texts = NameIndex(_load_names("SELECT id, search_norm FROM notes WHERE user_id = ?"))
+
+
+def _get_by_id(table: str, item_id: Optional[int]) -> Optional[Dict[str, Any]]:
+    if item_id is None:
         return None
-    
-    # Aranan ismi normalize et
-    search_normalized = normalize_turkish(name)
-    
-    # Önce tam eşleşme dene
-    for habit in habits:
-        habit_normalized = normalize_turkish(habit['name'])
-        if habit_normalized == search_normalized:
-            return dict(habit)
-    
-    # Sonra kısmi eşleşme dene (içeriyor mu?)
-    for habit in habits:
-        habit_normalized = normalize_turkish(habit['name'])
-        if search_normalized in habit_normalized or habit_normalized in search_normalized:
-            return dict(habit)
-    
-    # Son olarak kelime bazlı eşleşme dene
-    search_words = set(search_normalized.split())
-    for habit in habits:
-        habit_normalized = normalize_turkish(habit['name'])
-        habit_words = set(habit_normalized.split())
-        # Herhangi bir kelime eşleşiyor mu?
-        if search_words & habit_words:
-            return dict(habit)
-    
-    return None
+    cursor = get_connection().cursor()
+    cursor.execute(f"SELECT * FROM {table} WHERE id = ?", (item_id,))
+    row = cursor.fetchone()
+    return dict(row) if row else None
+
+
+def get_habit_by_name(user_id: int, name: str) -> Optional[Dict[str, Any]]:
+    """İsme göre alışkanlık getir (Türkçe karakter ve büyük/küçük harf toleranslı)
+
+    Sıra: tam eşleşme, kısmi eşleşme (içeriyor mu?), kelime bazlı eşleşme.
+    Sonuç silme/tamamlamada kullanıldığı için yazım hatası toleransı yok (bkz. suggest_habit).
+    """
+    habit_id = _habit_names.best(user_id, normalize_turkish(name), min_level=name_index.TOKEN)
+    return _get_by_id('habits', habit_id)
+
+
+def suggest_habit(user_id: int, name: str) -> Optional[Dict[str, Any]]:
+    """Bulunamayan isim için yazım hatası toleranslı öneri ("bunu mu demek istedin?")"""
+    habit_id = _habit_names.best(user_id, normalize_turkish(name), min_level=name_index.FUZZY)
+    return _get_by_id('habits', habit_id)
 
 
 def delete_habit(habit_id: int) -> bool:
@@ -298,87 +797,54 @@ def delete_habit(habit_id: int) -> bool:
     conn = get_connection()
     cursor = conn.cursor()
     
-    cursor.execute("UPDATE habits SET is_active = 0 WHERE id = ?", (habit_id,))
-    conn.commit()
+    with conn:
+        cursor.execute("UPDATE habits SET is_active = 0 WHERE id = ?", (habit_id,))
     affected = cursor.rowcount
-    conn.close()
+    _habit_names.remove(habit_id)
     
     return affected > 0
 
 
 # ==================== TAMAMLAMA İŞLEMLERİ ====================
 
+@storage.group_write(_db)
 def complete_habit(habit_id: int, period_date: date = None, notes: str = None) -> Dict[str, Any]:
-    """Alışkanlığı tamamlandı olarak işaretle"""
+    """Alışkanlığı tamamlandı olarak işaretle (grup commit ile yazılır)"""
     conn = get_connection()
     cursor = conn.cursor()
     
     if period_date is None:
         period_date = date.today()
     
-    # Önce bu dönem için zaten tamamlanmış mı kontrol et
+    # Bu dönem zaten tamamlandıysa UNIQUE(habit_id, period_date) çakışır; boş
+    # güncelleme mevcut kaydı değiştirmeden RETURNING ile geri döndürür
     cursor.execute(
-        "SELECT * FROM habit_completions WHERE habit_id = ? AND period_date = ?",
-        (habit_id, period_date.isoformat())
-    )
-    existing = cursor.fetchone()
-    
-    if existing:
-        conn.close()
-        return dict(existing)
-    
-    cursor.execute(
-        "INSERT INTO habit_completions (habit_id, period_date, notes) VALUES (?, ?, ?)",
+        """INSERT INTO habit_completions (habit_id, period_date, notes) VALUES (?, ?, ?)
+           ON CONFLICT(habit_id, period_date) DO UPDATE SET habit_id = habit_id
+           RETURNING *""",
         (habit_id, period_date.isoformat(), notes)
     )
-    conn.commit()
-    
-    cursor.execute("SELECT * FROM habit_completions WHERE id = ?", (cursor.lastrowid,))
     completion = cursor.fetchone()
-    conn.close()
     
     return dict(completion)
 
 
-def is_habit_completed_today(habit_id: int) -> bool:
-    """Alışkanlık bugün tamamlandı mı?"""
+def is_habit_completed_today(habit_id: int, today: date = None) -> bool:
+    """Alışkanlık bugün (verilirse kullanıcının yerel gününde) tamamlandı mı?"""
     conn = get_connection()
     cursor = conn.cursor()
     
-    today = date.today().isoformat()
+    if today is None:
+        today = date.today()
     cursor.execute(
         "SELECT * FROM habit_completions WHERE habit_id = ? AND period_date = ?",
-        (habit_id, today)
+        (habit_id, today.isoformat())
     )
     result = cursor.fetchone()
-    conn.close()
     
     return result is not None
 
 
-def get_uncompleted_habits_for_user(user_id: int) -> List[Dict[str, Any]]:
-    """Bugün tamamlanmamış alışkanlıkları getir"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    today = date.today().isoformat()
-    
-    cursor.execute("""
-        SELECT h.* FROM habits h
-        WHERE h.user_id = ?
-          AND h.is_active = 1
-          AND h.frequency = 'daily'
-          AND h.id NOT IN (
-              SELECT habit_id FROM habit_completions WHERE period_date = ?
-          )
-    """, (user_id, today))
-    
-    habits = cursor.fetchall()
-    conn.close()
-    
-    return [dict(h) for h in habits]
-
-
 def get_all_users_with_uncompleted_habits() -> List[Dict[str, Any]]:
     """Tamamlanmamış alışkanlığı olan tüm kullanıcıları getir"""
     conn = get_connection()
@@ -397,7 +863,6 @@ def get_all_users_with_uncompleted_habits() -> List[Dict[str, Any]]:
     """, (today,))
     
     users = cursor.fetchall()
-    conn.close()
     
     return [dict(u) for u in users]
 
@@ -423,7 +888,6 @@ def get_habit_history(user_id: int, days: int = 7) -> List[Dict[str, Any]]:
     """, (user_id, from_date))
     
     completions = cursor.fetchall()
-    conn.close()
     
     return [dict(c) for c in completions]
 
@@ -448,7 +912,6 @@ def get_daily_summary(user_id: int, target_date: date = None) -> Dict[str, Any]:
     """, (date_str, user_id))
     
     habits = cursor.fetchall()
-    conn.close()
     
     completed = [dict(h) for h in habits if h['completed']]
     uncompleted = [dict(h) for h in habits if not h['completed']]
@@ -464,23 +927,77 @@ def get_daily_summary(user_id: int, target_date: date = None) -> Dict[str, Any]:
 
 # ==================== HATIRLATMA İŞLEMLERİ ====================
 
+# Çalma anı değişen hatırlatmalar için dinleyiciler: listener(reminder_id, next_fire_utc | None)
+# (zamanlayıcının bellekteki kuyruğu bunlarla güncel tutulur; yazan thread'den çağrılır)
+_reminder_listeners: List[Callable[[int, Optional[str]], None]] = []
+
+
+def add_reminder_listener(listener: Callable[[int, Optional[str]], None]):
+    """Hatırlatma eklendiğinde, silindiğinde veya çalma anı değiştiğinde çağrılacak fonksiyonu kaydet"""
+    _reminder_listeners.append(listener)
+
+
+def _notify_reminder(reminder_id: int, next_fire_utc: Optional[str]):
+    for listener in _reminder_listeners:
+        listener(reminder_id, next_fire_utc)
+
+
+# Tarihli tek seferlik hatırlatma en fazla bu kadar geçmişteyse yine de gönderilir
+# ("10 saniye sonra" gibi göreli hatırlatmalar kayıt sırasında geçmişte kalabilir)
+REMINDER_PAST_GRACE_SECONDS = 60
+
+
+def _reminder_next_fire(remind_at: str, timezone: Optional[str], remind_date: Optional[str] = None,
+                        is_recurring: bool = False) -> Optional[str]:
+    """Hatırlatmanın bir sonraki çalma anı (UTC); None ise hiç çalmaz
+
+    Tekrarlayanlarda tarih yalnızca listelemede kullanılır, her gün aynı saatte çalar.
+    Tarihli tek seferlik hatırlatmanın anı hesaplanırken geçmişte kalmışsa
+    (ör. bugün 08:00 için saat 09:00'da eklendi) gönderilmez. Kaydedilmiş bir
+    anın kaçırılması (bot kapalıyken) bundan farklıdır: o hatırlatma sonraki
+    turda gönderilir.
+    """
+    try:
+        next_fire = time_utils.next_fire_utc(remind_at, timezone, None if is_recurring else remind_date)
+    except (TypeError, ValueError):
+        return None
+    if remind_date and not is_recurring:
+        grace = datetime.now(pytz.utc) - timedelta(seconds=REMINDER_PAST_GRACE_SECONDS)
+        if next_fire < time_utils.to_utc_str(grace):
+            return None
+    return next_fire
+
+
+def _user_timezone(cursor: sqlite3.Cursor, user_id: int) -> Optional[str]:
+    """Kullanıcının zaman dilimi (önce önbelleğe bakar)"""
+    with _user_cache_lock:
+        telegram_id = _user_cache_ids.get(user_id)
+        if telegram_id is not None:
+            return _user_cache[telegram_id].get('timezone')
+    cursor.execute("SELECT timezone FROM users WHERE id = ?", (user_id,))
+    row = cursor.fetchone()
+    return row['timezone'] if row else None
+
+
 def add_reminder(user_id: int, title: str, remind_at: str, remind_date: date = None, is_recurring: bool = False) -> Dict[str, Any]:
     """Yeni hatırlatma ekle"""
     conn = get_connection()
     cursor = conn.cursor()
     
     date_str = remind_date.isoformat() if remind_date else None
+    next_fire = _reminder_next_fire(remind_at, _user_timezone(cursor, user_id), date_str, is_recurring)
     
-    cursor.execute(
-        """INSERT INTO reminders (user_id, title, remind_at, remind_date, is_recurring) 
-           VALUES (?, ?, ?, ?, ?)""",
-        (user_id, title, remind_at, date_str, is_recurring)
-    )
-    conn.commit()
-    
-    cursor.execute("SELECT * FROM reminders WHERE id = ?", (cursor.lastrowid,))
-    reminder = cursor.fetchone()
-    conn.close()
+    title_norm = _normalize_fields(title)
+    with conn:
+        cursor.execute(
+            """INSERT INTO reminders (user_id, title, remind_at, remind_date, is_recurring, title_norm, next_fire_utc) 
+               VALUES (?, ?, ?, ?, ?, ?, ?)
+               RETURNING *""",
+            (user_id, title, remind_at, date_str, is_recurring, title_norm, next_fire)
+        )
+        reminder = cursor.fetchone()
+    _reminder_names.add(user_id, reminder['id'], title_norm)
+    _notify_reminder(reminder['id'], next_fire)
     
     return dict(reminder)
 
@@ -501,65 +1018,80 @@ def get_user_reminders(user_id: int) -> List[Dict[str, Any]]:
     """, (user_id, today))
     
     reminders = cursor.fetchall()
-    conn.close()
     
     return [dict(r) for r in reminders]
 
 
-def get_pending_reminders(current_time: str) -> List[Dict[str, Any]]:
-    """Gönderilmesi gereken hatırlatmaları getir (Deprecated - use get_pending_reminders_by_user)"""
-    # Bu fonksiyon geriye dönük uyumluluk için, ancak yeni sistemde 
-    # kullanıcı bazlı kontrol yapılacağı için bunu artık pek kullanmayacağız.
-    # Yine de "default" timezone varsayımıyla çalışabilir.
-    return []
-
-
-def get_pending_reminders_for_user(user_id: int, user_time_str: str, user_date_str: str) -> List[Dict[str, Any]]:
-    """Belirli bir kullanıcı için gönderilmesi gereken hatırlatmaları getir"""
+def get_due_reminders(now: datetime = None) -> List[Dict[str, Any]]:
+    """Çalma anı gelmiş (veya kaçırılmış) tüm hatırlatmalar - tek indeksli sorgu"""
     conn = get_connection()
     cursor = conn.cursor()
     
-    # Şu an gönderilmesi gereken hatırlatmalar
+    now_str = time_utils.to_utc_str(now) if now else time_utils.utc_now_str()
     cursor.execute("""
-        SELECT r.*
+        SELECT r.*, u.telegram_id, u.timezone
         FROM reminders r
-        WHERE r.user_id = ?
-          AND r.remind_at = ?
-          AND (r.is_recurring = 1 OR r.remind_date IS NULL OR r.remind_date = ?)
-          AND r.is_sent = 0
-    """, (user_id, user_time_str, user_date_str))
+        JOIN users u ON u.id = r.user_id
+        WHERE r.next_fire_utc <= ?
+        ORDER BY r.next_fire_utc
+    """, (now_str,))
     
-    reminders = cursor.fetchall()
-    conn.close()
-    
-    return [dict(r) for r in reminders]
+    return [dict(r) for r in cursor.fetchall()]
+
 
+def get_scheduled_reminders() -> List[tuple]:
+    """Çalma anı olan tüm hatırlatmalar: [(id, next_fire_utc), ...]"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT id, next_fire_utc FROM reminders WHERE next_fire_utc IS NOT NULL")
+    return [tuple(r) for r in cursor.fetchall()]
 
+
+def get_reminders_by_ids(reminder_ids: List[int]) -> List[Dict[str, Any]]:
+    """Verilen hatırlatmalar, gönderim için kullanıcının telegram_id'si ile"""
+    if not reminder_ids:
+        return []
+    conn = get_connection()
+    cursor = conn.cursor()
+    placeholders = ", ".join("?" for _ in reminder_ids)
+    cursor.execute(f"""
+        SELECT r.*, u.telegram_id, u.timezone
+        FROM reminders r
+        JOIN users u ON u.id = r.user_id
+        WHERE r.id IN ({placeholders})
+        ORDER BY r.next_fire_utc
+    """, list(reminder_ids))
+    return [dict(r) for r in cursor.fetchall()]
+
+
+@storage.group_write(_db)
 def mark_reminder_sent(reminder_id: int, is_recurring: bool = False):
-    """Hatırlatmayı gönderildi olarak işaretle veya sil"""
+    """Gönderilen hatırlatmayı bir sonraki güne kur veya sil (grup commit ile yazılır)"""
     conn = get_connection()
     cursor = conn.cursor()
     
     if is_recurring:
-        # Tekrarlayan hatırlatma - is_sent'i sıfırla (yarın tekrar gönderilecek)
-        cursor.execute("UPDATE reminders SET is_sent = 0 WHERE id = ?", (reminder_id,))
+        # Tekrarlayan hatırlatma - sıradaki çalma anı (kaçırılan günler atlanır)
+        cursor.execute("""
+            SELECT r.remind_at, u.timezone
+            FROM reminders r LEFT JOIN users u ON u.id = r.user_id
+            WHERE r.id = ?
+        """, (reminder_id,))
+        row = cursor.fetchone()
+        if row:
+            next_fire = _reminder_next_fire(row['remind_at'], row['timezone'])
+            cursor.execute("UPDATE reminders SET next_fire_utc = ? WHERE id = ?", (next_fire, reminder_id))
+            storage.after_commit(lambda: _notify_reminder(reminder_id, next_fire))
     else:
         # Tek seferlik hatırlatma - sil
         cursor.execute("DELETE FROM reminders WHERE id = ?", (reminder_id,))
-    
-    conn.commit()
-    conn.close()
-
-
-def reset_daily_reminders():
-    """Günlük tekrarlayan hatırlatmaları sıfırla (gece yarısı çağrılır)"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("UPDATE reminders SET is_sent = 0 WHERE is_recurring = 1")
-    
-    conn.commit()
-    conn.close()
+        
+        def forget():
+            _reminder_names.remove(reminder_id)
+            _notify_reminder(reminder_id, None)
+        
+        # İsim indeksi ve dağıtıcı yalnızca commit başarılı olursa güncellenir
+        storage.after_commit(forget)
 
 
 def delete_reminder(reminder_id: int) -> bool:
@@ -567,34 +1099,19 @@ def delete_reminder(reminder_id: int) -> bool:
     conn = get_connection()
     cursor = conn.cursor()
     
-    cursor.execute("DELETE FROM reminders WHERE id = ?", (reminder_id,))
-    conn.commit()
+    with conn:
+        cursor.execute("DELETE FROM reminders WHERE id = ?", (reminder_id,))
     affected = cursor.rowcount
-    conn.close()
+    _reminder_names.remove(reminder_id)
+    _notify_reminder(reminder_id, None)
     
     return affected > 0
 
 
 def get_reminder_by_title(user_id: int, title: str) -> Optional[Dict[str, Any]]:
     """Başlığa göre hatırlatma getir"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT * FROM reminders WHERE user_id = ?", (user_id,))
-    reminders = cursor.fetchall()
-    conn.close()
-    
-    if not reminders:
-        return None
-    
-    search_normalized = normalize_turkish(title)
-    
-    for reminder in reminders:
-        reminder_normalized = normalize_turkish(reminder['title'])
-        if search_normalized in reminder_normalized or reminder_normalized in search_normalized:
-            return dict(reminder)
-    
-    return None
+    reminder_id = _reminder_names.best(user_id, normalize_turkish(title), min_level=name_index.CONTAINED)
+    return _get_by_id('reminders', reminder_id)
 
 
 # ==================== GÖREV İŞLEMLERİ ====================
@@ -606,16 +1123,16 @@ def add_task(user_id: int, title: str, description: str = None, due_date: date =
     
     date_str = due_date.isoformat() if due_date else None
     
-    cursor.execute(
-        """INSERT INTO tasks (user_id, title, description, due_date) 
-           VALUES (?, ?, ?, ?)""",
-        (user_id, title, description, date_str)
-    )
-    conn.commit()
-    
-    cursor.execute("SELECT * FROM tasks WHERE id = ?", (cursor.lastrowid,))
-    task = cursor.fetchone()
-    conn.close()
+    title_norm = _normalize_fields(title)
+    with conn:
+        cursor.execute(
+            """INSERT INTO tasks (user_id, title, description, due_date, title_norm) 
+               VALUES (?, ?, ?, ?, ?)
+               RETURNING *""",
+            (user_id, title, description, date_str, title_norm)
+        )
+        task = cursor.fetchone()
+    _task_names.add(user_id, task['id'], title_norm)
     
     return dict(task)
 
@@ -637,7 +1154,6 @@ def get_user_tasks(user_id: int, include_completed: bool = False) -> List[Dict[s
         )
     
     tasks = cursor.fetchall()
-    conn.close()
     
     return [dict(t) for t in tasks]
 
@@ -647,13 +1163,13 @@ def complete_task(task_id: int) -> bool:
     conn = get_connection()
     cursor = conn.cursor()
     
-    cursor.execute(
-        "UPDATE tasks SET is_completed = 1, completed_at = ? WHERE id = ?",
-        (datetime.now().isoformat(), task_id)
-    )
-    conn.commit()
+    with conn:
+        cursor.execute(
+            "UPDATE tasks SET is_completed = 1, completed_at = ? WHERE id = ?",
+            (datetime.now().isoformat(), task_id)
+        )
     affected = cursor.rowcount
-    conn.close()
+    _task_names.remove(task_id)
     
     return affected > 0
 
@@ -663,34 +1179,18 @@ def delete_task(task_id: int) -> bool:
     conn = get_connection()
     cursor = conn.cursor()
     
-    cursor.execute("DELETE FROM tasks WHERE id = ?", (task_id,))
-    conn.commit()
+    with conn:
+        cursor.execute("DELETE FROM tasks WHERE id = ?", (task_id,))
     affected = cursor.rowcount
-    conn.close()
+    _task_names.remove(task_id)
     
     return affected > 0
 
 
 def get_task_by_title(user_id: int, title: str) -> Optional[Dict[str, Any]]:
     """Başlığa göre görev getir"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT * FROM tasks WHERE user_id = ? AND is_completed = 0", (user_id,))
-    tasks = cursor.fetchall()
-    conn.close()
-    
-    if not tasks:
-        return None
-    
-    search_normalized = normalize_turkish(title)
-    
-    for task in tasks:
-        task_normalized = normalize_turkish(task['title'])
-        if search_normalized in task_normalized or task_normalized in search_normalized:
-            return dict(task)
-    
-    return None
+    task_id = _task_names.best(user_id, normalize_turkish(title), min_level=name_index.CONTAINED)
+    return _get_by_id('tasks', task_id)
 
 
 # ==================== NOT İŞLEMLERİ ====================
@@ -700,16 +1200,16 @@ def add_note(user_id: int, content: str, title: str = None) -> Dict[str, Any]:
     conn = get_connection()
     cursor = conn.cursor()
     
-    cursor.execute(
-        """INSERT INTO notes (user_id, title, content) 
-           VALUES (?, ?, ?)""",
-        (user_id, title, content)
-    )
-    conn.commit()
-    
-    cursor.execute("SELECT * FROM notes WHERE id = ?", (cursor.lastrowid,))
-    note = cursor.fetchone()
-    conn.close()
+    search_norm = _normalize_fields(content, title)
+    with conn:
+        cursor.execute(
+            """INSERT INTO notes (user_id, title, content, search_norm) 
+               VALUES (?, ?, ?, ?)
+               RETURNING *""",
+            (user_id, title, content, search_norm)
+        )
+        note = cursor.fetchone()
+    _note_texts.add(user_id, note['id'], search_norm)
     
     return dict(note)
 
@@ -725,7 +1225,6 @@ def get_user_notes(user_id: int) -> List[Dict[str, Any]]:
     )
     
     notes = cursor.fetchall()
-    conn.close()
     
     return [dict(n) for n in notes]
 
@@ -735,113 +1234,293 @@ def delete_note(note_id: int) -> bool:
     conn = get_connection()
     cursor = conn.cursor()
     
-    cursor.execute("DELETE FROM notes WHERE id = ?", (note_id,))
-    conn.commit()
+    with conn:
+        cursor.execute("DELETE FROM notes WHERE id = ?", (note_id,))
     affected = cursor.rowcount
-    conn.close()
+    _note_texts.remove(note_id)
     
     return affected > 0
 
 
 def get_note_by_content(user_id: int, search_text: str) -> Optional[Dict[str, Any]]:
     """İçeriğe göre not getir"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT * FROM notes WHERE user_id = ?", (user_id,))
-    notes = cursor.fetchall()
-    conn.close()
-    
-    if not notes:
-        return None
-    
-    search_normalized = normalize_turkish(search_text)
-    
-    for note in notes:
-        content_normalized = normalize_turkish(note['content'])
-        title_normalized = normalize_turkish(note['title'] or '')
-        if search_normalized in content_normalized or search_normalized in title_normalized:
-            return dict(note)
-    
-    return None
+    note_id = _note_texts.best(user_id, normalize_turkish(search_text), min_level=name_index.CONTAINS)
+    return _get_by_id('notes', note_id)
 
 
 # ==================== KONUŞMA GEÇMİŞİ İŞLEMLERİ ====================
 
-def add_conversation_message(user_id: int, role: str, message: str):
-    """Konuşma geçmişine mesaj ekle (role: 'user' veya 'assistant')"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute(
-        """INSERT INTO conversation_history (user_id, role, message) 
-           VALUES (?, ?, ?)""",
-        (user_id, role, message)
-    )
-    conn.commit()
-    conn.close()
+# Prompt geçmişi bellekteki halka tampondan okunur; veritabanına toplu yazılır.
+# Bu kadar süre yazışmayan kullanıcının tamponu flush sonrası bırakılır (gerekirse yeniden yüklenir).
+CONVERSATION_BUFFER_SIZE = 20
+CONVERSATION_IDLE_SECONDS = 30 * 60
 
+_conversation_buffers: "OrderedDict[int, deque]" = OrderedDict()  # users.id -> son mesajlar (en eski erişilen başta)
+_conversation_used_at: Dict[int, float] = {}  # users.id -> son erişim (time.monotonic)
+_conversation_pending: List[tuple] = []  # yazılmayı bekleyen (user_id, role, message, created_at)
+_conversation_lock = threading.Lock()
 
-def get_conversation_history(user_id: int, limit: int = 10) -> List[Dict[str, Any]]:
-    """Kullanıcının son konuşma geçmişini getir"""
+
+def _touch_conversation_buffer(user_id: int, buffer: deque) -> deque:
+    """Tamponu en yeni erişilen olarak işaretle (bırakılmışsa geri koy); _conversation_lock altında çağrılır"""
+    buffer = _conversation_buffers.setdefault(user_id, buffer)
+    _conversation_buffers.move_to_end(user_id)
+    _conversation_used_at[user_id] = time.monotonic()
+    return buffer
+
+
+def _get_conversation_buffer(user_id: int) -> deque:
+    """Kullanıcının tamponunu getir, ilk erişimde veritabanından doldur"""
+    with _conversation_lock:
+        buffer = _conversation_buffers.get(user_id)
+        if buffer is not None:
+            return _touch_conversation_buffer(user_id, buffer)
+    
     conn = get_connection()
     cursor = conn.cursor()
     
     cursor.execute("""
         SELECT role, message, created_at FROM conversation_history 
         WHERE user_id = ? 
-        ORDER BY created_at DESC 
+        ORDER BY created_at DESC, id DESC
         LIMIT ?
-    """, (user_id, limit))
+    """, (user_id, CONVERSATION_BUFFER_SIZE))
     
-    messages = cursor.fetchall()
-    conn.close()
+    loaded = deque((dict(m) for m in reversed(cursor.fetchall())), maxlen=CONVERSATION_BUFFER_SIZE)
     
-    # Ters çevir (eski mesajlar önce)
-    return [dict(m) for m in reversed(messages)]
+    with _conversation_lock:
+        # Bu arada başka bir thread doldurduysa onu kullan
+        return _touch_conversation_buffer(user_id, loaded)
 
 
-def clear_old_conversation_history(user_id: int, keep_last: int = 20):
-    """Eski konuşma geçmişini temizle (son N mesajı tut)"""
+def add_conversation_message(user_id: int, role: str, message: str):
+    """Konuşma geçmişine mesaj ekle (role: 'user' veya 'assistant')
+
+    Mesaj hemen tampona eklenir; veritabanına flush_conversation_messages ile yazılır.
+    """
+    buffer = _get_conversation_buffer(user_id)
+    created_at = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+    
+    with _conversation_lock:
+        buffer = _touch_conversation_buffer(user_id, buffer)
+        buffer.append({'role': role, 'message': message, 'created_at': created_at})
+        _conversation_pending.append((user_id, role, message, created_at))
+
+
+def get_conversation_history(user_id: int, limit: int = 10) -> List[Dict[str, Any]]:
+    """Kullanıcının son konuşma geçmişini getir (eski mesajlar önce)"""
+    buffer = _get_conversation_buffer(user_id)
+    
+    with _conversation_lock:
+        messages = list(buffer)
+    
+    return [dict(m) for m in messages[-limit:]] if limit > 0 else []
+
+
+def flush_conversation_messages() -> int:
+    """Bekleyen konuşma mesajlarını tek transaction'da veritabanına yaz"""
+    global _conversation_pending
+    
+    with _conversation_lock:
+        pending, _conversation_pending = _conversation_pending, []
+    
+    if pending:
+        conn = get_connection()
+        try:
+            with conn:
+                conn.executemany(
+                    """INSERT INTO conversation_history (user_id, role, message, created_at) 
+                       VALUES (?, ?, ?, ?)""",
+                    pending
+                )
+        except sqlite3.Error:
+            # Yazılamayanları bir sonraki denemeye geri koy
+            with _conversation_lock:
+                _conversation_pending[:0] = pending
+            raise
+    
+    _evict_idle_conversation_buffers()
+    return len(pending)
+
+
+def _evict_idle_conversation_buffers():
+    """Uzun süredir yazışmayan ve bekleyen mesajı kalmamış kullanıcıların tamponlarını bırak"""
+    cutoff = time.monotonic() - CONVERSATION_IDLE_SECONDS
+    with _conversation_lock:
+        waiting = {item[0] for item in _conversation_pending}
+        while _conversation_buffers:
+            user_id = next(iter(_conversation_buffers))
+            if _conversation_used_at[user_id] > cutoff or user_id in waiting:
+                break
+            del _conversation_buffers[user_id]
+            del _conversation_used_at[user_id]
+
+
+def trim_conversation_history(keep_last: int = CONVERSATION_BUFFER_SIZE) -> int:
+    """Tüm kullanıcılar için son N mesaj dışındakileri tek sorguda sil"""
     conn = get_connection()
-    cursor = conn.cursor()
     
-    cursor.execute("""
-        DELETE FROM conversation_history 
-        WHERE user_id = ? AND id NOT IN (
-            SELECT id FROM conversation_history 
-            WHERE user_id = ? 
-            ORDER BY created_at DESC 
-            LIMIT ?
-        )
-    """, (user_id, user_id, keep_last))
+    with conn:
+        cursor = conn.execute("""
+            DELETE FROM conversation_history 
+            WHERE id IN (
+                SELECT id FROM (
+                    SELECT id, ROW_NUMBER() OVER (
+                        PARTITION BY user_id ORDER BY created_at DESC, id DESC
+                    ) AS sira
+                    FROM conversation_history
+                )
+                WHERE sira > ?
+            )
+        """, (keep_last,))
     
-    conn.commit()
-    conn.close()
+    return cursor.rowcount
+
+
+# ==================== BİLDİRİM KUYRUĞU (OUTBOX) ====================
+
+# Zamanlayıcı bildirimleri önce buraya yazılır, sonra gönderilir. (chat_id, kind, local_date)
+# benzersizdir: aynı bildirim aynı yerel günde ikinci kez kuyruğa girmez.
+OUTBOX_PENDING = 'pending'
+OUTBOX_SENT = 'sent'
+OUTBOX_FAILED = 'failed'
+OUTBOX_EXPIRED = 'expired'
+
+
+def enqueue_notifications(notifications: List[tuple], expires_utc: str = None,
+                          not_before_utc: str = None) -> List[int]:
+    """Bildirimleri kuyruğa ekle: [(chat_id, kind, local_date, text), ...]
+
+    Zaten kuyrukta olanlar (gönderilmiş olsa bile) atlanır; yeni eklenenlerin id'leri döner.
+    not_before_utc verilirse o ana kadar gönderilmez (özet penceresi).
+    """
+    if not notifications:
+        return []
+
+    now = not_before_utc or time_utils.utc_now_str()
+    conn = get_connection()
+    ids = []
+    with conn:
+        for chat_id, kind, local_date, text in notifications:
+            row = conn.execute("""
+                INSERT INTO notification_outbox (chat_id, kind, local_date, text, next_attempt_utc, expires_utc)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (chat_id, kind, local_date) DO NOTHING
+                RETURNING id
+            """, (chat_id, kind, str(local_date), text, now, expires_utc)).fetchone()
+            if row:
+                ids.append(row['id'])
+    return ids
+
+
+def claim_notifications(limit: int = 500, lease_seconds: int = 900,
+                        now: datetime = None) -> List[Dict[str, Any]]:
+    """Gönderim zamanı gelmiş bekleyen bildirimleri gönderime al (eskiden yeniye)
+
+    Alınan satırların next_attempt_utc'si lease_seconds ileri atılır: gönderim sürerken
+    tekrar alınmazlar; sonuç yazılamadan bot kapanırsa o süre sonunda yeniden gönderilirler.
+    """
+    now = now or datetime.now(pytz.utc)
+    conn = get_connection()
+    with conn:
+        cursor = conn.execute("""
+            UPDATE notification_outbox
+            SET next_attempt_utc = ?
+            WHERE id IN (
+                SELECT id FROM notification_outbox
+                WHERE status = 'pending' AND next_attempt_utc <= ?
+                ORDER BY next_attempt_utc, id
+                LIMIT ?
+            )
+            RETURNING *
+        """, (time_utils.to_utc_str(now + timedelta(seconds=lease_seconds)),
+              time_utils.to_utc_str(now), limit))
+        rows = [dict(r) for r in cursor.fetchall()]
+    rows.sort(key=lambda r: r['id'])
+    return rows
+
+
+def update_notifications(updates: List[tuple]):
+    """Gönderim denemelerinin sonucunu tek transaction'da yaz
+
+    updates: [(id, status, next_attempt_utc, error), ...]; her satırda deneme sayısı bir artar.
+    """
+    if not updates:
+        return
+
+    now = time_utils.utc_now_str()
+    conn = get_connection()
+    with conn:
+        conn.executemany("""
+            UPDATE notification_outbox
+            SET status = ?,
+                next_attempt_utc = COALESCE(?, next_attempt_utc),
+                last_error = ?,
+                attempts = attempts + 1,
+                sent_at = CASE WHEN ? = 'sent' THEN ? ELSE sent_at END
+            WHERE id = ?
+        """, [(status, next_attempt, error, status, now, notification_id)
+              for notification_id, status, next_attempt, error in updates])
+
+
+def purge_notifications(keep_days: int = 7) -> int:
+    """Bekleyenler dışında `keep_days` günden eski kuyruk kayıtlarını sil"""
+    conn = get_connection()
+    with conn:
+        cursor = conn.execute("""
+            DELETE FROM notification_outbox
+            WHERE status != 'pending' AND created_at < DATETIME('now', ?)
+        """, (f"-{keep_days} days",))
+    return cursor.rowcount
 
 
+def get_scheduler_state(key: str) -> Optional[str]:
+    """Yeniden başlatmalar arasında saklanan zamanlayıcı değeri (ör. son ana tik)"""
+    row = get_connection().execute("SELECT value FROM scheduler_state WHERE key = ?", (key,)).fetchone()
+    return row['value'] if row else None
+
+
+def set_scheduler_state(key: str, value: str):
+    conn = get_connection()
+    with conn:
+        conn.execute("""
+            INSERT INTO scheduler_state (key, value, updated_at) VALUES (?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at
+        """, (key, value))
+
 
 # ==================== MODÜL YÖNETİMİ ====================
 
-def get_user_current_module(user_id: int) -> str:
-    """Kullanıcının aktif modülünü getir"""
+DEFAULT_MODULE = 'asistan'
+
+# Mesaj yönlendirme tablosu: users.id -> aktif modül (başlangıçta yüklenir)
+_current_modules: Dict[int, str] = {}
+
+
+def load_current_modules():
+    """Tüm kullanıcıların aktif modülünü belleğe yükle (başlangıçta bir kez)"""
     conn = get_connection()
     cursor = conn.cursor()
     
-    cursor.execute("SELECT module_name FROM user_current_module WHERE user_id = ?", (user_id,))
-    result = cursor.fetchone()
-    conn.close()
+    cursor.execute("SELECT user_id, module_name FROM user_current_module")
     
-    if result:
-        return result['module_name']
-    
-    # Varsayılan modül asistan
-    set_user_current_module(user_id, 'asistan')
-    return 'asistan'
+    _current_modules.clear()
+    _current_modules.update({row['user_id']: row['module_name'] for row in cursor.fetchall()})
+
+
+def get_user_current_module(user_id: int) -> str:
+    """Kullanıcının aktif modülünü getir (bellekten, veritabanına gitmez)"""
+    return _current_modules.get(user_id, DEFAULT_MODULE)
 
 
 def set_user_current_module(user_id: int, module_name: str):
-    """Kullanıcının aktif modülünü ayarla"""
+    """Kullanıcının aktif modülünü ayarla (bellek + veritabanı)"""
+    _current_modules[user_id] = module_name
+    _save_current_module(user_id, module_name)
+
+
+@storage.group_write(_db)
+def _save_current_module(user_id: int, module_name: str):
     conn = get_connection()
     cursor = conn.cursor()
     
@@ -850,10 +1529,8 @@ def set_user_current_module(user_id: int, module_name: str):
         VALUES (?, ?, ?)
         ON CONFLICT(user_id) DO UPDATE SET module_name = ?, updated_at = ?
     """, (user_id, module_name, datetime.now().isoformat(), module_name, datetime.now().isoformat()))
-    
-    conn.commit()
-    conn.close()
 
 
 # Veritabanını başlat
 init_database()
+load_current_modules()
@@ -0,0 +1,302 @@
+"""
+Modüller arası sorgular - Tüm modül veritabanları tek bağlantıya ATTACH edilir
+Zamanlayıcının "hangi kullanıcının şu an işi var?" soruları tek SQL ile cevaplanır.
+
+Şema adları: main (asistan.db), ders, ingilizce, kitap, notdefteri, proje
+Not: Modül tablolarında user_id = Telegram ID, asistan tablolarında users.id
+"""
+import json
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Collection, Dict, List, Optional, Tuple
+import pytz
+from config import TIMEZONE
+import database
+import storage
+import time_utils
+from modules.ders import database as ders_db
+from modules.ingilizce import database as ingilizce_db
+from modules.kitap import database as kitap_db
+from modules.notdefteri import database as notdefteri_db
+from modules.proje import database as proje_db
+
+
+_db = storage.register_attached(
+    'birlesik',
+    main=database._db.name,
+    attached=[m._db.name for m in (ders_db, ingilizce_db, kitap_db, notdefteri_db, proje_db)]
+)
+
+# Async handler'lar için: await <modül>.aio.<fonksiyon>(...)
+aio = storage.AsyncFacade(__name__)
+
+# datetime.weekday() -> schedule.gun (normalize edilmiş gün adı)
+GUN_MAP = dict(enumerate(ders_db.GUNLER))
+
+# Kullanıcıyı yerel saat satırına bağlayan JOIN (timezone boşsa config'deki kullanılır)
+USER_CLOCK_JOIN = "JOIN clock c ON c.timezone = COALESCE(u.timezone, ?)"
+
+
+def get_connection():
+    """Tüm veritabanlarının ATTACH edildiği bağlantıyı getir"""
+    return _db.connection()
+
+
+def local_clock(timezone: str, local_now: datetime, lead_minutes: int = 0) -> Tuple[str, str, str, str]:
+    """Bir timezone'un yerel saat satırı: (timezone, local_date, local_time 'HH:MM', gun)
+
+    local_* değerleri `lead_minutes` sonrasına göredir.
+    """
+    target = local_now + timedelta(minutes=lead_minutes)
+    return (timezone, target.date().isoformat(), target.strftime("%H:%M"), GUN_MAP[target.weekday()])
+
+
+def _clocks(now: datetime = None, lead_minutes: int = 0,
+            predicate: Callable[[datetime], bool] = None) -> List[Tuple[str, str, str, str]]:
+    """Kullanıcılarda geçen her timezone için bir yerel saat satırı
+
+    predicate şimdiki yerel zamana göre hesaplanır (bkz. local_clock).
+    """
+    if now is None:
+        now = datetime.now(pytz.utc)
+
+    clocks = []
+    for tz in database.get_user_timezones():
+        local_now = now.astimezone(time_utils.get_timezone(tz))
+        if predicate and not predicate(local_now):
+            continue
+        clocks.append(local_clock(tz, local_now, lead_minutes))
+
+    return clocks
+
+
+def _at(local_time: str) -> Callable[[datetime], bool]:
+    """Yerel saati tam olarak HH:MM olan timezone'ları seç"""
+    return lambda local_now: local_now.strftime("%H:%M") == local_time
+
+
+def _audience(column: str, users: Optional[Collection[int]] = None,
+              exclude: Collection[int] = ()) -> Tuple[str, List[Any]]:
+    """Zamanlayıcının kullanıcı kümesi için SQL koşulu (telegram_id): users verilirse sadece
+    onlar, exclude'dakiler hariç. Listeler tek JSON parametresiyle geçer (değişken sınırı yok).
+    """
+    sql, params = "", []
+    if users is not None:
+        sql += f" AND {column} IN (SELECT value FROM json_each(?))"
+        params.append(json.dumps(list(users)))
+    if exclude:
+        sql += f" AND {column} NOT IN (SELECT value FROM json_each(?))"
+        params.append(json.dumps(list(exclude)))
+    return sql, params
+
+
+def _user_clock_join(users: Optional[Collection[int]] = None,
+                     exclude: Collection[int] = ()) -> Tuple[str, List[Any]]:
+    """USER_CLOCK_JOIN + kullanıcı kümesi koşulu ve parametreleri"""
+    audience, params = _audience('u.telegram_id', users, exclude)
+    return USER_CLOCK_JOIN + audience, [TIMEZONE, *params]
+
+
+def _query(clocks: List[Tuple[str, str, str, str]], sql: str, params: List[Any] = ()) -> List[Dict[str, Any]]:
+    """Yerel saat satırlarını `clock` CTE'si olarak sorgunun başına ekleyip çalıştır"""
+    if not clocks:
+        return []
+
+    values = ", ".join("(?, ?, ?, ?)" for _ in clocks)
+    clock_params = [value for clock in clocks for value in clock]
+
+    cursor = get_connection().cursor()
+    cursor.execute(
+        f"WITH clock(timezone, local_date, local_time, gun) AS (VALUES {values})\n{sql}",
+        clock_params + list(params)
+    )
+    return [dict(r) for r in cursor.fetchall()]
+
+
+# ==================== GENEL BAKIŞ ====================
+
+def get_due_overview(now: datetime = None, homework_days: int = 3) -> List[Dict[str, Any]]:
+    """Şu an hatırlatması, yaklaşan ödevi veya bekleyen kelime tekrarı olan kullanıcılar"""
+    return _query(_clocks(now), f"""
+        SELECT * FROM (
+            SELECT u.id, u.telegram_id, c.local_date, c.local_time,
+                (SELECT COUNT(*) FROM main.reminders r
+                 WHERE r.user_id = u.id
+                 AND r.next_fire_utc <= ?) AS reminder_count,
+                (SELECT COUNT(*) FROM ders.homeworks h
+                 WHERE h.user_id = u.telegram_id
+                 AND h.tamamlandi = 0
+                 AND h.bitis_tarihi BETWEEN c.local_date AND DATE(c.local_date, ?)) AS homework_count,
+                (SELECT COUNT(*) FROM ingilizce.words w
+                 WHERE w.user_id = u.telegram_id
+                 AND w.durum = 'ogreniyor'
+                 AND w.next_review <= c.local_date) AS review_count
+            FROM main.users u
+            {USER_CLOCK_JOIN}
+        )
+        WHERE reminder_count > 0 OR homework_count > 0 OR review_count > 0
+    """, [time_utils.to_utc_str(now) if now else time_utils.utc_now_str(), f"+{homework_days} days", TIMEZONE])
+
+
+# ==================== ZAMANLAYICI SORGULARI ====================
+
+# users/exclude: ana tikin bildirim tercihlerine göre seçtiği kullanıcı kümesi (telegram_id);
+# modülü susturan kullanıcılar exclude'da gelir ve modül tablolarında hiç aranmaz
+
+def get_due_homeworks(at_time: str, lead_days: List[int] = (3, 1, 0), now: datetime = None,
+                      clocks: List[Tuple[str, str, str, str]] = None,
+                      users: Collection[int] = None, exclude: Collection[int] = ()) -> List[Dict[str, Any]]:
+    """Yerel saati `at_time` olan kullanıcıların teslimine tam `lead_days` günden biri kadar kalmış ödevleri
+
+    Tek sorgu: açık ödevler (tamamlandi, bitis_tarihi, user_id) indeksinden, tüm
+    timezone'ları kapsayan tarih aralığıyla taranır; kullanıcı ve yerel gün sonra eşlenir.
+    Satırlarda days_left (0 = bugün) bulunur; telegram_id ve teslim tarihine göre sıralıdır.
+    clocks verilirse (ana tik) timezone seçimi yapılmış sayılır, at_time kullanılmaz.
+    """
+    if clocks is None:
+        clocks = _clocks(now, predicate=_at(at_time))
+    if not clocks or not lead_days:
+        return []
+
+    local_dates = [date.fromisoformat(clock[1]) for clock in clocks]
+    first_due = (min(local_dates) + timedelta(days=min(lead_days))).isoformat()
+    last_due = (max(local_dates) + timedelta(days=max(lead_days))).isoformat()
+    lead_placeholders = ", ".join("?" for _ in lead_days)
+    audience, audience_params = _audience('h.user_id', users, exclude)
+
+    return _query(clocks, f"""
+        SELECT u.telegram_id, c.local_date AS today, h.*, l.ders_adi,
+            CAST(JULIANDAY(h.bitis_tarihi) - JULIANDAY(c.local_date) AS INTEGER) AS days_left
+        FROM ders.homeworks h
+        CROSS JOIN main.users u ON u.telegram_id = h.user_id
+        CROSS JOIN clock c ON c.timezone = COALESCE(u.timezone, ?)
+        LEFT JOIN ders.lessons l ON h.lesson_id = l.id
+        WHERE h.tamamlandi = 0
+        AND h.bitis_tarihi BETWEEN ? AND ?
+        AND JULIANDAY(h.bitis_tarihi) - JULIANDAY(c.local_date) IN ({lead_placeholders})
+        {audience}
+        ORDER BY u.telegram_id, h.bitis_tarihi ASC
+    """, [TIMEZONE, first_due, last_due, *lead_days, *audience_params])
+
+
+def get_lessons_starting(lead_minutes: int = 15, now: datetime = None,
+                         clocks: List[Tuple[str, str, str, str]] = None,
+                         users: Collection[int] = None, exclude: Collection[int] = ()) -> List[Dict[str, Any]]:
+    """`lead_minutes` sonra başlayan dersler (ders modülünün haftalık program indeksinden)
+
+    Her yerel saat satırı haftanın dakikasına çevrilip indekste aranır; kullanıcının
+    timezone'u bellekteki timezone indeksinden doğrulanır, veritabanına gidilmez.
+    """
+    if clocks is None:
+        clocks = _clocks(now, lead_minutes=lead_minutes)
+
+    # haftanın dakikası -> {timezone: yerel tarih}
+    wanted: Dict[int, Dict[str, str]] = {}
+    for timezone, local_date, local_time, gun in clocks:
+        minute = ders_db.minute_of_week(gun, local_time)
+        if minute is not None:
+            wanted.setdefault(minute, {})[timezone] = local_date
+
+    candidates = [
+        (entry, timezones)
+        for minute, timezones in wanted.items()
+        for entry in ders_db.get_lessons_at(minute)
+        if (users is None or entry['user_id'] in users) and entry['user_id'] not in exclude
+    ]
+    if not candidates:
+        return []
+
+    user_timezones = database.get_telegram_timezones({entry['user_id'] for entry, _ in candidates})
+
+    lessons = []
+    for entry, timezones in candidates:
+        timezone = user_timezones.get(entry['user_id'])
+        if timezone in timezones:
+            lessons.append({'telegram_id': entry['user_id'], 'local_date': timezones[timezone], **entry})
+    return lessons
+
+
+def get_review_counts(at_time: str, now: datetime = None,
+                      clocks: List[Tuple[str, str, str, str]] = None,
+                      users: Collection[int] = None, exclude: Collection[int] = ()) -> List[Dict[str, Any]]:
+    """Yerel saati `at_time` olan ve bugün tekrar edilecek kelimesi olan kullanıcılar
+
+    Tek GROUP BY: sayım (user_id, durum, next_review) indeksinden, hedef aynı geçişte LEFT JOIN ile.
+    """
+    if clocks is None:
+        clocks = _clocks(now, predicate=_at(at_time))
+    join, join_params = _user_clock_join(users, exclude)
+    return _query(clocks, f"""
+        SELECT u.telegram_id, c.local_date, COUNT(*) AS review_count, g.gunluk_kelime_sayisi AS goal
+        FROM main.users u
+        {join}
+        JOIN ingilizce.words w ON w.user_id = u.telegram_id
+            AND w.durum = 'ogreniyor'
+            AND w.next_review <= c.local_date
+        LEFT JOIN ingilizce.daily_goals g ON g.user_id = u.telegram_id
+        GROUP BY u.telegram_id
+    """, join_params)
+
+
+def get_word_goal_progress(at_time: str, now: datetime = None, behind_only: bool = False,
+                           clocks: List[Tuple[str, str, str, str]] = None,
+                           users: Collection[int] = None, exclude: Collection[int] = ()) -> List[Dict[str, Any]]:
+    """Yerel saati `at_time` olan ve günlük kelime hedefi olan kullanıcıların bugünkü ilerlemesi
+
+    Hedefi olanlardan yola çıkan tek GROUP BY; bugün öğrenilenler (user_id, learn_date)
+    indeksinden aralıkla sayılır. behind_only: sadece hedefin gerisinde kalanlar.
+    """
+    if clocks is None:
+        clocks = _clocks(now, predicate=_at(at_time))
+    join, join_params = _user_clock_join(users, exclude)
+    return _query(clocks, f"""
+        SELECT u.telegram_id, c.local_date, g.gunluk_kelime_sayisi AS goal, COUNT(w.id) AS learned
+        FROM ingilizce.daily_goals g
+        CROSS JOIN main.users u ON u.telegram_id = g.user_id
+        {join}
+        LEFT JOIN ingilizce.words w ON w.user_id = g.user_id
+            AND w.learn_date >= c.local_date
+            AND w.learn_date < DATE(c.local_date, '+1 day')
+        GROUP BY g.user_id
+        {"HAVING COUNT(w.id) < g.gunluk_kelime_sayisi" if behind_only else ""}
+    """, join_params)
+
+
+def get_users_without_journal(at_time: str, now: datetime = None,
+                              clocks: List[Tuple[str, str, str, str]] = None,
+                              users: Collection[int] = None, exclude: Collection[int] = ()) -> List[Dict[str, Any]]:
+    """Yerel saati `at_time` olan ve bugün (yerel tarih) günlük yazmamış kullanıcılar
+
+    Kullanıcı başına journal_status'ta tek birincil anahtar araması.
+    """
+    if clocks is None:
+        clocks = _clocks(now, predicate=_at(at_time))
+    join, join_params = _user_clock_join(users, exclude)
+    return _query(clocks, f"""
+        SELECT u.telegram_id, c.local_date, j.last_date
+        FROM main.users u
+        {join}
+        LEFT JOIN notdefteri.journal_status j ON j.user_id = u.telegram_id
+        WHERE j.last_date IS NULL OR j.last_date < c.local_date
+    """, join_params)
+
+
+def get_uncompleted_habits(start_hour: int, end_hour: int, now: datetime = None,
+                           clocks: List[Tuple[str, str, str, str]] = None,
+                           users: Collection[int] = None, exclude: Collection[int] = ()) -> List[Dict[str, Any]]:
+    """Yerel saati start_hour-end_hour arası kullanıcıların bugün tamamlanmamış günlük alışkanlıkları"""
+    if clocks is None:
+        clocks = _clocks(now, predicate=lambda local_now: start_hour <= local_now.hour < end_hour)
+    join, join_params = _user_clock_join(users, exclude)
+    return _query(clocks, f"""
+        SELECT u.telegram_id, c.local_date, c.local_time, h.*
+        FROM main.users u
+        {join}
+        JOIN main.habits h ON h.user_id = u.id
+        WHERE h.is_active = 1
+        AND h.frequency = 'daily'
+        AND NOT EXISTS (
+            SELECT 1 FROM main.habit_completions hc
+            WHERE hc.habit_id = h.id AND hc.period_date = c.local_date
+        )
+        ORDER BY u.telegram_id, h.id
+    """, join_params)
@@ -7,6 +7,7 @@ from telegram.ext import Application, ContextTypes
 from modules.base_module import BaseModule
 import database
 import ai_service
+import time_utils
 
 
 class AsistanBot(BaseModule):
@@ -48,8 +49,8 @@ Benimle dogal bir sekilde konusabilirsin!
         """Asistan modulu mesaj isleyici"""
         message_text = update.message.text
         
-        user_habits = database.get_user_habits(db_user['id'])
-        conversation_history = database.get_conversation_history(db_user['id'], limit=10)
+        user_habits = await database.aio.get_user_habits(db_user['id'])
+        conversation_history = await database.aio.get_conversation_history(db_user['id'], limit=10)
         
         result = await ai_service.analyze_message(message_text, user_habits, conversation_history)
         
@@ -67,19 +68,19 @@ Benimle dogal bir sekilde konusabilirsin!
         elif action == "show_history":
             response = await self._handle_show_history(result, db_user)
         elif action == "show_today":
-            summary = database.get_daily_summary(db_user['id'])
+            summary = await database.aio.get_daily_summary(db_user['id'])
             response = ai_service.format_today_summary(summary)
         elif action == "add_reminder":
             response = await self._handle_add_reminder(result, db_user)
         elif action == "list_reminders":
-            reminders = database.get_user_reminders(db_user['id'])
+            reminders = await database.aio.get_user_reminders(db_user['id'])
             response = ai_service.format_reminders_list(reminders)
         elif action == "delete_reminder":
             response = await self._handle_delete_reminder(result, db_user)
         elif action == "add_task":
             response = await self._handle_add_task(result, db_user)
         elif action == "list_tasks":
-            tasks = database.get_user_tasks(db_user['id'])
+            tasks = await database.aio.get_user_tasks(db_user['id'])
             response = ai_service.format_tasks_list(tasks)
         elif action == "complete_task":
             response = await self._handle_complete_task(result, db_user)
@@ -88,7 +89,7 @@ Benimle dogal bir sekilde konusabilirsin!
         elif action == "add_note":
             response = await self._handle_add_note(result, db_user)
         elif action == "list_notes":
-            notes = database.get_user_notes(db_user['id'])
+            notes = await database.aio.get_user_notes(db_user['id'])
             response = ai_service.format_notes_list(notes)
         elif action == "delete_note":
             response = await self._handle_delete_note(result, db_user)
@@ -98,9 +99,9 @@ Benimle dogal bir sekilde konusabilirsin!
         except Exception:
             await update.message.reply_text(response.replace('*', '').replace('_', ''))
         
-        database.add_conversation_message(db_user['id'], 'user', message_text)
-        database.add_conversation_message(db_user['id'], 'assistant', response[:500])
-        database.clear_old_conversation_history(db_user['id'], keep_last=20)
+        # Bellekteki tampona eklenir; veritabanina zamanlayici toplu yazar
+        await database.aio.add_conversation_message(db_user['id'], 'user', message_text)
+        await database.aio.add_conversation_message(db_user['id'], 'assistant', response[:500])
     
     async def _handle_add_habit(self, result: dict, db_user: dict) -> str:
         habit_name = result.get('habit_name', '')
@@ -108,7 +109,7 @@ Benimle dogal bir sekilde konusabilirsin!
         target = result.get('target', '')
         
         if habit_name:
-            database.add_habit(
+            await database.aio.add_habit(
                 user_id=db_user['id'],
                 name=habit_name,
                 frequency=frequency,
@@ -122,33 +123,42 @@ Benimle dogal bir sekilde konusabilirsin!
             return response
         return "Aliskanlik adi belirtilmedi."
     
+    async def _habit_not_found(self, habit_name: str, db_user: dict) -> str:
+        # Yazim hatasina yakin isim yalnizca onerilir; silme/tamamlama kullanici onaylamadan yapilmaz
+        suggestion = await database.aio.suggest_habit(db_user['id'], habit_name)
+        if suggestion:
+            return f"'{habit_name}' adinda bir aliskanlik bulunamadi. *'{suggestion['name']}'* mi demek istedin?"
+        return f"'{habit_name}' adinda bir aliskanlik bulunamadi."
+    
     async def _handle_complete_habit(self, result: dict, db_user: dict) -> str:
         habit_name = result.get('habit_name', '')
         
         if habit_name:
-            habit = database.get_habit_by_name(db_user['id'], habit_name)
+            habit = await database.aio.get_habit_by_name(db_user['id'], habit_name)
             
             if habit:
-                if database.is_habit_completed_today(habit['id']):
+                # Tamamlama kullanicinin yerel gunune yazilir (hatirlatma sorgusu da onu kullanir)
+                today = time_utils.get_user_now(db_user.get('timezone')).date()
+                if await database.aio.is_habit_completed_today(habit['id'], today):
                     return f"*'{habit['name']}'* zaten bugun icin tamamlanmis."
                 else:
-                    database.complete_habit(habit['id'])
+                    await database.aio.complete_habit(habit['id'], today)
                     return f"Harika! *'{habit['name']}'* tamamlandi olarak isaretlendi!"
             else:
-                return f"'{habit_name}' adinda bir aliskanlik bulunamadi."
+                return await self._habit_not_found(habit_name, db_user)
         return "Aliskanlik adi belirtilmedi."
     
     async def _handle_delete_habit(self, result: dict, db_user: dict) -> str:
         habit_name = result.get('habit_name', '')
         
         if habit_name:
-            habit = database.get_habit_by_name(db_user['id'], habit_name)
+            habit = await database.aio.get_habit_by_name(db_user['id'], habit_name)
             
             if habit:
-                database.delete_habit(habit['id'])
+                await database.aio.delete_habit(habit['id'])
                 return f"*'{habit['name']}'* aliskanligi silindi."
             else:
-                return f"'{habit_name}' adinda bir aliskanlik bulunamadi."
+                return await self._habit_not_found(habit_name, db_user)
         return "Silinecek aliskanlik belirtilmedi."
     
     async def _handle_show_history(self, result: dict, db_user: dict) -> str:
@@ -158,28 +168,43 @@ Benimle dogal bir sekilde konusabilirsin!
                 days = int(days)
             except:
                 days = 7
-        history = database.get_habit_history(db_user['id'], days)
+        history = await database.aio.get_habit_history(db_user['id'], days)
         return ai_service.format_history(history, days)
     
     async def _handle_add_reminder(self, result: dict, db_user: dict) -> str:
-        from datetime import date
+        from datetime import date, timedelta
         
         reminder_title = result.get('reminder_title', '')
-        remind_at = result.get('remind_at', '')
+        remind_at = result.get('remind_at', '') or ''
         remind_date_str = result.get('remind_date', None)
         is_recurring = result.get('is_recurring', False)
+        remind_in_seconds = result.get('remind_in_seconds')
+        
+        remind_date = None
+        date_text = "Bugun"
+        
+        # "90 saniye sonra" gibi goreli istekler: kullanicinin yerel saatine gore mutlak ana cevir
+        try:
+            remind_in_seconds = int(remind_in_seconds) if remind_in_seconds not in (None, "null", "") else None
+        except (TypeError, ValueError):
+            remind_in_seconds = None
+        if remind_in_seconds is not None and remind_in_seconds > 0 and not is_recurring:
+            target = time_utils.get_user_now(db_user.get('timezone')) + timedelta(seconds=remind_in_seconds)
+            remind_at = target.strftime("%H:%M:%S")
+            remind_date_str = target.date().isoformat()
         
         if reminder_title and remind_at:
             try:
                 parts = remind_at.split(':')
-                if len(parts) == 2:
+                if len(parts) in (2, 3):
                     hour = int(parts[0])
                     minute = int(parts[1])
-                    if 0 <= hour <= 23 and 0 <= minute <= 59:
+                    second = int(parts[2]) if len(parts) == 3 else 0
+                    if 0 <= hour <= 23 and 0 <= minute <= 59 and 0 <= second <= 59:
                         remind_at = f"{hour:02d}:{minute:02d}"
+                        if second:
+                            remind_at += f":{second:02d}"
                         
-                        remind_date = None
-                        date_text = "Bugun"
                         if remind_date_str and remind_date_str != "null":
                             try:
                                 remind_date = date.fromisoformat(remind_date_str)
@@ -187,7 +212,7 @@ Benimle dogal bir sekilde konusabilirsin!
                             except:
                                 pass
                         
-                        database.add_reminder(
+                        await database.aio.add_reminder(
                             user_id=db_user['id'],
                             title=reminder_title,
                             remind_at=remind_at,
@@ -207,10 +232,10 @@ Benimle dogal bir sekilde konusabilirsin!
         reminder_title = result.get('reminder_title', '')
         
         if reminder_title:
-            reminder = database.get_reminder_by_title(db_user['id'], reminder_title)
+            reminder = await database.aio.get_reminder_by_title(db_user['id'], reminder_title)
             
             if reminder:
-                database.delete_reminder(reminder['id'])
+                await database.aio.delete_reminder(reminder['id'])
                 return f"*'{reminder['title']}'* hatirlatmasi silindi."
             else:
                 return f"'{reminder_title}' ile eslesen bir hatirlatma bulunamadi."
@@ -232,7 +257,7 @@ Benimle dogal bir sekilde konusabilirsin!
                 except:
                     pass
             
-            database.add_task(
+            await database.aio.add_task(
                 user_id=db_user['id'],
                 title=task_title,
                 due_date=due_date
@@ -244,10 +269,10 @@ Benimle dogal bir sekilde konusabilirsin!
         task_title = result.get('task_title', '')
         
         if task_title:
-            task = database.get_task_by_title(db_user['id'], task_title)
+            task = await database.aio.get_task_by_title(db_user['id'], task_title)
             
             if task:
-                database.complete_task(task['id'])
+                await database.aio.complete_task(task['id'])
                 return f"*'{task['title']}'* gorevi tamamlandi!"
             else:
                 return f"'{task_title}' ile eslesen bir gorev bulunamadi."
@@ -257,10 +282,10 @@ Benimle dogal bir sekilde konusabilirsin!
         task_title = result.get('task_title', '')
         
         if task_title:
-            task = database.get_task_by_title(db_user['id'], task_title)
+            task = await database.aio.get_task_by_title(db_user['id'], task_title)
             
             if task:
-                database.delete_task(task['id'])
+                await database.aio.delete_task(task['id'])
                 return f"*'{task['title']}'* gorevi silindi."
             else:
                 return f"'{task_title}' ile eslesen bir gorev bulunamadi."
@@ -270,7 +295,7 @@ Benimle dogal bir sekilde konusabilirsin!
         note_content = result.get('note_content', '')
         
         if note_content:
-            database.add_note(
+            await database.aio.add_note(
                 user_id=db_user['id'],
                 content=note_content
             )
@@ -281,10 +306,10 @@ Benimle dogal bir sekilde konusabilirsin!
         note_content = result.get('note_content', '')
         
         if note_content:
-            note = database.get_note_by_content(db_user['id'], note_content)
+            note = await database.aio.get_note_by_content(db_user['id'], note_content)
             
             if note:
-                database.delete_note(note['id'])
+                await database.aio.delete_note(note['id'])
                 short_content = note['content'][:30] + "..." if len(note['content']) > 30 else note['content']
                 return f"Not silindi: {short_content}"
             else:
@@ -3,21 +3,92 @@ Ders Modülü Database
 Ayrı database: modules/ders/ders.db
 """
 import sqlite3
+import threading
 from datetime import datetime, date, timedelta
 from typing import Optional, List, Dict, Any
 import os
+import storage
+import text_utils
 
 
 # Database path - modules/ders klasörü içinde
 DB_DIR = os.path.dirname(os.path.abspath(__file__))
 DATABASE_PATH = os.path.join(DB_DIR, "ders.db")
 
+_db = storage.register('ders', DATABASE_PATH)
+
+# Async handler'lar için: await <modül>.aio.<fonksiyon>(...)
+aio = storage.AsyncFacade(__name__)
+
 
 def get_connection():
-    """Ders veritabanı bağlantısı oluştur"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """Ders veritabanı bağlantısını getir (thread başına havuzlanmış, kapatılmaz)"""
+    return _db.connection()
+
+
+# Program günleri haftanın günü sırasıyla; schedule.gun normalize edilmiş halini tutar
+# ("Çarşamba" / "çarşamba" / "carsamba" -> "carsamba")
+GUNLER = ('pazartesi', 'sali', 'carsamba', 'persembe', 'cuma', 'cumartesi', 'pazar')
+
+
+def normalize_gun(gun: str) -> str:
+    return text_utils.normalize_turkish(gun)
+
+
+# ==================== MİGRASYONLAR ====================
+
+def _unique_lessons(cursor: sqlite3.Cursor):
+    """Aynı ders kodunun tekrarlarını ilk kayda bağlayıp sil, sonra UNIQUE yap"""
+    cursor.execute("""
+        CREATE TEMP TABLE lesson_remap AS
+        SELECT l.id AS old_id, k.keep_id AS new_id
+        FROM lessons l
+        JOIN (
+            SELECT user_id, ders_kodu, MIN(id) AS keep_id
+            FROM lessons GROUP BY user_id, ders_kodu
+        ) k ON k.user_id = l.user_id AND k.ders_kodu = l.ders_kodu
+        WHERE l.id != k.keep_id
+    """)
+    for table in ('schedule', 'study_records', 'question_records', 'homeworks'):
+        cursor.execute(f"""
+            UPDATE {table}
+            SET lesson_id = (SELECT new_id FROM lesson_remap WHERE old_id = {table}.lesson_id)
+            WHERE lesson_id IN (SELECT old_id FROM lesson_remap)
+        """)
+    cursor.execute("DELETE FROM lessons WHERE id IN (SELECT old_id FROM lesson_remap)")
+    cursor.execute("DROP TABLE lesson_remap")
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_lessons_user_code ON lessons(user_id, ders_kodu)")
+
+
+def _normalize_schedule_days(cursor: sqlite3.Cursor):
+    """Eski kayıtlarda gün adları karışık ('çarşamba', 'Salı', 'carsamba'): normalize et"""
+    cursor.execute("SELECT DISTINCT gun FROM schedule")
+    cursor.executemany(
+        "UPDATE schedule SET gun = ? WHERE gun = ?",
+        [(normalize_gun(row['gun']), row['gun']) for row in cursor.fetchall()
+         if normalize_gun(row['gun']) != row['gun']]
+    )
+
+
+# Yeni migrasyonlar listenin sonuna, artan versiyon numarasıyla eklenir
+MIGRATIONS = [
+    (1, "Sorgu indeksleri", """
+        CREATE INDEX IF NOT EXISTS idx_schedule_user_day_start ON schedule(user_id, gun, baslangic_saati);
+        CREATE INDEX IF NOT EXISTS idx_schedule_user_day_slot ON schedule(user_id, gun, saat_no);
+        CREATE INDEX IF NOT EXISTS idx_schedule_lesson ON schedule(lesson_id);
+        CREATE INDEX IF NOT EXISTS idx_study_records_user_date ON study_records(user_id, tarih);
+        CREATE INDEX IF NOT EXISTS idx_study_records_lesson ON study_records(lesson_id);
+        CREATE INDEX IF NOT EXISTS idx_question_records_user_date ON question_records(user_id, tarih);
+        CREATE INDEX IF NOT EXISTS idx_question_records_lesson ON question_records(lesson_id);
+        CREATE INDEX IF NOT EXISTS idx_homeworks_user_done_due ON homeworks(user_id, tamamlandi, bitis_tarihi);
+    """),
+    (2, "Kullanıcı başına tekil ders kodu (UNIQUE)", _unique_lessons),
+    # Zamanlayıcı tüm kullanıcıların açık ödevlerini teslim tarihi aralığından tarar
+    (3, "Açık ödevler için teslim tarihi indeksi", """
+        CREATE INDEX IF NOT EXISTS idx_homeworks_open_due ON homeworks(tamamlandi, bitis_tarihi, user_id);
+    """),
+    (4, "Program gün adlarını normalize et", _normalize_schedule_days),
+]
 
 
 def init_ders_database():
@@ -101,27 +172,29 @@ def init_ders_database():
     """)
     
     conn.commit()
-    conn.close()
+    
+    storage.migrate(conn, MIGRATIONS)
 
 
 # ==================== DERS İŞLEMLERİ ====================
 
 def add_lesson(user_id: int, ders_kodu: str, ders_adi: str, ogretmen: str = None, haftalik_saat: int = None) -> Dict[str, Any]:
-    """Yeni ders ekle"""
+    """Yeni ders ekle (aynı ders kodu varsa, program yükleyicideki gibi bilgilerini güncelle)"""
     conn = get_connection()
     cursor = conn.cursor()
     
-    cursor.execute("""
-        INSERT INTO lessons (user_id, ders_kodu, ders_adi, ogretmen, haftalik_saat)
-        VALUES (?, ?, ?, ?, ?)
-    """, (user_id, ders_kodu, ders_adi, ogretmen, haftalik_saat))
-    
-    conn.commit()
-    lesson_id = cursor.lastrowid
-    
-    cursor.execute("SELECT * FROM lessons WHERE id = ?", (lesson_id,))
-    lesson = cursor.fetchone()
-    conn.close()
+    with conn:
+        cursor.execute("""
+            INSERT INTO lessons (user_id, ders_kodu, ders_adi, ogretmen, haftalik_saat)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(user_id, ders_kodu) DO UPDATE SET
+                ders_adi = excluded.ders_adi,
+                ogretmen = COALESCE(excluded.ogretmen, ogretmen),
+                haftalik_saat = COALESCE(excluded.haftalik_saat, haftalik_saat)
+            RETURNING *
+        """, (user_id, ders_kodu, ders_adi, ogretmen, haftalik_saat))
+        lesson = cursor.fetchone()
+    clear_timetable_index()
     
     return dict(lesson)
 
@@ -133,31 +206,20 @@ def get_user_lessons(user_id: int) -> List[Dict[str, Any]]:
     
     cursor.execute("SELECT * FROM lessons WHERE user_id = ? ORDER BY ders_kodu", (user_id,))
     lessons = cursor.fetchall()
-    conn.close()
     
     return [dict(l) for l in lessons]
 
 
 def get_lesson_by_code_or_name(user_id: int, search: str) -> Optional[Dict[str, Any]]:
-    """Ders kodu veya adına göre ders bul"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    search_upper = search.upper()
-    
-    cursor.execute("""
-        SELECT * FROM lessons 
-        WHERE user_id = ? AND (
-            UPPER(ders_kodu) LIKE ? OR 
-            UPPER(ders_adi) LIKE ?
-        )
-        LIMIT 1
-    """, (user_id, f"%{search_upper}%", f"%{search_upper}%"))
+    """Ders kodu veya adına göre ders bul (Türkçe karakter ve yazım hatası toleranslı)"""
+    lessons = get_user_lessons(user_id)
     
-    lesson = cursor.fetchone()
-    conn.close()
+    lesson_id = text_utils.best_match(
+        search,
+        ((lesson['id'], (lesson['ders_adi'], lesson['ders_kodu'])) for lesson in lessons)
+    )
     
-    return dict(lesson) if lesson else None
+    return next((lesson for lesson in lessons if lesson['id'] == lesson_id), None)
 
 
 # ==================== PROGRAM İŞLEMLERİ ====================
@@ -168,17 +230,14 @@ def add_schedule_entry(user_id: int, lesson_id: int, gun: str, saat_no: int,
     conn = get_connection()
     cursor = conn.cursor()
     
-    cursor.execute("""
-        INSERT INTO schedule (user_id, lesson_id, gun, saat_no, baslangic_saati, bitis_saati)
-        VALUES (?, ?, ?, ?, ?, ?)
-    """, (user_id, lesson_id, gun, saat_no, baslangic_saati, bitis_saati))
-    
-    conn.commit()
-    entry_id = cursor.lastrowid
-    
-    cursor.execute("SELECT * FROM schedule WHERE id = ?", (entry_id,))
-    entry = cursor.fetchone()
-    conn.close()
+    with conn:
+        cursor.execute("""
+            INSERT INTO schedule (user_id, lesson_id, gun, saat_no, baslangic_saati, bitis_saati)
+            VALUES (?, ?, ?, ?, ?, ?)
+            RETURNING *
+        """, (user_id, lesson_id, normalize_gun(gun), saat_no, baslangic_saati, bitis_saati))
+        entry = cursor.fetchone()
+    clear_timetable_index()
     
     return dict(entry)
 
@@ -194,10 +253,9 @@ def get_schedule_for_day(user_id: int, gun: str) -> List[Dict[str, Any]]:
         JOIN lessons l ON s.lesson_id = l.id
         WHERE s.user_id = ? AND s.gun = ?
         ORDER BY s.saat_no
-    """, (user_id, gun.lower()))
+    """, (user_id, normalize_gun(gun)))
     
     schedule = cursor.fetchall()
-    conn.close()
     
     return [dict(s) for s in schedule]
 
@@ -212,14 +270,76 @@ def get_schedule_by_hour(user_id: int, gun: str, saat_no: int) -> Optional[Dict[
         FROM schedule s
         JOIN lessons l ON s.lesson_id = l.id
         WHERE s.user_id = ? AND s.gun = ? AND s.saat_no = ?
-    """, (user_id, gun.lower(), saat_no))
+    """, (user_id, normalize_gun(gun), saat_no))
     
     entry = cursor.fetchone()
-    conn.close()
     
     return dict(entry) if entry else None
 
 
+# ==================== HAFTALIK PROGRAM İNDEKSİ ====================
+
+# Ders başlangıç hatırlatmaları her dakika SQL çalıştırmak yerine buraya bakar:
+# haftanın dakikası (pazartesi 00:00 = 0) -> o dakikada başlayan program girişleri.
+# İlk kullanımda yüklenir; programı değiştiren her yazma clear_timetable_index() çağırır.
+MINUTES_PER_DAY = 24 * 60
+
+_timetable: Optional[Dict[int, List[Dict[str, Any]]]] = None
+_timetable_version = 0  # yükleme sırasında temizlenirse eski veri kurulmasın
+_timetable_lock = threading.Lock()
+
+
+def minute_of_week(gun: str, saat: str) -> Optional[int]:
+    """("çarşamba", "09:25") -> 2 * 1440 + 565; tanınmayan gün/saat için None"""
+    try:
+        day = GUNLER.index(normalize_gun(gun))
+        hour, minute = (int(part) for part in saat.split(':')[:2])
+    except (ValueError, AttributeError):
+        return None
+    return day * MINUTES_PER_DAY + hour * 60 + minute
+
+
+def _load_timetable():
+    global _timetable
+    with _timetable_lock:
+        version = _timetable_version
+
+    cursor = get_connection().cursor()
+    cursor.execute("""
+        SELECT s.id, s.user_id, s.lesson_id, s.gun, s.saat_no, s.baslangic_saati, s.bitis_saati,
+               l.ders_kodu, l.ders_adi, l.ogretmen
+        FROM schedule s
+        JOIN lessons l ON s.lesson_id = l.id
+    """)
+    index: Dict[int, List[Dict[str, Any]]] = {}
+    for row in cursor.fetchall():
+        minute = minute_of_week(row['gun'], row['baslangic_saati'])
+        if minute is not None:
+            index.setdefault(minute, []).append(dict(row))
+
+    with _timetable_lock:
+        if _timetable is None and version == _timetable_version:
+            _timetable = index
+
+
+def get_lessons_at(minute: int) -> List[Dict[str, Any]]:
+    """Haftanın `minute` dakikasında başlayan tüm program girişleri (bellekten, ders bilgisiyle)"""
+    if _timetable is None:
+        _load_timetable()
+    with _timetable_lock:
+        if _timetable is None:
+            return []  # yüklenirken program değişti; sonraki dakika yeniden yüklenir
+        return list(_timetable.get(minute, ()))
+
+
+def clear_timetable_index():
+    """Program indeksini at (sonraki kullanımda yeniden yüklenir)"""
+    global _timetable, _timetable_version
+    with _timetable_lock:
+        _timetable = None
+        _timetable_version += 1
+
+
 # ==================== ÇALIŞMA KAYITLARI ====================
 
 def add_study_record(user_id: int, lesson_id: int, konu: str = None, 
@@ -231,17 +351,13 @@ def add_study_record(user_id: int, lesson_id: int, konu: str = None,
     if tarih is None:
         tarih = date.today()
     
-    cursor.execute("""
-        INSERT INTO study_records (user_id, lesson_id, konu, sure_dakika, tarih, notlar)
-        VALUES (?, ?, ?, ?, ?, ?)
-    """, (user_id, lesson_id, konu, sure_dakika, tarih.isoformat(), notlar))
-    
-    conn.commit()
-    record_id = cursor.lastrowid
-    
-    cursor.execute("SELECT * FROM study_records WHERE id = ?", (record_id,))
-    record = cursor.fetchone()
-    conn.close()
+    with conn:
+        cursor.execute("""
+            INSERT INTO study_records (user_id, lesson_id, konu, sure_dakika, tarih, notlar)
+            VALUES (?, ?, ?, ?, ?, ?)
+            RETURNING *
+        """, (user_id, lesson_id, konu, sure_dakika, tarih.isoformat(), notlar))
+        record = cursor.fetchone()
     
     return dict(record)
 
@@ -262,7 +378,6 @@ def get_study_records(user_id: int, days: int = 7) -> List[Dict[str, Any]]:
     """, (user_id, from_date))
     
     records = cursor.fetchall()
-    conn.close()
     
     return [dict(r) for r in records]
 
@@ -283,7 +398,6 @@ def get_today_study_records(user_id: int) -> List[Dict[str, Any]]:
     """, (user_id, today))
     
     records = cursor.fetchall()
-    conn.close()
     
     return [dict(r) for r in records]
 
@@ -299,17 +413,13 @@ def add_question_record(user_id: int, lesson_id: int, soru_sayisi: int,
     if tarih is None:
         tarih = date.today()
     
-    cursor.execute("""
-        INSERT INTO question_records (user_id, lesson_id, konu, soru_sayisi, tarih, notlar)
-        VALUES (?, ?, ?, ?, ?, ?)
-    """, (user_id, lesson_id, konu, soru_sayisi, tarih.isoformat(), notlar))
-    
-    conn.commit()
-    record_id = cursor.lastrowid
-    
-    cursor.execute("SELECT * FROM question_records WHERE id = ?", (record_id,))
-    record = cursor.fetchone()
-    conn.close()
+    with conn:
+        cursor.execute("""
+            INSERT INTO question_records (user_id, lesson_id, konu, soru_sayisi, tarih, notlar)
+            VALUES (?, ?, ?, ?, ?, ?)
+            RETURNING *
+        """, (user_id, lesson_id, konu, soru_sayisi, tarih.isoformat(), notlar))
+        record = cursor.fetchone()
     
     return dict(record)
 
@@ -343,7 +453,6 @@ def get_question_stats(user_id: int, days: int = 7) -> Dict[str, Any]:
     """, (user_id, from_date))
     
     ders_bazinda = cursor.fetchall()
-    conn.close()
     
     return {
         'toplam': toplam,
@@ -381,7 +490,6 @@ def get_today_question_stats(user_id: int) -> Dict[str, Any]:
     """, (user_id, today))
     
     ders_bazinda = cursor.fetchall()
-    conn.close()
     
     return {
         'toplam': toplam,
@@ -401,17 +509,13 @@ def add_homework(user_id: int, baslik: str, bitis_tarihi: date, lesson_id: int =
     if baslangic_tarihi is None:
         baslangic_tarihi = date.today()
     
-    cursor.execute("""
-        INSERT INTO homeworks (user_id, lesson_id, baslik, aciklama, baslangic_tarihi, bitis_tarihi)
-        VALUES (?, ?, ?, ?, ?, ?)
-    """, (user_id, lesson_id, baslik, aciklama, baslangic_tarihi.isoformat(), bitis_tarihi.isoformat()))
-    
-    conn.commit()
-    hw_id = cursor.lastrowid
-    
-    cursor.execute("SELECT * FROM homeworks WHERE id = ?", (hw_id,))
-    hw = cursor.fetchone()
-    conn.close()
+    with conn:
+        cursor.execute("""
+            INSERT INTO homeworks (user_id, lesson_id, baslik, aciklama, baslangic_tarihi, bitis_tarihi)
+            VALUES (?, ?, ?, ?, ?, ?)
+            RETURNING *
+        """, (user_id, lesson_id, baslik, aciklama, baslangic_tarihi.isoformat(), bitis_tarihi.isoformat()))
+        hw = cursor.fetchone()
     
     return dict(hw)
 
@@ -430,7 +534,6 @@ def get_pending_homeworks(user_id: int) -> List[Dict[str, Any]]:
     """, (user_id,))
     
     homeworks = cursor.fetchall()
-    conn.close()
     
     return [dict(h) for h in homeworks]
 
@@ -440,15 +543,13 @@ def complete_homework(homework_id: int) -> bool:
     conn = get_connection()
     cursor = conn.cursor()
     
-    cursor.execute("""
-        UPDATE homeworks 
-        SET tamamlandi = 1, tamamlanma_tarihi = ?
-        WHERE id = ?
-    """, (datetime.now().isoformat(), homework_id))
-    
-    conn.commit()
+    with conn:
+        cursor.execute("""
+            UPDATE homeworks 
+            SET tamamlandi = 1, tamamlanma_tarihi = ?
+            WHERE id = ?
+        """, (datetime.now().isoformat(), homework_id))
     affected = cursor.rowcount
-    conn.close()
     
     return affected > 0
 
@@ -469,7 +570,6 @@ def get_homework_by_title(user_id: int, title_search: str) -> Optional[Dict[str,
     """, (user_id, f"%{title_search.upper()}%"))
     
     hw = cursor.fetchone()
-    conn.close()
     
     return dict(hw) if hw else None
 
@@ -514,7 +614,6 @@ def get_study_stats(user_id: int, days: int = 7) -> Dict[str, Any]:
     """, (user_id, from_date))
 
     ders_bazinda = cursor.fetchall()
-    conn.close()
 
     return {
         'toplam_dakika': toplam_dakika,
@@ -528,17 +627,16 @@ def delete_lesson(lesson_id: int) -> bool:
     conn = get_connection()
     cursor = conn.cursor()
 
-    # İlişkili kayıtları sil
-    cursor.execute("DELETE FROM schedule WHERE lesson_id = ?", (lesson_id,))
-    cursor.execute("DELETE FROM study_records WHERE lesson_id = ?", (lesson_id,))
-    cursor.execute("DELETE FROM question_records WHERE lesson_id = ?", (lesson_id,))
-    cursor.execute("UPDATE homeworks SET lesson_id = NULL WHERE lesson_id = ?", (lesson_id,))
+    with conn:
+        # İlişkili kayıtları sil
+        cursor.execute("DELETE FROM schedule WHERE lesson_id = ?", (lesson_id,))
+        cursor.execute("DELETE FROM study_records WHERE lesson_id = ?", (lesson_id,))
+        cursor.execute("DELETE FROM question_records WHERE lesson_id = ?", (lesson_id,))
+        cursor.execute("UPDATE homeworks SET lesson_id = NULL WHERE lesson_id = ?", (lesson_id,))
 
-    # Dersi sil
-    cursor.execute("DELETE FROM lessons WHERE id = ?", (lesson_id,))
-
-    conn.commit()
+        # Dersi sil
+        cursor.execute("DELETE FROM lessons WHERE id = ?", (lesson_id,))
     affected = cursor.rowcount
-    conn.close()
+    clear_timetable_index()
 
     return affected > 0
@@ -3,118 +3,211 @@ Ders programını otomatik yükle
 Kullanıcının verdiği programı database'e kaydet
 """
 from . import database as db
+from text_utils import normalize_turkish
 import csv
 import io
+import re
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+
+# Bir yüklemede kullanıcıya gösterilecek en fazla satır hatası
+MAX_REPORTED_ERRORS = 10
+
+REQUIRED_COLUMNS = {'gun', 'saat_no', 'baslangic', 'bitis', 'ders_kodu', 'ders_adi'}
+
+# Geçerli gün adları (normalize edilmiş: "Çarşamba" -> "carsamba")
+VALID_DAYS = set(db.GUNLER)
+
+_TIME_PATTERN = re.compile(r"^([01]?\d|2[0-3]):[0-5]\d$")
+
+# Kullanıcı başına ders verisini silen ifadeler (sıra önemli: önce bağlı kayıtlar)
+_CLEAR_STATEMENTS = (
+    "DELETE FROM schedule WHERE lesson_id IN (SELECT id FROM lessons WHERE user_id = ?)",
+    "DELETE FROM study_records WHERE lesson_id IN (SELECT id FROM lessons WHERE user_id = ?)",
+    "DELETE FROM question_records WHERE lesson_id IN (SELECT id FROM lessons WHERE user_id = ?)",
+    "DELETE FROM lessons WHERE user_id = ?",
+)
+
+# Çok kullanıcılı yüklemede yalnızca haftalık program değişir; dersler (user_id, ders_kodu)
+# üzerinden güncellendiği için id'leri ve onlara bağlı çalışma/soru kayıtları korunur
+_REPLACE_STATEMENTS = (
+    "DELETE FROM schedule WHERE user_id = ?",
+)
+
+
+def _result(success: bool, message: str, ders_sayisi: int = 0, program_sayisi: int = 0,
+            kullanici_sayisi: int = 0) -> dict:
+    return {
+        'success': success,
+        'message': message,
+        'ders_sayisi': ders_sayisi,
+        'program_sayisi': program_sayisi,
+        'kullanici_sayisi': kullanici_sayisi
+    }
+
+
+def _clear_schedules(cursor, user_ids: Iterable[int], statements: Tuple[str, ...] = _CLEAR_STATEMENTS):
+    """Kullanıcıların ders ve program verilerini sil (transaction'ı çağıran yönetir)"""
+    params = [(uid,) for uid in user_ids]
+    for statement in statements:
+        cursor.executemany(statement, params)
+
+
+def _insert_schedules(cursor, lessons: Dict[Tuple[int, str], tuple], entries: List[tuple]):
+    """Dersleri ve program girişlerini toplu ekle (transaction'ı çağıran yönetir)
+
+    lessons: {(user_id, ders_kodu): (ders_adi, ogretmen, haftalik_saat)}
+    entries: [(user_id, ders_kodu, gun, saat_no, baslangic, bitis), ...]
+    Gün adları normalize edilerek yazılır; çağıran commit sonrası db.clear_timetable_index() çağırmalı.
+    """
+    cursor.executemany("""
+        INSERT INTO lessons (user_id, ders_kodu, ders_adi, ogretmen, haftalik_saat)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(user_id, ders_kodu) DO UPDATE SET
+            ders_adi = excluded.ders_adi,
+            ogretmen = excluded.ogretmen,
+            haftalik_saat = COALESCE(excluded.haftalik_saat, haftalik_saat)
+    """, [(uid, kod, *values) for (uid, kod), values in lessons.items()])
+
+    # lesson_id, UNIQUE(user_id, ders_kodu) indeksiyle aynı ifadede bulunur
+    cursor.executemany("""
+        INSERT INTO schedule (user_id, lesson_id, gun, saat_no, baslangic_saati, bitis_saati)
+        SELECT user_id, id, ?, ?, ?, ? FROM lessons WHERE user_id = ? AND ders_kodu = ?
+    """, [(db.normalize_gun(gun), saat_no, baslangic, bitis, uid, kod)
+          for uid, kod, gun, saat_no, baslangic, bitis in entries])
 
 
 def clear_user_schedule(user_id: int) -> bool:
     """Kullanıcının tüm ders ve program verilerini sil"""
     conn = db.get_connection()
-    cursor = conn.cursor()
-    
-    # Önce kullanıcının ders ID'lerini al
-    cursor.execute("SELECT id FROM lessons WHERE user_id = ?", (user_id,))
-    lesson_ids = [row['id'] for row in cursor.fetchall()]
-    
-    if lesson_ids:
-        # İlişkili kayıtları sil
-        for lesson_id in lesson_ids:
-            cursor.execute("DELETE FROM schedule WHERE lesson_id = ?", (lesson_id,))
-            cursor.execute("DELETE FROM study_records WHERE lesson_id = ?", (lesson_id,))
-            cursor.execute("DELETE FROM question_records WHERE lesson_id = ?", (lesson_id,))
-        
-        # Dersleri sil
-        cursor.execute("DELETE FROM lessons WHERE user_id = ?", (user_id,))
-    
-    conn.commit()
-    conn.close()
+    with conn:
+        _clear_schedules(conn.cursor(), [user_id])
+    db.clear_timetable_index()
     return True
 
 
-def load_schedule_from_csv(user_id: int, csv_content: str) -> dict:
+def parse_schedule_csv(csv_content: Union[str, Iterable[str]], user_id: int,
+                       allow_other_users: bool = False):
+    """
+    CSV'yi satır satır oku ve doğrula
+
+    Opsiyonel 'kullanici_id' sütunu ile tek dosyada birden fazla kullanıcının
+    (ör. okulun tüm sınıfları) programı verilebilir; boş bırakılan satırlar
+    yükleyen kullanıcıya aittir. Başka kullanıcılar için satır yalnızca
+    allow_other_users ise kabul edilir.
+
+    Returns:
+        (lessons, entries, errors) - errors: ["Satır N: ...", ...]
+    """
+    lines = io.StringIO(csv_content) if isinstance(csv_content, str) else csv_content
+    reader = csv.DictReader(lines)
+
+    # Dosya BOM ile başlıyorsa ilk sütun adında kalır
+    fieldnames = [(name or '').lstrip('\ufeff').strip().lower() for name in (reader.fieldnames or [])]
+    reader.fieldnames = fieldnames
+    missing = REQUIRED_COLUMNS - set(fieldnames)
+    if missing:
+        return {}, [], [f"Eksik sütunlar: {', '.join(sorted(missing))}"]
+
+    lessons: Dict[Tuple[int, str], tuple] = {}
+    entries: List[tuple] = []
+    errors: List[str] = []
+
+    for row in reader:
+        line = reader.line_num
+        values = {key: (value or '').strip() for key, value in row.items() if key}
+        if not any(values.values()):
+            continue  # boş satır
+
+        problems = [f"'{column}' boş" for column in sorted(REQUIRED_COLUMNS) if not values.get(column)]
+
+        owner = user_id
+        if values.get('kullanici_id'):
+            try:
+                owner = int(values['kullanici_id'])
+            except ValueError:
+                problems.append(f"geçersiz kullanici_id '{values['kullanici_id']}'")
+            else:
+                if owner != user_id and not allow_other_users:
+                    problems.append("başka kullanıcı için program yükleme yetkin yok")
+
+        gun = values.get('gun', '').lower()
+        if gun and normalize_turkish(gun) not in VALID_DAYS:
+            problems.append(f"bilinmeyen gün '{values['gun']}'")
+
+        saat_no = None
+        if values.get('saat_no'):
+            try:
+                saat_no = int(values['saat_no'])
+            except ValueError:
+                problems.append(f"saat_no sayı olmalı ('{values['saat_no']}')")
+
+        for column in ('baslangic', 'bitis'):
+            if values.get(column) and not _TIME_PATTERN.match(values[column]):
+                problems.append(f"{column} SS:DD biçiminde olmalı ('{values[column]}')")
+
+        if problems:
+            errors.append(f"Satır {line}: {', '.join(problems)}")
+            continue
+
+        ders_kodu = values['ders_kodu'].upper()
+        # Aynı ders birden fazla satırda geçerse ilk satırdaki ad/öğretmen kullanılır
+        lessons.setdefault((owner, ders_kodu), (values['ders_adi'], values.get('ogretmen') or None, None))
+        # "8:30" -> "08:30" (saat karşılaştırmaları metin üzerinden yapılıyor)
+        entries.append((owner, ders_kodu, gun, saat_no,
+                        values['baslangic'].zfill(5), values['bitis'].zfill(5)))
+
+    return lessons, entries, errors
+
+
+def load_schedule_from_csv(user_id: int, csv_content: Union[str, Iterable[str]],
+                           allow_other_users: bool = False) -> dict:
     """
     CSV içeriğinden ders programı yükle
-    
+
     CSV Formatı:
     gun,saat_no,baslangic,bitis,ders_kodu,ders_adi,ogretmen
     pazartesi,1,08:30,09:10,MAT,Matematik,Ali Hoca
-    
+
+    csv_content metin ya da satır satır okunan dosya (ör. TextIOWrapper) olabilir.
+    Opsiyonel 'kullanici_id' sütunu için bkz. parse_schedule_csv.
+    Hatalı satır varsa hiçbir şey değişmez; tüm satırlar geçerliyse tek transaction'da
+    yazılır. Dosya yalnızca yükleyenin programıysa dersleri ve ders verileri silinip
+    yeniden kurulur; başka kullanıcılar da varsa yalnızca programları değiştirilir,
+    dersler güncellenir ve çalışma/soru kayıtları korunur.
+
     Returns:
-        dict: {'success': bool, 'message': str, 'ders_sayisi': int, 'program_sayisi': int}
+        dict: {'success': bool, 'message': str, 'ders_sayisi': int,
+               'program_sayisi': int, 'kullanici_sayisi': int}
     """
     try:
-        # CSV'yi parse et
-        reader = csv.DictReader(io.StringIO(csv_content))
-        
-        # Gerekli sütunları kontrol et
-        required_columns = {'gun', 'saat_no', 'baslangic', 'bitis', 'ders_kodu', 'ders_adi'}
-        if not required_columns.issubset(set(reader.fieldnames or [])):
-            missing = required_columns - set(reader.fieldnames or [])
-            return {
-                'success': False,
-                'message': f"Eksik sütunlar: {', '.join(missing)}",
-                'ders_sayisi': 0,
-                'program_sayisi': 0
-            }
-        
-        # Mevcut programı sil
-        clear_user_schedule(user_id)
-        
-        # Dersleri ve programı topla
-        lessons_map = {}  # ders_kodu -> lesson dict
-        schedule_entries = []
-        
-        for row in reader:
-            ders_kodu = row['ders_kodu'].strip().upper()
-            ders_adi = row['ders_adi'].strip()
-            ogretmen = row.get('ogretmen', '').strip() or None
-            
-            # Dersi ekle (yoksa)
-            if ders_kodu not in lessons_map:
-                lesson = db.add_lesson(
-                    user_id=user_id,
-                    ders_kodu=ders_kodu,
-                    ders_adi=ders_adi,
-                    ogretmen=ogretmen
-                )
-                lessons_map[ders_kodu] = lesson
-            
-            # Program girişini kaydet
-            schedule_entries.append({
-                'ders_kodu': ders_kodu,
-                'gun': row['gun'].strip().lower(),
-                'saat_no': int(row['saat_no']),
-                'baslangic': row['baslangic'].strip(),
-                'bitis': row['bitis'].strip()
-            })
-        
-        # Program girişlerini ekle
-        for entry in schedule_entries:
-            lesson = lessons_map.get(entry['ders_kodu'])
-            if lesson:
-                db.add_schedule_entry(
-                    user_id=user_id,
-                    lesson_id=lesson['id'],
-                    gun=entry['gun'],
-                    saat_no=entry['saat_no'],
-                    baslangic_saati=entry['baslangic'],
-                    bitis_saati=entry['bitis']
-                )
-        
-        return {
-            'success': True,
-            'message': 'Program başarıyla yüklendi!',
-            'ders_sayisi': len(lessons_map),
-            'program_sayisi': len(schedule_entries)
-        }
-        
+        lessons, entries, errors = parse_schedule_csv(csv_content, user_id, allow_other_users)
+    except (csv.Error, UnicodeDecodeError) as e:
+        return _result(False, f'CSV işleme hatası: {str(e)}')
+
+    if errors:
+        message = "\n".join(errors[:MAX_REPORTED_ERRORS])
+        if len(errors) > MAX_REPORTED_ERRORS:
+            message += f"\n... ve {len(errors) - MAX_REPORTED_ERRORS} hata daha"
+        return _result(False, message)
+
+    if not entries:
+        return _result(False, 'CSV dosyasında program satırı yok.')
+
+    user_ids = sorted({uid for uid, _ in lessons})
+    statements = _CLEAR_STATEMENTS if user_ids == [user_id] else _REPLACE_STATEMENTS
+
+    conn = db.get_connection()
+    try:
+        with conn:
+            cursor = conn.cursor()
+            _clear_schedules(cursor, user_ids, statements)
+            _insert_schedules(cursor, lessons, entries)
     except Exception as e:
-        return {
-            'success': False,
-            'message': f'CSV işleme hatası: {str(e)}',
-            'ders_sayisi': 0,
-            'program_sayisi': 0
-        }
+        return _result(False, f'Program kaydedilemedi: {str(e)}')
+    db.clear_timetable_index()
+
+    return _result(True, 'Program başarıyla yüklendi!', len(lessons), len(entries), len(user_ids))
 
 
 def load_schedule_data(user_id: int):
@@ -144,10 +237,10 @@ def load_schedule_data(user_id: int):
         ("TR-P10", "PARAGRAF", "AYKUT İNCE", 1),
     ]
     
-    lesson_map = {}
-    for ders_kodu, ders_adi, ogretmen, haftalik_saat in lessons_data:
-        lesson = db.add_lesson(user_id, ders_kodu, ders_adi, ogretmen, haftalik_saat)
-        lesson_map[ders_kodu] = lesson['id']
+    lessons = {
+        (user_id, ders_kodu): (ders_adi, ogretmen, haftalik_saat)
+        for ders_kodu, ders_adi, ogretmen, haftalik_saat in lessons_data
+    }
     
     # Program verisini ekle (sadece gerçek dersler)
     schedule = [
@@ -202,15 +295,15 @@ def load_schedule_data(user_id: int):
         ("cuma", 8, "15:00", "15:40", "KM-10"),
     ]
     
-    for gun, saat_no, baslangic, bitis, ders_kodu in schedule:
-        if ders_kodu in lesson_map:
-            db.add_schedule_entry(
-                user_id=user_id,
-                lesson_id=lesson_map[ders_kodu],
-                gun=gun,
-                saat_no=saat_no,
-                baslangic_saati=baslangic,
-                bitis_saati=bitis
-            )
-    
+    entries = [
+        (user_id, ders_kodu, gun, saat_no, baslangic, bitis)
+        for gun, saat_no, baslangic, bitis, ders_kodu in schedule
+        if (user_id, ders_kodu) in lessons
+    ]
+
+    conn = db.get_connection()
+    with conn:
+        _insert_schedules(conn.cursor(), lessons, entries)
+    db.clear_timetable_index()
+
     return True
@@ -9,6 +9,10 @@ from modules.ders import database as db
 from modules.ders import ai_service as ai
 from modules.ders import schedule_loader as loader
 from datetime import datetime, date
+import config
+import io
+import storage
+import text_utils
 
 
 class DersBot(BaseModule):
@@ -28,7 +32,7 @@ class DersBot(BaseModule):
         user = update.effective_user
         
         # Kullanıcının dersleri var mı kontrol et
-        lessons = db.get_user_lessons(user.id)
+        lessons = await db.aio.get_user_lessons(user.id)
         
         welcome_message = f"""
 {self.module_emoji} *Ders Modülüne Hoş Geldin!*
@@ -69,7 +73,7 @@ Benimle doğal dilde konuşabilirsin! 💪
         user_id = db_user['telegram_id']
         
         # Kullanıcının derslerini al
-        user_lessons = db.get_user_lessons(user_id)
+        user_lessons = await db.aio.get_user_lessons(user_id)
         
         # AI'dan analiz al
         result = ai.analyze_ders_message(message_text, user_lessons)
@@ -94,7 +98,7 @@ Benimle doğal dilde konuşabilirsin! 💪
             response = await self._handle_complete_homework(result, user_id)
         
         elif action == "list_homeworks":
-            homeworks = db.get_pending_homeworks(user_id)
+            homeworks = await db.aio.get_pending_homeworks(user_id)
             response = ai.format_homeworks(homeworks)
         
         elif action == "show_stats":
@@ -122,7 +126,7 @@ Benimle doğal dilde konuşabilirsin! 💪
         else:
             gun_ismi = "pazartesi"
             
-        schedule = db.get_schedule(user_id, gun_ismi)
+        schedule = await db.aio.get_schedule_for_day(user_id, gun_ismi)
         return ai.format_schedule(schedule, gun_ismi)
 
     async def _handle_add_study(self, result: dict, user_id: int, user_lessons: list) -> str:
@@ -138,7 +142,7 @@ Benimle doğal dilde konuşabilirsin! 💪
         if not lesson_id:
             return f"❌ '{ders_adi}' dersini bulamadım. Lütfen ders ismini doğru yazdığından emin ol."
         
-        db.add_study_record(user_id, lesson_id, sure, konu, detay)
+        await db.aio.add_study_record(user_id, lesson_id, sure, konu, detay)
         
         return f"✅ *Çalışma Kaydedildi!*\n\n📚 Ders: {ders_adi}\n⏱️ Süre: {sure} dk\n📝 Konu: {konu}"
 
@@ -155,7 +159,7 @@ Benimle doğal dilde konuşabilirsin! 💪
         if not lesson_id:
             return f"❌ '{ders_adi}' dersini bulamadım."
             
-        db.add_question_record(user_id, lesson_id, miktar, dogru, yanlis, konu)
+        await db.aio.add_question_record(user_id, lesson_id, miktar, dogru, yanlis, konu)
         
         msg = f"✅ *Soru Çözümü Kaydedildi!*\n\n📚 Ders: {ders_adi}\n✏️ Soru: {miktar}"
         if dogru is not None:
@@ -176,7 +180,7 @@ Benimle doğal dilde konuşabilirsin! 💪
         if not lesson_id:
             return f"❌ '{ders_adi}' dersini bulamadım."
             
-        db.add_homework(user_id, lesson_id, aciklama, teslim_tarihi)
+        await db.aio.add_homework(user_id, lesson_id, aciklama, teslim_tarihi)
         
         return f"✅ *Ödev Eklendi!*\n\n📚 Ders: {ders_adi}\n📝 {aciklama}\n📅 Teslim: {teslim_tarihi}"
 
@@ -184,7 +188,7 @@ Benimle doğal dilde konuşabilirsin! 💪
         """Ödev tamamlama"""
         homework_id = result.get('homework_id') # AI bunu tahmin edemeyebilir, bu yüzden basitleştirilmiş bir akış gerekebilir
         # Şimdilik sadece son ödevi tamamla veya listele
-        pending = db.get_pending_homeworks(user_id)
+        pending = await db.aio.get_pending_homeworks(user_id)
         if not pending:
             return "Tamamlanacak ödevin yok! 🎉"
             
@@ -196,12 +200,12 @@ Benimle doğal dilde konuşabilirsin! 💪
         period = result.get('period', 'today')
         
         if period == 'today':
-            studies = db.get_today_study_records(user_id)
-            questions = db.get_today_question_stats(user_id)
+            studies = await db.aio.get_today_study_records(user_id)
+            questions = await db.aio.get_today_question_stats(user_id)
             title = "Bugünkü"
         else:
-            studies = db.get_study_records(user_id, days=7)
-            questions = db.get_question_stats(user_id, days=7)
+            studies = await db.aio.get_study_records(user_id, days=7)
+            questions = await db.aio.get_question_stats(user_id, days=7)
             title = "Bu Haftaki"
             
         # Basit hesaplama
@@ -211,26 +215,14 @@ Benimle doğal dilde konuşabilirsin! 💪
         return f"📊 *{title} İstatistiklerin*\n\n⏱️ Çalışma: {total_time} dakika\n✏️ Soru: {total_questions} adet"
 
     def _find_lesson_id(self, match_name: str, lessons: list):
-        """Ders isminden ID bul (Fuzzy matching basitleştirilmiş)"""
+        """Ders isminden veya kodundan ID bul (MAT -> Matematik, "matematik dersi" -> Matematik)"""
         if not match_name:
             return None
-            
-        match_name = match_name.lower().strip()
-        
-        for lesson in lessons:
-            ders_adi = lesson['ders_adi'].lower()
-            ders_kodu = lesson['ders_kodu'].lower()
-            
-            if match_name in ders_adi or match_name in ders_kodu:
-                return lesson['id']
-                
-            # Kısa kod eşleştirme (MAT -> Matematik)
-            if match_name in ['mat', 'matematik'] and ('mat' in ders_kodu or 'mat' in ders_adi):
-                return lesson['id']
-            if match_name in ['fiz', 'fizik'] and ('fiz' in ders_kodu or 'fiz' in ders_adi):
-                return lesson['id']
-                
-        return None
+
+        return text_utils.best_match(
+            match_name,
+            ((lesson['id'], (lesson['ders_adi'], lesson['ders_kodu'])) for lesson in lessons)
+        )
 
     # --- Command Handlers ---
     
@@ -239,7 +231,7 @@ Benimle doğal dilde konuşabilirsin! 💪
         user_id = update.effective_user.id
         
         # Zaten yüklü mü kontrol et
-        lessons = db.get_user_lessons(user_id)
+        lessons = await db.aio.get_user_lessons(user_id)
         if lessons:
             await update.message.reply_text(
                 "⚠️ Ders programın zaten yüklü!\n\nMevcut derslerini görmek için `/derslerim` kullan.\nProgramı sıfırlamak için `/program_sifirla` kullan.",
@@ -266,7 +258,7 @@ Benimle doğal dilde konuşabilirsin! 💪
         
         # Onay iste (Basit versiyon: direkt siler, gerçek uygulamada butonlu onay eklenebilir)
         # Şimdilik direkt silelim ama uyarı verelim
-        success = loader.clear_user_schedule(user_id)
+        success = await storage.run(loader.clear_user_schedule, user_id)
         
         if success:
             await update.message.reply_text("🗑️ Ders programın ve tüm ders verilerin silindi. Yeni program yüklemek için `/program_yukle` kullanabilirsin.")
@@ -282,30 +274,37 @@ Benimle doğal dilde konuşabilirsin! 💪
         try:
             # Dosyayı indir
             file = await context.bot.get_file(update.message.document.file_id)
-            file_bytes = await file.download_as_bytearray()
+            buffer = io.BytesIO()
+            await file.download_to_memory(buffer)
+            buffer.seek(0)
             
-            # UTF-8 ile decode et
-            try:
-                csv_content = file_bytes.decode('utf-8')
-            except UnicodeDecodeError:
-                csv_content = file_bytes.decode('utf-8-sig')  # BOM varsa
+            # Tek metne çevrilmez, satır satır çözülerek okunur (utf-8-sig: BOM varsa atılır)
+            csv_lines = io.TextIOWrapper(buffer, encoding='utf-8-sig', newline='')
             
             # CSV'den program yükle
-            result = loader.load_schedule_from_csv(user_id, csv_content)
+            # kullanici_id sütunuyla başkalarının programı yalnızca yöneticiler yükleyebilir
+            result = await storage.run(
+                loader.load_schedule_from_csv, user_id, csv_lines,
+                allow_other_users=user_id in config.ADMIN_USER_IDS
+            )
             
             if result['success']:
+                users_line = ""
+                if result['kullanici_sayisi'] > 1:
+                    users_line = f"👥 {result['kullanici_sayisi']} kullanıcının programı güncellendi\\n"
                 await update.message.reply_text(
                     f"✅ *Ders Programı Yüklendi!*\\n\\n"
                     f"📚 {result['ders_sayisi']} ders eklendi\\n"
-                    f"📅 {result['program_sayisi']} program girişi eklendi\\n\\n"
+                    f"📅 {result['program_sayisi']} program girişi eklendi\\n"
+                    f"{users_line}\\n"
                     f"Artık 'Bugün hangi derslerim var?' diye sorabilirsin!",
                     parse_mode='Markdown'
                 )
             else:
+                # Satır hataları sütun adları ('saat_no' gibi) içerir, Markdown kullanılmaz
                 await update.message.reply_text(
-                    f"❌ *Hata:* {result['message']}\\n\\n"
-                    "CSV formatının doğru olduğundan emin ol.",
-                    parse_mode='Markdown'
+                    f"❌ Hata: {result['message']}\n\n"
+                    "CSV formatının doğru olduğundan emin ol. Hiçbir değişiklik yapılmadı."
                 )
                 
         except Exception as e:
@@ -313,7 +312,7 @@ Benimle doğal dilde konuşabilirsin! 💪
 
     async def list_lessons_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         user_id = update.effective_user.id
-        lessons = db.get_user_lessons(user_id)
+        lessons = await db.aio.get_user_lessons(user_id)
         
         if not lessons:
             await update.message.reply_text("Henüz kayıtlı dersin yok.")
@@ -330,7 +329,7 @@ Benimle doğal dilde konuşabilirsin! 💪
 
     async def list_homeworks_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         user_id = update.effective_user.id
-        homeworks = db.get_pending_homeworks(user_id)
+        homeworks = await db.aio.get_pending_homeworks(user_id)
         
         response = ai.format_homeworks(homeworks)
         await update.message.reply_text(response, parse_mode='Markdown')
@@ -339,8 +338,8 @@ Benimle doğal dilde konuşabilirsin! 💪
         user_id = update.effective_user.id
         
         # Son 7 günün istatistikleri
-        study_records = db.get_study_records(user_id, days=7)
-        question_stats = db.get_question_stats(user_id, days=7)
+        study_records = await db.aio.get_study_records(user_id, days=7)
+        question_stats = await db.aio.get_question_stats(user_id, days=7)
         
         response = "*📊 Haftalık İstatistikler*\n\n"
         
@@ -359,8 +358,8 @@ Benimle doğal dilde konuşabilirsin! 💪
 
     async def today_summary_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         user_id = update.effective_user.id
-        today_studies = db.get_today_study_records(user_id)
-        today_questions = db.get_today_question_stats(user_id)
+        today_studies = await db.aio.get_today_study_records(user_id)
+        today_questions = await db.aio.get_today_question_stats(user_id)
         
         response = f"*Bugünkü Özet ({date.today().strftime('%d.%m.%Y')})*\n\n"
         
@@ -384,8 +383,8 @@ Benimle doğal dilde konuşabilirsin! 💪
         user_id = update.effective_user.id
         
         # Son 7 günün verileri
-        study_records = db.get_study_records(user_id, days=7)
-        question_stats = db.get_question_stats(user_id, days=7)
+        study_records = await db.aio.get_study_records(user_id, days=7)
+        question_stats = await db.aio.get_question_stats(user_id, days=7)
         
         response = "*📅 Bu Haftanın Özeti*\n\n"
         
@@ -6,18 +6,86 @@ import sqlite3
 from datetime import datetime, date, timedelta
 from typing import Optional, List, Dict, Any
 import os
+import storage
 
 
 # Database path - modules/ingilizce klasörü içinde
 DB_DIR = os.path.dirname(os.path.abspath(__file__))
 DATABASE_PATH = os.path.join(DB_DIR, "ingilizce.db")
 
+_db = storage.register('ingilizce', DATABASE_PATH)
+
+# Async handler'lar için: await <modül>.aio.<fonksiyon>(...)
+aio = storage.AsyncFacade(__name__)
+
 
 def get_connection():
-    """İngilizce veritabanı bağlantısı oluştur"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """İngilizce veritabanı bağlantısını getir (thread başına havuzlanmış, kapatılmaz)"""
+    return _db.connection()
+
+
+# ==================== MİGRASYONLAR ====================
+
+def _unique_words_and_goals(cursor: sqlite3.Cursor):
+    """Tekrarlanan kelimeleri ve günlük hedefleri birleştir, sonra UNIQUE yap
+
+    Aynı kelimenin kayıtlarından öğrenmede en ilerde olanı (en çok tekrar, en son
+    tekrar, eşitse en yenisi) tutulur; boş anlam/örnek alanları diğerlerinden doldurulur.
+    Günlük hedefte her zaman en yeni kayıt okunduğu için yalnızca o tutulur.
+    """
+    cursor.execute("""
+        SELECT * FROM words
+        WHERE (user_id, LOWER(word)) IN (
+            SELECT user_id, LOWER(word) FROM words
+            GROUP BY user_id, LOWER(word) HAVING COUNT(*) > 1
+        )
+    """)
+    groups: Dict[tuple, List[Dict[str, Any]]] = {}
+    for row in cursor.fetchall():
+        groups.setdefault((row['user_id'], row['word'].lower()), []).append(dict(row))
+
+    for words in groups.values():
+        words.sort(key=lambda w: (w['review_count'] or 0, w['last_review'] or '', w['id']), reverse=True)
+        keep, others = words[0], words[1:]
+        fields = [
+            keep[column] or next((w[column] for w in others if w[column]), None)
+            for column in ('meaning', 'example1', 'example2', 'example3')
+        ]
+        cursor.execute("""
+            UPDATE words SET meaning = ?, example1 = ?, example2 = ?, example3 = ?
+            WHERE id = ?
+        """, (*fields, keep['id']))
+        cursor.executemany("DELETE FROM words WHERE id = ?", [(w['id'],) for w in others])
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_words_user_word ON words(user_id, LOWER(word))")
+
+    cursor.execute("""
+        DELETE FROM daily_goals
+        WHERE id IN (
+            SELECT id FROM (
+                SELECT id, ROW_NUMBER() OVER (
+                    PARTITION BY user_id ORDER BY created_at DESC, id DESC
+                ) AS sira
+                FROM daily_goals
+            )
+            WHERE sira > 1
+        )
+    """)
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_daily_goals_user ON daily_goals(user_id)")
+
+
+# Yeni migrasyonlar listenin sonuna, artan versiyon numarasıyla eklenir
+MIGRATIONS = [
+    (1, "Sorgu indeksleri", """
+        CREATE INDEX IF NOT EXISTS idx_words_user_status_review ON words(user_id, durum, next_review);
+        CREATE INDEX IF NOT EXISTS idx_words_user_created ON words(user_id, created_at);
+        CREATE INDEX IF NOT EXISTS idx_learning_sessions_user_date ON learning_sessions(user_id, tarih);
+    """),
+    (2, "Tekil kelime ve kullanıcı başına tek günlük hedef (UNIQUE)", _unique_words_and_goals),
+    # "Bugün öğrenilen" sayımları learn_date aralığıyla indeksten yapılır (DATE(learn_date) yerine)
+    (3, "Öğrenme tarihi indeksi", """
+        CREATE INDEX IF NOT EXISTS idx_words_user_learn_date ON words(user_id, learn_date);
+    """),
+]
 
 
 def init_ingilizce_database():
@@ -66,28 +134,33 @@ def init_ingilizce_database():
     """)
     
     conn.commit()
-    conn.close()
+    
+    storage.migrate(conn, MIGRATIONS)
 
 
 # ==================== KELİME İŞLEMLERİ ====================
 
 def add_word(user_id: int, word: str, meaning: str, 
              example1: str = None, example2: str = None, example3: str = None) -> Dict[str, Any]:
-    """Yeni kelime ekle"""
+    """Yeni kelime ekle
+
+    Kelime zaten varsa (UNIQUE(user_id, LOWER(word))) mevcut kayıt öğrenme durumu
+    korunarak döner; yalnızca boş örnek alanları doldurulur.
+    """
     conn = get_connection()
     cursor = conn.cursor()
     
-    cursor.execute("""
-        INSERT INTO words (user_id, word, meaning, example1, example2, example3)
-        VALUES (?, ?, ?, ?, ?, ?)
-    """, (user_id, word.lower(), meaning, example1, example2, example3))
-    
-    conn.commit()
-    word_id = cursor.lastrowid
-    
-    cursor.execute("SELECT * FROM words WHERE id = ?", (word_id,))
-    word_data = cursor.fetchone()
-    conn.close()
+    with conn:
+        cursor.execute("""
+            INSERT INTO words (user_id, word, meaning, example1, example2, example3)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(user_id, LOWER(word)) DO UPDATE SET
+                example1 = COALESCE(example1, excluded.example1),
+                example2 = COALESCE(example2, excluded.example2),
+                example3 = COALESCE(example3, excluded.example3)
+            RETURNING *
+        """, (user_id, word.lower(), meaning, example1, example2, example3))
+        word_data = cursor.fetchone()
     
     return dict(word_data)
 
@@ -111,7 +184,6 @@ def get_user_words(user_id: int, durum: str = None) -> List[Dict[str, Any]]:
         """, (user_id,))
     
     words = cursor.fetchall()
-    conn.close()
     
     return [dict(w) for w in words]
 
@@ -128,13 +200,13 @@ def get_word_by_word(user_id: int, word: str) -> Optional[Dict[str, Any]]:
     """, (user_id, word.lower()))
     
     word_data = cursor.fetchone()
-    conn.close()
     
     return dict(word_data) if word_data else None
 
 
+@storage.group_write(_db)
 def mark_word_learned(word_id: int) -> bool:
-    """Kelimeyi öğrenildi olarak işaretle"""
+    """Kelimeyi öğrenildi olarak işaretle (grup commit ile yazılır)"""
     conn = get_connection()
     cursor = conn.cursor()
     
@@ -151,60 +223,40 @@ def mark_word_learned(word_id: int) -> bool:
         WHERE id = ?
     """, (today.isoformat(), today.isoformat(), next_review.isoformat(), word_id))
     
-    conn.commit()
     affected = cursor.rowcount
-    conn.close()
     
     return affected > 0
 
 
+@storage.group_write(_db)
 def update_word_review(word_id: int) -> Dict[str, Any]:
-    """Kelime tekrarını güncelle (Spaced Repetition)"""
+    """Kelime tekrarını güncelle (Spaced Repetition, grup commit ile yazılır)"""
     conn = get_connection()
     cursor = conn.cursor()
     
-    # Mevcut durumu al
-    cursor.execute("SELECT * FROM words WHERE id = ?", (word_id,))
-    word = cursor.fetchone()
-    
-    if not word:
-        conn.close()
-        return None
-    
-    review_count = word['review_count'] + 1
     today = date.today()
     
-    # Spaced Repetition aralıkları
+    # Spaced Repetition aralıkları: n. tekrardan sonra intervals[n-1] gün, sonrası en fazla 30 gün
     intervals = [1, 3, 7, 14, 30]  # gün
+    interval_sql = "CASE review_count + 1 {} ELSE 30 END".format(
+        " ".join(f"WHEN {n} THEN {days}" for n, days in enumerate(intervals, 1))
+    )
     
-    if review_count - 1 < len(intervals):
-        days_to_add = intervals[review_count - 1]
-    else:
-        days_to_add = 30  # Maksimum 30 gün
-    
-    next_review = today + timedelta(days=days_to_add)
-    
-    # Eğer 5+ tekrar olduysa öğrenildi durumuna geç
-    new_durum = 'ogrenildi' if review_count >= 5 else 'ogreniyor'
-    
-    cursor.execute("""
+    # Okuma + hesaplama + yazma tek ifadede; SET içindeki review_count eski değerdir
+    # 5+ tekrar olduysa öğrenildi durumuna geç
+    cursor.execute(f"""
         UPDATE words 
         SET last_review = ?,
-            next_review = ?,
-            review_count = ?,
-            durum = ?
+            next_review = DATE(?, '+' || ({interval_sql}) || ' days'),
+            review_count = review_count + 1,
+            durum = CASE WHEN review_count + 1 >= 5 THEN 'ogrenildi' ELSE 'ogreniyor' END
         WHERE id = ?
-    """, (today.isoformat(), next_review.isoformat(), review_count, new_durum, word_id))
-    
-    conn.commit()
-    conn.close()
+        RETURNING review_count, next_review, durum,
+            CAST(JULIANDAY(next_review) - JULIANDAY(last_review) AS INTEGER) AS interval_days
+    """, (today.isoformat(), today.isoformat(), word_id))
+    word = cursor.fetchone()
     
-    return {
-        'review_count': review_count,
-        'next_review': next_review.isoformat(),
-        'durum': new_durum,
-        'interval_days': days_to_add
-    }
+    return dict(word) if word else None
 
 
 def get_words_for_review(user_id: int) -> List[Dict[str, Any]]:
@@ -223,7 +275,6 @@ def get_words_for_review(user_id: int) -> List[Dict[str, Any]]:
     """, (user_id, today))
     
     words = cursor.fetchall()
-    conn.close()
     
     return [dict(w) for w in words]
 
@@ -235,35 +286,15 @@ def set_daily_goal(user_id: int, gunluk_kelime_sayisi: int) -> Dict[str, Any]:
     conn = get_connection()
     cursor = conn.cursor()
     
-    # Eğer varsa güncelle, yoksa ekle
-    cursor.execute("""
-        SELECT id FROM daily_goals
-        WHERE user_id = ?
-        ORDER BY created_at DESC
-        LIMIT 1
-    """, (user_id,))
-    
-    existing = cursor.fetchone()
-    
-    if existing:
-        cursor.execute("""
-            UPDATE daily_goals
-            SET gunluk_kelime_sayisi = ?
-            WHERE id = ?
-        """, (gunluk_kelime_sayisi, existing['id']))
-        goal_id = existing['id']
-    else:
+    with conn:
+        # Varsa güncelle, yoksa ekle (UNIQUE(user_id) üzerinden UPSERT)
         cursor.execute("""
             INSERT INTO daily_goals (user_id, gunluk_kelime_sayisi)
             VALUES (?, ?)
+            ON CONFLICT(user_id) DO UPDATE SET gunluk_kelime_sayisi = excluded.gunluk_kelime_sayisi
+            RETURNING *
         """, (user_id, gunluk_kelime_sayisi))
-        goal_id = cursor.lastrowid
-    
-    conn.commit()
-    
-    cursor.execute("SELECT * FROM daily_goals WHERE id = ?", (goal_id,))
-    goal = cursor.fetchone()
-    conn.close()
+        goal = cursor.fetchone()
     
     return dict(goal)
 
@@ -281,7 +312,6 @@ def get_user_daily_goal(user_id: int) -> Optional[Dict[str, Any]]:
     """, (user_id,))
     
     goal = cursor.fetchone()
-    conn.close()
     
     return dict(goal) if goal else None
 
@@ -299,7 +329,6 @@ def get_daily_words(user_id: int, count: int) -> List[Dict[str, Any]]:
     """, (user_id, count))
     
     words = cursor.fetchall()
-    conn.close()
     
     return [dict(w) for w in words]
 
@@ -314,17 +343,13 @@ def add_learning_session(user_id: int, kelime_sayisi: int, tarih: date = None) -
     if tarih is None:
         tarih = date.today()
     
-    cursor.execute("""
-        INSERT INTO learning_sessions (user_id, tarih, kelime_sayisi)
-        VALUES (?, ?, ?)
-    """, (user_id, tarih.isoformat(), kelime_sayisi))
-    
-    conn.commit()
-    session_id = cursor.lastrowid
-    
-    cursor.execute("SELECT * FROM learning_sessions WHERE id = ?", (session_id,))
-    session = cursor.fetchone()
-    conn.close()
+    with conn:
+        cursor.execute("""
+            INSERT INTO learning_sessions (user_id, tarih, kelime_sayisi)
+            VALUES (?, ?, ?)
+            RETURNING *
+        """, (user_id, tarih.isoformat(), kelime_sayisi))
+        session = cursor.fetchone()
     
     return dict(session)
 
@@ -369,7 +394,6 @@ def get_learning_stats(user_id: int, days: int = 7) -> Dict[str, Any]:
     result = cursor.fetchone()
     toplam_ogrenilen = result['toplam_ogrenilen'] if result['toplam_ogrenilen'] else 0
     
-    conn.close()
     
     return {
         'toplam': toplam,
@@ -403,10 +427,8 @@ def delete_word(word_id: int) -> bool:
     conn = get_connection()
     cursor = conn.cursor()
 
-    cursor.execute("DELETE FROM words WHERE id = ?", (word_id,))
-
-    conn.commit()
+    with conn:
+        cursor.execute("DELETE FROM words WHERE id = ?", (word_id,))
     affected = cursor.rowcount
-    conn.close()
 
     return affected > 0
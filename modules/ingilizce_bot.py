@@ -24,8 +24,8 @@ class IngilizceBot(BaseModule):
     
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         user = update.effective_user
-        stats = db.get_learning_stats(user.id, days=7)
-        goal = db.get_user_daily_goal(user.id)
+        stats = await db.aio.get_learning_stats(user.id, days=7)
+        goal = await db.aio.get_user_daily_goal(user.id)
         
         welcome_message = f"""
 {self.module_emoji} *Ingilizce Modulune Hos Geldin!*
@@ -73,12 +73,12 @@ Bu modulde:
         elif action == "show_daily":
             response = await self._handle_show_daily(user_id)
         elif action == "show_stats":
-            stats = db.get_learning_stats(user_id, days=30)
+            stats = await db.aio.get_learning_stats(user_id, days=30)
             response = ai.format_stats(stats)
         elif action == "start_review":
             response = await self._handle_review(user_id)
         elif action == "list_words":
-            words = db.get_user_words(user_id)
+            words = await db.aio.get_user_words(user_id)
             response = ai.format_words_list(words)
         
         try:
@@ -92,13 +92,13 @@ Bu modulde:
         if not word:
             return "Hangi kelimeyi eklemek istiyorsun?"
         
-        existing = db.get_word_by_word(user_id, word)
+        existing = await db.aio.get_word_by_word(user_id, word)
         if existing:
             return f"*{word}* zaten kelime defterinde!"
         
         word_info = ai.get_word_meaning_and_examples(word)
         
-        db.add_word(
+        await db.aio.add_word(
             user_id, word, 
             word_info['meaning'],
             word_info.get('example1'),
@@ -117,7 +117,7 @@ Bu modulde:
         if not word:
             return "Hangi kelimenin detayini gormek istiyorsun?"
         
-        word_data = db.get_word_by_word(user_id, word)
+        word_data = await db.aio.get_word_by_word(user_id, word)
         
         if not word_data:
             return f"*{word}* kelime defterinde bulunamadi."
@@ -130,18 +130,18 @@ Bu modulde:
         if not goal_count:
             return "Gunluk kac kelime ogrenmek istiyorsun?"
         
-        db.set_daily_goal(user_id, goal_count)
+        await db.aio.set_daily_goal(user_id, goal_count)
         
         return f"Gunluk hedef belirlendi: *{goal_count} kelime*"
     
     async def _handle_show_daily(self, user_id: int) -> str:
-        goal = db.get_user_daily_goal(user_id)
+        goal = await db.aio.get_user_daily_goal(user_id)
         
         if not goal:
             return "Once gunluk hedef belirle!"
         
         count = goal['gunluk_kelime_sayisi']
-        daily_words = db.get_daily_words(user_id, count)
+        daily_words = await db.aio.get_daily_words(user_id, count)
         
         if not daily_words:
             return "Tum kelimeler ogrenme asamasinda! Yeni kelime ekle veya tekrar yap."
@@ -155,16 +155,16 @@ Bu modulde:
                 response += f"{word['example1']}\n"
             response += "\n"
             
-            db.mark_word_learned(word['id'])
+            await db.aio.mark_word_learned(word['id'])
         
-        db.add_learning_session(user_id, len(daily_words))
+        await db.aio.add_learning_session(user_id, len(daily_words))
         
         response += "Kelimeler 'ogreniyor' olarak isaretlendi!"
         
         return response
     
     async def _handle_review(self, user_id: int) -> str:
-        review_words = db.get_words_for_review(user_id)
+        review_words = await db.aio.get_words_for_review(user_id)
         
         if not review_words:
             return "Bugun tekrar edilecek kelime yok!"
@@ -174,7 +174,7 @@ Bu modulde:
         for word in review_words:
             response += f"*{word['word'].title()}* - {word['meaning']}\n"
             
-            update_info = db.update_word_review(word['id'])
+            update_info = await db.aio.update_word_review(word['id'])
             response += f"   Tekrar #{update_info['review_count']}\n\n"
         
         response += "Tekrarlar tamamlandi!"
@@ -197,13 +197,13 @@ Bu modulde:
     
     async def list_words_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         user_id = update.effective_user.id
-        words = db.get_user_words(user_id)
+        words = await db.aio.get_user_words(user_id)
         response = ai.format_words_list(words)
         await update.message.reply_text(response, parse_mode='Markdown')
     
     async def set_goal_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         user_id = update.effective_user.id
-        goal = db.get_user_daily_goal(user_id)
+        goal = await db.aio.get_user_daily_goal(user_id)
         
         response = "*Gunluk Hedef*\n\n"
         if goal:
@@ -6,18 +6,63 @@ import sqlite3
 from datetime import datetime, date, timedelta
 from typing import Optional, List, Dict, Any
 import os
+import storage
+import name_index
+from name_index import NameIndex
+from text_utils import normalize_turkish
 
 
 # Database path - modules/kitap klasörü içinde
 DB_DIR = os.path.dirname(os.path.abspath(__file__))
 DATABASE_PATH = os.path.join(DB_DIR, "kitap.db")
 
+_db = storage.register('kitap', DATABASE_PATH)
+
+# Async handler'lar için: await <modül>.aio.<fonksiyon>(...)
+aio = storage.AsyncFacade(__name__)
+
 
 def get_connection():
-    """Kitap veritabanı bağlantısı oluştur"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """Kitap veritabanı bağlantısını getir (thread başına havuzlanmış, kapatılmaz)"""
+    return _db.connection()
+
+
+# ==================== MİGRASYONLAR ====================
+
+def _add_title_norm(cursor: sqlite3.Cursor):
+    """Kitap adı aramaları için normalize edilmiş başlık kolonu"""
+    storage.add_column(cursor, 'books', 'baslik_norm', "TEXT")
+    cursor.execute("SELECT id, baslik FROM books")
+    cursor.executemany(
+        "UPDATE books SET baslik_norm = ? WHERE id = ?",
+        [(normalize_turkish(row['baslik']), row['id']) for row in cursor.fetchall()]
+    )
+
+
+# Yeni migrasyonlar listenin sonuna, artan versiyon numarasıyla eklenir
+MIGRATIONS = [
+    (1, "Sorgu indeksleri", """
+        CREATE INDEX IF NOT EXISTS idx_books_user_status ON books(user_id, durum);
+        CREATE INDEX IF NOT EXISTS idx_book_notes_book ON book_notes(book_id, created_at);
+        CREATE INDEX IF NOT EXISTS idx_reading_progress_book ON reading_progress(book_id);
+        CREATE INDEX IF NOT EXISTS idx_reading_progress_user_date ON reading_progress(user_id, tarih);
+    """),
+    # set_reading_goal her zaman en yeni hedefi güncelliyordu; eskiler geçersiz kalmış kopyalar
+    (2, "Kullanıcı başına hedef tipi tekil (UNIQUE)", """
+        DELETE FROM reading_goals
+        WHERE id IN (
+            SELECT id FROM (
+                SELECT id, ROW_NUMBER() OVER (
+                    PARTITION BY user_id, hedef_tipi ORDER BY created_at DESC, id DESC
+                ) AS sira
+                FROM reading_goals
+            )
+            WHERE sira > 1
+        );
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_reading_goals_user_type ON reading_goals(user_id, hedef_tipi);
+    """),
+    (3, "Normalize edilmiş kitap başlığı", _add_title_norm),
+]
 
 
 def init_kitap_database():
@@ -80,7 +125,8 @@ def init_kitap_database():
     """)
     
     conn.commit()
-    conn.close()
+    
+    storage.migrate(conn, MIGRATIONS)
 
 
 # ==================== KİTAP İŞLEMLERİ ====================
@@ -91,17 +137,15 @@ def add_book(user_id: int, baslik: str, yazar: str, toplam_sayfa: int,
     conn = get_connection()
     cursor = conn.cursor()
     
-    cursor.execute("""
-        INSERT INTO books (user_id, baslik, yazar, toplam_sayfa, kategori, durum)
-        VALUES (?, ?, ?, ?, ?, 'okunacak')
-    """, (user_id, baslik, yazar, toplam_sayfa, kategori))
-    
-    conn.commit()
-    book_id = cursor.lastrowid
-    
-    cursor.execute("SELECT * FROM books WHERE id = ?", (book_id,))
-    book = cursor.fetchone()
-    conn.close()
+    baslik_norm = normalize_turkish(baslik)
+    with conn:
+        cursor.execute("""
+            INSERT INTO books (user_id, baslik, yazar, toplam_sayfa, kategori, durum, baslik_norm)
+            VALUES (?, ?, ?, ?, ?, 'okunacak', ?)
+            RETURNING *
+        """, (user_id, baslik, yazar, toplam_sayfa, kategori, baslik_norm))
+        book = cursor.fetchone()
+    _book_titles.add(user_id, book['id'], baslik_norm)
     
     return dict(book)
 
@@ -125,63 +169,34 @@ def get_user_books(user_id: int, durum: str = None) -> List[Dict[str, Any]]:
         """, (user_id,))
     
     books = cursor.fetchall()
-    conn.close()
     
     return [dict(b) for b in books]
 
 
-def normalize_turkish(text: str) -> str:
-    """Türkçe karakterleri normalize et ve küçük harfe çevir"""
-    if not text:
-        return ""
-    # Önce büyük Türkçe karakterleri dönüştür
-    replacements = {
-        'I': 'i', 'İ': 'i', 'ı': 'i',
-        'Ğ': 'g', 'ğ': 'g',
-        'Ü': 'u', 'ü': 'u',
-        'Ş': 's', 'ş': 's',
-        'Ö': 'o', 'ö': 'o',
-        'Ç': 'c', 'ç': 'c'
-    }
-    for old, new in replacements.items():
-        text = text.replace(old, new)
-    return text.lower()
+def _load_book_titles(user_id: int) -> List[tuple]:
+    cursor = get_connection().cursor()
+    cursor.execute("SELECT id, baslik_norm FROM books WHERE user_id = ?", (user_id,))
+    return [tuple(row) for row in cursor.fetchall()]
 
 
-def get_book_by_title(user_id: int, title_search: str) -> Optional[Dict[str, Any]]:
-    """Başlığa göre kitap bul (Türkçe karakter destekli)"""
-    conn = get_connection()
-    cursor = conn.cursor()
+# Kullanıcı başına bellekteki başlık indeksi (aynı seviyede en yeni kitap önce)
+_book_titles = NameIndex(_load_book_titles, newest_first=True)
 
-    # Tüm kitapları al
-    cursor.execute("""
-        SELECT * FROM books
-        WHERE user_id = ?
-        ORDER BY created_at DESC
-    """, (user_id,))
 
-    books = cursor.fetchall()
-    conn.close()
+def get_book_by_title(user_id: int, title_search: str) -> Optional[Dict[str, Any]]:
+    """Başlığa göre kitap bul (Türkçe karakter destekli)
 
-    if not books:
+    Önce tam eşleşme, sonra kısmi eşleşme dener.
+    """
+    book_id = _book_titles.best(user_id, normalize_turkish(title_search), min_level=name_index.CONTAINED)
+    if book_id is None:
         return None
 
-    # Aranan ismi normalize et
-    search_normalized = normalize_turkish(title_search)
-
-    # Önce tam eşleşme dene
-    for book in books:
-        book_normalized = normalize_turkish(book['baslik'])
-        if book_normalized == search_normalized:
-            return dict(book)
-
-    # Sonra kısmi eşleşme dene
-    for book in books:
-        book_normalized = normalize_turkish(book['baslik'])
-        if search_normalized in book_normalized or book_normalized in search_normalized:
-            return dict(book)
+    cursor = get_connection().cursor()
+    cursor.execute("SELECT * FROM books WHERE id = ?", (book_id,))
+    book = cursor.fetchone()
 
-    return None
+    return dict(book) if book else None
 
 
 def update_book_status(book_id: int, durum: str, tarih: date = None) -> bool:
@@ -192,30 +207,28 @@ def update_book_status(book_id: int, durum: str, tarih: date = None) -> bool:
     if tarih is None:
         tarih = date.today()
     
-    if durum == 'okunuyor' and not cursor.execute(
-        "SELECT baslangic_tarihi FROM books WHERE id = ?", (book_id,)
-    ).fetchone()['baslangic_tarihi']:
-        cursor.execute("""
-            UPDATE books 
-            SET durum = ?, baslangic_tarihi = ?
-            WHERE id = ?
-        """, (durum, tarih.isoformat(), book_id))
-    elif durum == 'okundu':
-        cursor.execute("""
-            UPDATE books 
-            SET durum = ?, bitis_tarihi = ?
-            WHERE id = ?
-        """, (durum, tarih.isoformat(), book_id))
-    else:
-        cursor.execute("""
-            UPDATE books 
-            SET durum = ?
-            WHERE id = ?
-        """, (durum, book_id))
-    
-    conn.commit()
+    with conn:
+        if durum == 'okunuyor' and not cursor.execute(
+            "SELECT baslangic_tarihi FROM books WHERE id = ?", (book_id,)
+        ).fetchone()['baslangic_tarihi']:
+            cursor.execute("""
+                UPDATE books 
+                SET durum = ?, baslangic_tarihi = ?
+                WHERE id = ?
+            """, (durum, tarih.isoformat(), book_id))
+        elif durum == 'okundu':
+            cursor.execute("""
+                UPDATE books 
+                SET durum = ?, bitis_tarihi = ?
+                WHERE id = ?
+            """, (durum, tarih.isoformat(), book_id))
+        else:
+            cursor.execute("""
+                UPDATE books 
+                SET durum = ?
+                WHERE id = ?
+            """, (durum, book_id))
     affected = cursor.rowcount
-    conn.close()
     
     return affected > 0
 
@@ -227,17 +240,13 @@ def add_book_note(user_id: int, book_id: int, not_metni: str) -> Dict[str, Any]:
     conn = get_connection()
     cursor = conn.cursor()
     
-    cursor.execute("""
-        INSERT INTO book_notes (user_id, book_id, not_metni)
-        VALUES (?, ?, ?)
-    """, (user_id, book_id, not_metni))
-    
-    conn.commit()
-    note_id = cursor.lastrowid
-    
-    cursor.execute("SELECT * FROM book_notes WHERE id = ?", (note_id,))
-    note = cursor.fetchone()
-    conn.close()
+    with conn:
+        cursor.execute("""
+            INSERT INTO book_notes (user_id, book_id, not_metni)
+            VALUES (?, ?, ?)
+            RETURNING *
+        """, (user_id, book_id, not_metni))
+        note = cursor.fetchone()
     
     return dict(note)
 
@@ -254,7 +263,6 @@ def get_book_notes(book_id: int) -> List[Dict[str, Any]]:
     """, (book_id,))
     
     notes = cursor.fetchall()
-    conn.close()
     
     return [dict(n) for n in notes]
 
@@ -270,37 +278,19 @@ def set_reading_goal(user_id: int, hedef_tipi: str, hedef_deger: int,
     if baslangic_tarihi is None:
         baslangic_tarihi = date.today()
     
-    # Eğer aynı tip hedef varsa güncelle
-    cursor.execute("""
-        SELECT id FROM reading_goals
-        WHERE user_id = ? AND hedef_tipi = ?
-        ORDER BY created_at DESC
-        LIMIT 1
-    """, (user_id, hedef_tipi))
-    
-    existing = cursor.fetchone()
-    
-    if existing:
-        cursor.execute("""
-            UPDATE reading_goals
-            SET hedef_deger = ?, baslangic_tarihi = ?, bitis_tarihi = ?
-            WHERE id = ?
-        """, (hedef_deger, baslangic_tarihi.isoformat(), 
-              bitis_tarihi.isoformat() if bitis_tarihi else None, existing['id']))
-        goal_id = existing['id']
-    else:
+    with conn:
+        # Aynı tip hedef varsa güncelle (UNIQUE(user_id, hedef_tipi) üzerinden UPSERT)
         cursor.execute("""
             INSERT INTO reading_goals (user_id, hedef_tipi, hedef_deger, baslangic_tarihi, bitis_tarihi)
             VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(user_id, hedef_tipi) DO UPDATE SET
+                hedef_deger = excluded.hedef_deger,
+                baslangic_tarihi = excluded.baslangic_tarihi,
+                bitis_tarihi = excluded.bitis_tarihi
+            RETURNING *
         """, (user_id, hedef_tipi, hedef_deger, baslangic_tarihi.isoformat(),
               bitis_tarihi.isoformat() if bitis_tarihi else None))
-        goal_id = cursor.lastrowid
-    
-    conn.commit()
-    
-    cursor.execute("SELECT * FROM reading_goals WHERE id = ?", (goal_id,))
-    goal = cursor.fetchone()
-    conn.close()
+        goal = cursor.fetchone()
     
     return dict(goal)
 
@@ -317,7 +307,6 @@ def get_user_goals(user_id: int) -> List[Dict[str, Any]]:
     """, (user_id,))
     
     goals = cursor.fetchall()
-    conn.close()
     
     return [dict(g) for g in goals]
 
@@ -333,17 +322,13 @@ def add_reading_progress(user_id: int, book_id: int, okunan_sayfa: int,
     if tarih is None:
         tarih = date.today()
     
-    cursor.execute("""
-        INSERT INTO reading_progress (user_id, book_id, okunan_sayfa, tarih)
-        VALUES (?, ?, ?, ?)
-    """, (user_id, book_id, okunan_sayfa, tarih.isoformat()))
-    
-    conn.commit()
-    progress_id = cursor.lastrowid
-    
-    cursor.execute("SELECT * FROM reading_progress WHERE id = ?", (progress_id,))
-    progress = cursor.fetchone()
-    conn.close()
+    with conn:
+        cursor.execute("""
+            INSERT INTO reading_progress (user_id, book_id, okunan_sayfa, tarih)
+            VALUES (?, ?, ?, ?)
+            RETURNING *
+        """, (user_id, book_id, okunan_sayfa, tarih.isoformat()))
+        progress = cursor.fetchone()
     
     return dict(progress)
 
@@ -368,7 +353,6 @@ def get_book_progress(book_id: int) -> Dict[str, Any]:
     book = cursor.fetchone()
     toplam_sayfa = book['toplam_sayfa'] if book else 0
     
-    conn.close()
     
     yuzde = int((toplam_okunan / toplam_sayfa) * 100) if toplam_sayfa > 0 else 0
     
@@ -411,7 +395,6 @@ def get_reading_stats(user_id: int, days: int = 7) -> Dict[str, Any]:
     """, (user_id, from_date))
     
     kitap_bazinda = cursor.fetchall()
-    conn.close()
     
     return {
         'toplam_sayfa': toplam,
@@ -432,23 +415,20 @@ def update_reading_progress(book_id: int, okunan_sayfa: int) -> bool:
     conn = get_connection()
     cursor = conn.cursor()
 
-    # Kitabın user_id'sini al
-    cursor.execute("SELECT user_id FROM books WHERE id = ?", (book_id,))
-    book = cursor.fetchone()
-
-    if not book:
-        conn.close()
-        return False
+    with conn:
+        # Kitabın user_id'sini al
+        cursor.execute("SELECT user_id FROM books WHERE id = ?", (book_id,))
+        book = cursor.fetchone()
 
-    # İlerleme ekle
-    cursor.execute("""
-        INSERT INTO reading_progress (user_id, book_id, okunan_sayfa, tarih)
-        VALUES (?, ?, ?, ?)
-    """, (book['user_id'], book_id, okunan_sayfa, date.today().isoformat()))
+        if not book:
+            return False
 
-    conn.commit()
+        # İlerleme ekle
+        cursor.execute("""
+            INSERT INTO reading_progress (user_id, book_id, okunan_sayfa, tarih)
+            VALUES (?, ?, ?, ?)
+        """, (book['user_id'], book_id, okunan_sayfa, date.today().isoformat()))
     affected = cursor.rowcount
-    conn.close()
 
     return affected > 0
 
@@ -460,18 +440,14 @@ def add_reading_session(user_id: int, book_id: int, dakika: int, sayfa: int) ->
 
     tarih = date.today()
 
-    # İlerleme ekle
-    cursor.execute("""
-        INSERT INTO reading_progress (user_id, book_id, okunan_sayfa, tarih)
-        VALUES (?, ?, ?, ?)
-    """, (user_id, book_id, sayfa, tarih.isoformat()))
-
-    conn.commit()
-    progress_id = cursor.lastrowid
-
-    cursor.execute("SELECT * FROM reading_progress WHERE id = ?", (progress_id,))
-    progress = cursor.fetchone()
-    conn.close()
+    with conn:
+        # İlerleme ekle
+        cursor.execute("""
+            INSERT INTO reading_progress (user_id, book_id, okunan_sayfa, tarih)
+            VALUES (?, ?, ?, ?)
+            RETURNING *
+        """, (user_id, book_id, sayfa, tarih.isoformat()))
+        progress = cursor.fetchone()
 
     return dict(progress)
 
@@ -481,15 +457,14 @@ def delete_book(book_id: int) -> bool:
     conn = get_connection()
     cursor = conn.cursor()
 
-    # İlişkili kayıtları sil
-    cursor.execute("DELETE FROM book_notes WHERE book_id = ?", (book_id,))
-    cursor.execute("DELETE FROM reading_progress WHERE book_id = ?", (book_id,))
-
-    # Kitabı sil
-    cursor.execute("DELETE FROM books WHERE id = ?", (book_id,))
+    with conn:
+        # İlişkili kayıtları sil
+        cursor.execute("DELETE FROM book_notes WHERE book_id = ?", (book_id,))
+        cursor.execute("DELETE FROM reading_progress WHERE book_id = ?", (book_id,))
 
-    conn.commit()
+        # Kitabı sil
+        cursor.execute("DELETE FROM books WHERE id = ?", (book_id,))
     affected = cursor.rowcount
-    conn.close()
+    _book_titles.remove(book_id)
 
     return affected > 0
@@ -24,7 +24,7 @@ class KitapBot(BaseModule):
     
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         user = update.effective_user
-        books = db.get_user_books(user.id)
+        books = await db.aio.get_user_books(user.id)
         
         welcome_message = f"""
 {self.module_emoji} *Kitap Modulune Hos Geldin!*
@@ -59,7 +59,7 @@ Bu modulde:
         message_text = update.message.text
         user_id = db_user['telegram_id']
         
-        user_books = db.get_user_books(user_id)
+        user_books = await db.aio.get_user_books(user_id)
         result = ai.analyze_kitap_message(message_text, user_books)
         
         action = result.get('action', 'chat')
@@ -77,7 +77,7 @@ Bu modulde:
             response = await self._handle_show_stats(user_id)
         elif action == "list_books":
             filter_status = result.get('filter_status')
-            books = db.get_user_books(user_id, durum=filter_status)
+            books = await db.aio.get_user_books(user_id, durum=filter_status)
             response = ai.format_books_list(books, filter_status)
         elif action == "update_status":
             response = await self._handle_update_status(result, user_id, user_books)
@@ -96,7 +96,7 @@ Bu modulde:
         if not baslik or not yazar or not toplam_sayfa:
             return "Kitap eklemek icin baslik, yazar ve sayfa sayisi gerekli."
         
-        db.add_book(user_id, baslik, yazar, toplam_sayfa, kategori)
+        await db.aio.add_book(user_id, baslik, yazar, toplam_sayfa, kategori)
         
         response = f"*{baslik}* eklendi!\n\n"
         response += f"Yazar: {yazar}\n"
@@ -112,7 +112,7 @@ Bu modulde:
         
         if not book_title:
             if user_books:
-                current_books = db.get_user_books(user_id, durum='okunuyor')
+                current_books = await db.aio.get_user_books(user_id, durum='okunuyor')
                 if current_books:
                     book = current_books[0]
                     book_title = book['baslik']
@@ -124,11 +124,11 @@ Bu modulde:
         if not note_text:
             return "Not metni bos olamaz!"
         
-        book = db.get_book_by_title(user_id, book_title)
+        book = await db.aio.get_book_by_title(user_id, book_title)
         if not book:
             return f"'{book_title}' kitabi bulunamadi."
         
-        db.add_book_note(user_id, book['id'], note_text)
+        await db.aio.add_book_note(user_id, book['id'], note_text)
         
         return f"*{book['baslik']}* icin not kaydedildi!\n\n{note_text}"
     
@@ -140,17 +140,17 @@ Bu modulde:
             return "Kac sayfa okudugun belirtmelisin."
         
         if not book_title:
-            current_books = db.get_user_books(user_id, durum='okunuyor')
+            current_books = await db.aio.get_user_books(user_id, durum='okunuyor')
             if not current_books:
                 return "Su an okudugun kitap yok."
             book = current_books[0]
         else:
-            book = db.get_book_by_title(user_id, book_title)
+            book = await db.aio.get_book_by_title(user_id, book_title)
             if not book:
                 return f"'{book_title}' kitabi bulunamadi."
         
-        db.add_reading_progress(user_id, book['id'], pages_read)
-        progress = db.get_book_progress(book['id'])
+        await db.aio.add_reading_progress(user_id, book['id'], pages_read)
+        progress = await db.aio.get_book_progress(book['id'])
         
         response = f"*{book['baslik']}* - {pages_read} sayfa kaydedildi!\n\n"
         response += f"Ilerleme: %{progress['yuzde']}\n"
@@ -158,7 +158,7 @@ Bu modulde:
         
         if progress['yuzde'] >= 100:
             response += "\nTebrikler! Kitabi bitirdin!"
-            db.update_book_status(book['id'], 'okundu')
+            await db.aio.update_book_status(book['id'], 'okundu')
         
         return response
     
@@ -169,7 +169,7 @@ Bu modulde:
         if not goal_value:
             return "Hedef degeri belirtmelisin."
         
-        db.set_reading_goal(user_id, goal_type, goal_value)
+        await db.aio.set_reading_goal(user_id, goal_type, goal_value)
         
         type_text = {
             'gunluk': 'Gunluk',
@@ -181,7 +181,7 @@ Bu modulde:
         return f"*{type_text} hedef belirlendi!*\n\n{goal_value} sayfa"
     
     async def _handle_show_stats(self, user_id: int) -> str:
-        stats = db.get_reading_stats(user_id, days=30)
+        stats = await db.aio.get_reading_stats(user_id, days=30)
         return ai.format_reading_stats(stats, "Son 30 Gun")
     
     async def _handle_update_status(self, result: dict, user_id: int, user_books: list) -> str:
@@ -199,11 +199,11 @@ Bu modulde:
             else:
                 return "Durum belirtmelisin: okunacak/okunuyor/okundu"
         
-        book = db.get_book_by_title(user_id, book_title)
+        book = await db.aio.get_book_by_title(user_id, book_title)
         if not book:
             return f"'{book_title}' kitabi bulunamadi."
         
-        db.update_book_status(book['id'], status)
+        await db.aio.update_book_status(book['id'], status)
         
         status_text = {
             'okunacak': 'okunacaklar listesine eklendi',
@@ -229,7 +229,7 @@ Bu modulde:
     
     async def list_books_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         user_id = update.effective_user.id
-        books = db.get_user_books(user_id)
+        books = await db.aio.get_user_books(user_id)
         response = ai.format_books_list(books)
         await update.message.reply_text(response, parse_mode='Markdown')
     
@@ -241,7 +241,7 @@ Bu modulde:
     
     async def set_goal_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         user_id = update.effective_user.id
-        goals = db.get_user_goals(user_id)
+        goals = await db.aio.get_user_goals(user_id)
         
         response = "*Okuma Hedefleri*\n\n"
         if goals:
@@ -63,7 +63,10 @@ def format_notes_list(notes: list) -> str:
         fav = "⭐ " if note['is_favorite'] else ""
         response += f"{fav}*{note['baslik']}*\n"
         response += f"📁 {note['kategori_path']}\n"
-        if len(note['icerik']) > 100:
+        if note.get('snippet'):
+            # Arama sonucu: aranan kelimelerin geçtiği parça
+            response += f"{note['snippet']}\n"
+        elif len(note['icerik']) > 100:
             response += f"{note['icerik'][:100]}...\n"
         else:
             response += f"{note['icerik']}\n"
@@ -74,6 +77,19 @@ def format_notes_list(notes: list) -> str:
     
     return response.strip()
 
+def format_journal_stats(stats: dict) -> str:
+    if not stats['last_date']:
+        return "📔 Henüz günlük yazmadın. 'Günlük' kategorisine bir not ekleyerek başla!"
+    
+    response = "📔 *Günlük İstatistikleri:*\n\n"
+    response += f"🔥 Seri: {stats['streak']} gün\n"
+    response += f"📅 Bu ay: {stats['month_days']} gün\n"
+    response += f"🕘 Son günlük: {stats['last_date']}\n"
+    if not stats['written_today']:
+        response += "\n✍️ Bugün henüz yazmadın!"
+    
+    return response.strip()
+
 def format_categories(categories: list) -> str:
     if not categories:
         return "📁 Kategori yok."
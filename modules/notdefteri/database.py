@@ -3,17 +3,161 @@ Not Defteri Database
 Kategorili notlar, arama, favoriler
 """
 import sqlite3
-from datetime import datetime
+from datetime import datetime, date, timedelta
 from typing import Optional, List, Dict, Any
 import os
+import storage
+import text_utils
+import time_utils
+from text_utils import normalize_turkish
 
 DB_DIR = os.path.dirname(os.path.abspath(__file__))
 DATABASE_PATH = os.path.join(DB_DIR, "notdefteri.db")
 
+_db = storage.register('notdefteri', DATABASE_PATH)
+
+# Async handler'lar için: await <modül>.aio.<fonksiyon>(...)
+aio = storage.AsyncFacade(__name__)
+
 def get_connection():
-    conn = sqlite3.connect(DATABASE_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    return _db.connection()
+
+def _register_sql_functions(conn: sqlite3.Connection):
+    """FTS tetikleyicilerinin kullandığı tr_norm() fonksiyonu (Türkçe katlama)"""
+    conn.create_function("tr_norm", 1, normalize_turkish, deterministic=True)
+
+# Tetikleyiciler notes'a yazan her bağlantıda tr_norm() bekler
+storage.add_connection_hook(_register_sql_functions)
+
+# Arama sonuç sırası: bm25(baslik, icerik, owner) ağırlıkları; başlıkta geçmesi daha değerli
+FTS_WEIGHTS = (5.0, 1.0, 0.0)
+SEARCH_LIMIT = 50
+# bm25 en yeni bu kadar eşleşme üzerinden hesaplanır; çok geçen kelimelerde
+# gecikme not sayısıyla büyümez
+SEARCH_WINDOW = 500
+
+# Herhangi bir seviyesi bununla başlayan kategoriler günlük sayılır ("Günlük", "Kişisel > Günlükler")
+JOURNAL_CATEGORY = "gunluk"
+
+def is_journal_category(kategori_path: Optional[str]) -> bool:
+    """Kategori yolu günlük kategorisi mi (Türkçe karakter/büyük-küçük harf duyarsız)"""
+    return any(normalize_turkish(part).startswith(JOURNAL_CATEGORY)
+               for part in (kategori_path or "").split(">"))
+
+def _add_journal_columns(cursor: sqlite3.Cursor):
+    """Notlara günlük bayrağı ve yerel giriş tarihi; eski notlar kategori yolundan işaretlenir"""
+    storage.add_column(cursor, 'notes', 'is_journal', "INTEGER NOT NULL DEFAULT 0")
+    storage.add_column(cursor, 'notes', 'entry_date', "DATE")
+    # Eski notlarda yazıldığı zaman dilimi bilinmiyor: UTC tarihi (önceki davranış)
+    cursor.execute("UPDATE notes SET entry_date = DATE(created_at) WHERE entry_date IS NULL")
+    cursor.execute("SELECT DISTINCT kategori_path FROM notes")
+    journal_paths = [(row[0],) for row in cursor.fetchall() if is_journal_category(row[0])]
+    cursor.executemany("UPDATE notes SET is_journal = 1 WHERE kategori_path = ?", journal_paths)
+
+# Yeni migrasyonlar listenin sonuna, artan versiyon numarasıyla eklenir
+MIGRATIONS = [
+    (1, "Sorgu indeksleri", """
+        CREATE INDEX IF NOT EXISTS idx_notes_user_category ON notes(user_id, kategori_path);
+        CREATE INDEX IF NOT EXISTS idx_notes_user_created ON notes(user_id, created_at);
+    """),
+    # UNIQUE(user_id, name, parent_path) NULL parent_path'li kök kategorilerde çalışmıyor.
+    # Silinen kopyalar (user_id, name, parent_path) olarak tutulanla aynı; notlar kategoriye yol ile bağlı
+    (2, "Kök kategoriler de tekil (UNIQUE)", """
+        DELETE FROM categories
+        WHERE id NOT IN (
+            SELECT MIN(id) FROM categories GROUP BY user_id, name, IFNULL(parent_path, '')
+        );
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_categories_user_name_parent
+            ON categories(user_id, name, IFNULL(parent_path, ''));
+    """),
+    # Tam metin arama: başlık/içerik tr_norm ile katlanmış halde indekslenir,
+    # owner kolonu ('u<user_id>') aramayı kullanıcının notlarıyla sınırlar
+    (3, "FTS5 not arama indeksi", """
+        CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(
+            baslik, icerik, owner,
+            tokenize = 'unicode61 remove_diacritics 2'
+        );
+        CREATE TRIGGER IF NOT EXISTS notes_fts_insert AFTER INSERT ON notes BEGIN
+            INSERT INTO notes_fts(rowid, baslik, icerik, owner)
+            VALUES (new.id, tr_norm(new.baslik), tr_norm(new.icerik), 'u' || new.user_id);
+        END;
+        CREATE TRIGGER IF NOT EXISTS notes_fts_delete AFTER DELETE ON notes BEGIN
+            DELETE FROM notes_fts WHERE rowid = old.id;
+        END;
+        CREATE TRIGGER IF NOT EXISTS notes_fts_update AFTER UPDATE OF baslik, icerik, user_id ON notes BEGIN
+            UPDATE notes_fts
+            SET baslik = tr_norm(new.baslik), icerik = tr_norm(new.icerik), owner = 'u' || new.user_id
+            WHERE rowid = old.id;
+        END;
+        INSERT INTO notes_fts(rowid, baslik, icerik, owner)
+            SELECT id, tr_norm(baslik), tr_norm(icerik), 'u' || user_id FROM notes;
+    """),
+    (4, "Günlük bayrağı ve yerel giriş tarihi", _add_journal_columns),
+    # journal_days: kullanıcının günlük yazdığı günler (PK üzerinden seri/ay sayımı),
+    # journal_status: kullanıcı başına son günlük tarihi (21:30 hatırlatması tek arama).
+    # İkisi de notes tetikleyicileriyle güncel tutulur.
+    (5, "Günlük günleri ve son günlük tarihi", """
+        CREATE TABLE IF NOT EXISTS journal_days (
+            user_id INTEGER NOT NULL,
+            entry_date DATE NOT NULL,
+            entry_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, entry_date)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS journal_status (
+            user_id INTEGER PRIMARY KEY,
+            last_date DATE NOT NULL
+        );
+        CREATE TRIGGER IF NOT EXISTS journal_note_insert AFTER INSERT ON notes
+        WHEN new.is_journal = 1 BEGIN
+            INSERT INTO journal_days (user_id, entry_date, entry_count)
+            VALUES (new.user_id, new.entry_date, 1)
+            ON CONFLICT (user_id, entry_date) DO UPDATE SET entry_count = entry_count + 1;
+            INSERT INTO journal_status (user_id, last_date)
+            VALUES (new.user_id, new.entry_date)
+            ON CONFLICT (user_id) DO UPDATE SET last_date = MAX(last_date, excluded.last_date);
+        END;
+        CREATE TRIGGER IF NOT EXISTS journal_note_delete AFTER DELETE ON notes
+        WHEN old.is_journal = 1 BEGIN
+            UPDATE journal_days SET entry_count = entry_count - 1
+            WHERE user_id = old.user_id AND entry_date = old.entry_date;
+            DELETE FROM journal_days
+            WHERE user_id = old.user_id AND entry_date = old.entry_date AND entry_count <= 0;
+            DELETE FROM journal_status
+            WHERE user_id = old.user_id
+            AND NOT EXISTS (SELECT 1 FROM journal_days WHERE user_id = old.user_id);
+            UPDATE journal_status
+            SET last_date = (SELECT MAX(entry_date) FROM journal_days WHERE user_id = old.user_id)
+            WHERE user_id = old.user_id;
+        END;
+        CREATE TRIGGER IF NOT EXISTS journal_note_update_old AFTER UPDATE OF is_journal, entry_date, user_id ON notes
+        WHEN old.is_journal = 1 BEGIN
+            UPDATE journal_days SET entry_count = entry_count - 1
+            WHERE user_id = old.user_id AND entry_date = old.entry_date;
+            DELETE FROM journal_days
+            WHERE user_id = old.user_id AND entry_date = old.entry_date AND entry_count <= 0;
+            DELETE FROM journal_status
+            WHERE user_id = old.user_id
+            AND NOT EXISTS (SELECT 1 FROM journal_days WHERE user_id = old.user_id);
+            UPDATE journal_status
+            SET last_date = (SELECT MAX(entry_date) FROM journal_days WHERE user_id = old.user_id)
+            WHERE user_id = old.user_id;
+        END;
+        CREATE TRIGGER IF NOT EXISTS journal_note_update_new AFTER UPDATE OF is_journal, entry_date, user_id ON notes
+        WHEN new.is_journal = 1 BEGIN
+            INSERT INTO journal_days (user_id, entry_date, entry_count)
+            VALUES (new.user_id, new.entry_date, 1)
+            ON CONFLICT (user_id, entry_date) DO UPDATE SET entry_count = entry_count + 1;
+            INSERT INTO journal_status (user_id, last_date)
+            VALUES (new.user_id, new.entry_date)
+            ON CONFLICT (user_id) DO UPDATE SET last_date = MAX(last_date, excluded.last_date);
+        END;
+        INSERT INTO journal_days (user_id, entry_date, entry_count)
+            SELECT user_id, entry_date, COUNT(*) FROM notes
+            WHERE is_journal = 1 GROUP BY user_id, entry_date;
+        INSERT INTO journal_status (user_id, last_date)
+            SELECT user_id, MAX(entry_date) FROM journal_days GROUP BY user_id;
+    """),
+]
 
 def init_notdefteri_database():
     conn = get_connection()
@@ -27,6 +171,8 @@ def init_notdefteri_database():
             icerik TEXT NOT NULL,
             kategori_path TEXT DEFAULT 'Genel',
             is_favorite INTEGER DEFAULT 0,
+            is_journal INTEGER NOT NULL DEFAULT 0,
+            entry_date DATE,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
@@ -45,23 +191,23 @@ def init_notdefteri_database():
     """)
     
     conn.commit()
-    conn.close()
+    
+    storage.migrate(conn, MIGRATIONS)
 
-def add_note(user_id: int, baslik: str, icerik: str, kategori_path: str = "Genel") -> Dict[str, Any]:
+def add_note(user_id: int, baslik: str, icerik: str, kategori_path: str = "Genel",
+             timezone: str = None) -> Dict[str, Any]:
+    """Not ekle; entry_date kullanıcının yerel tarihi (timezone verilmezse config'deki)"""
     conn = get_connection()
     cursor = conn.cursor()
     
-    cursor.execute("""
-        INSERT INTO notes (user_id, baslik, icerik, kategori_path)
-        VALUES (?, ?, ?, ?)
-    """, (user_id, baslik, icerik, kategori_path))
-    
-    conn.commit()
-    note_id = cursor.lastrowid
-    
-    cursor.execute("SELECT * FROM notes WHERE id = ?", (note_id,))
-    note = cursor.fetchone()
-    conn.close()
+    entry_date = time_utils.get_user_now(timezone).date().isoformat()
+    with conn:
+        cursor.execute("""
+            INSERT INTO notes (user_id, baslik, icerik, kategori_path, is_journal, entry_date)
+            VALUES (?, ?, ?, ?, ?, ?)
+            RETURNING *
+        """, (user_id, baslik, icerik, kategori_path, int(is_journal_category(kategori_path)), entry_date))
+        note = cursor.fetchone()
     
     return dict(note)
 
@@ -83,54 +229,120 @@ def get_user_notes(user_id: int, kategori_path: str = None, favorites_only: bool
     
     cursor.execute(query, params)
     notes = cursor.fetchall()
-    conn.close()
     
     return [dict(n) for n in notes]
 
-def search_notes(user_id: int, keyword: str, kategori_path: str = None) -> List[Dict[str, Any]]:
+def _fts_query(user_id: int, terms: List[str]) -> str:
+    """FTS5 MATCH ifadesi: kullanıcının notlarında tüm kelimeler (önek eşleşmesi)"""
+    words = " AND ".join(f'"{term}"*' for term in terms)
+    return f'owner:"u{user_id}" AND {{baslik icerik}}:({words})'
+
+def search_notes(user_id: int, keyword: str, kategori_path: str = None,
+                 limit: int = SEARCH_LIMIT) -> List[Dict[str, Any]]:
+    """Notlarda tam metin arama (Türkçe karakter/büyük-küçük harf duyarsız)
+
+    Sonuçlar bm25 skoruna göre sıralanır (en yeni SEARCH_WINDOW eşleşme içinden);
+    her notta aranan kelimelerin işaretlendiği 'snippet' alanı bulunur.
+    kategori_path alt kategorileri de kapsar.
+    """
+    terms = text_utils.search_terms(keyword)
+    if not terms:
+        return []
+    
     conn = get_connection()
     cursor = conn.cursor()
     
-    query = """
-        SELECT * FROM notes 
-        WHERE user_id = ? 
-        AND (UPPER(baslik) LIKE ? OR UPPER(icerik) LIKE ?)
+    query = f"""
+        SELECT n.*, bm25(notes_fts, {", ".join(map(str, FTS_WEIGHTS))}) AS skor
+        FROM notes_fts
+        JOIN notes n ON n.id = notes_fts.rowid
+        WHERE notes_fts MATCH ?
     """
-    params = [user_id, f"%{keyword.upper()}%", f"%{keyword.upper()}%"]
+    params = [_fts_query(user_id, terms)]
     
     if kategori_path:
-        query += " AND kategori_path = ?"
-        params.append(kategori_path)
+        query += " AND (n.kategori_path = ? OR n.kategori_path LIKE ?)"
+        params.extend([kategori_path, f"{kategori_path} > %"])
     
-    query += " ORDER BY created_at DESC"
+    # FTS5 rowid sırasını doğrudan verir, pencere dolunca tarama durur
+    query += " ORDER BY notes_fts.rowid DESC LIMIT ?"
+    params.append(SEARCH_WINDOW)
     
-    cursor.execute(query, params)
-    notes = cursor.fetchall()
-    conn.close()
+    cursor.execute(f"SELECT * FROM ({query}) ORDER BY skor LIMIT ?", params + [limit])
+    notes = [dict(n) for n in cursor.fetchall()]
     
-    return [dict(n) for n in notes]
+    for note in notes:
+        note['snippet'] = text_utils.snippet(note['icerik'], terms)
+    
+    return notes
 
-def toggle_favorite(note_id: int) -> bool:
+# ==================== GÜNLÜK ====================
+
+def get_last_journal_date(user_id: int) -> Optional[str]:
+    """Kullanıcının en son günlük yazdığı yerel tarih (hiç yazmadıysa None)"""
     conn = get_connection()
     cursor = conn.cursor()
     
-    cursor.execute("SELECT is_favorite FROM notes WHERE id = ?", (note_id,))
-    note = cursor.fetchone()
+    cursor.execute("SELECT last_date FROM journal_status WHERE user_id = ?", (user_id,))
+    row = cursor.fetchone()
     
-    if not note:
-        conn.close()
-        return False
+    return row['last_date'] if row else None
+
+def get_journal_stats(user_id: int, today: str = None, timezone: str = None) -> Dict[str, Any]:
+    """Günlük serisi ve bu ay yazılan gün sayısı
+
+    today kullanıcının yerel tarihidir (verilmezse timezone'dan hesaplanır).
+    Seri, bugün henüz yazılmadıysa dünden geriye kesintisiz yazılan gün sayısıdır;
+    her adım journal_days birincil anahtarında tek arama.
+    """
+    if today is None:
+        today = time_utils.get_user_now(timezone).date().isoformat()
+    last_date = get_last_journal_date(user_id)
+    written_today = last_date == today
+    start = today if written_today else (date.fromisoformat(today) - timedelta(days=1)).isoformat()
     
-    new_value = 0 if note['is_favorite'] else 1
+    conn = get_connection()
+    cursor = conn.cursor()
     
     cursor.execute("""
-        UPDATE notes 
-        SET is_favorite = ?, updated_at = CURRENT_TIMESTAMP
-        WHERE id = ?
-    """, (new_value, note_id))
+        WITH RECURSIVE streak(day) AS (
+            SELECT entry_date FROM journal_days WHERE user_id = ?1 AND entry_date = ?2
+            UNION ALL
+            SELECT j.entry_date FROM streak s
+            JOIN journal_days j ON j.user_id = ?1 AND j.entry_date = DATE(s.day, '-1 day')
+        )
+        SELECT
+            (SELECT COUNT(*) FROM streak) AS streak,
+            (SELECT COUNT(*) FROM journal_days
+             WHERE user_id = ?1 AND entry_date BETWEEN ?3 AND ?4) AS month_days
+    """, (user_id, start, today[:8] + "01", today))
+    row = cursor.fetchone()
+    
+    return {
+        'last_date': last_date,
+        'written_today': written_today,
+        'streak': row['streak'],
+        'month_days': row['month_days'],
+    }
+
+def toggle_favorite(note_id: int) -> bool:
+    conn = get_connection()
+    cursor = conn.cursor()
     
-    conn.commit()
-    conn.close()
+    with conn:
+        cursor.execute("SELECT is_favorite FROM notes WHERE id = ?", (note_id,))
+        note = cursor.fetchone()
+    
+        if not note:
+            return False
+    
+        new_value = 0 if note['is_favorite'] else 1
+    
+        cursor.execute("""
+            UPDATE notes 
+            SET is_favorite = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        """, (new_value, note_id))
     
     return True
 
@@ -138,11 +350,9 @@ def delete_note(note_id: int) -> bool:
     conn = get_connection()
     cursor = conn.cursor()
     
-    cursor.execute("DELETE FROM notes WHERE id = ?", (note_id,))
-    
-    conn.commit()
+    with conn:
+        cursor.execute("DELETE FROM notes WHERE id = ?", (note_id,))
     affected = cursor.rowcount
-    conn.close()
     
     return affected > 0
 
@@ -159,7 +369,6 @@ def get_categories(user_id: int) -> List[Dict[str, Any]]:
     """, (user_id,))
     
     categories = cursor.fetchall()
-    conn.close()
     
     return [dict(c) for c in categories]
 
@@ -169,21 +378,16 @@ def add_category(user_id: int, name: str, parent_path: str = None) -> Dict[str,
     cursor = conn.cursor()
     
     try:
-        cursor.execute("""
-            INSERT INTO categories (user_id, name, parent_path)
-            VALUES (?, ?, ?)
-        """, (user_id, name, parent_path))
-        
-        conn.commit()
-        cat_id = cursor.lastrowid
-        
-        cursor.execute("SELECT * FROM categories WHERE id = ?", (cat_id,))
-        category = cursor.fetchone()
-        conn.close()
+        with conn:
+            cursor.execute("""
+                INSERT INTO categories (user_id, name, parent_path)
+                VALUES (?, ?, ?)
+                RETURNING *
+            """, (user_id, name, parent_path))
+            category = cursor.fetchone()
         
         return dict(category)
     except sqlite3.IntegrityError:
-        conn.close()
         return None
 
 def get_user_categories(user_id: int) -> List[Dict[str, Any]]:
@@ -198,7 +402,6 @@ def get_user_categories(user_id: int) -> List[Dict[str, Any]]:
     """, (user_id,))
     
     categories = cursor.fetchall()
-    conn.close()
     
     return [dict(c) for c in categories]
 
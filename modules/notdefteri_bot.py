@@ -6,6 +6,7 @@ from telegram.ext import Application, ContextTypes
 from modules.base_module import BaseModule
 from modules.notdefteri import database as db
 from modules.notdefteri import ai_service as ai
+import database
 
 class NotDefteriBott(BaseModule):
     
@@ -20,8 +21,8 @@ class NotDefteriBott(BaseModule):
     
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         user_id = update.effective_user.id
-        notes = db.get_user_notes(user_id)
-        categories = db.get_categories(user_id)
+        notes = await db.aio.get_user_notes(user_id)
+        categories = await db.aio.get_categories(user_id)
         
         welcome = f"""
 {self.module_emoji} *Not Defteri Modulune Hos Geldin!*
@@ -34,6 +35,7 @@ class NotDefteriBott(BaseModule):
 /favorilerim - Favori notlar
 /not_ara - Not ara
 /kategoriler - Kategori listesi
+/gunluk_serim - Günlük serisi
 
 *Kategoriler:*
 Genel, Is, Kisisel, Okul, Fikir
@@ -55,17 +57,17 @@ Genel, Is, Kisisel, Okul, Fikir
         response = result.get('response', 'Anladim!')
         
         if action == "add_note":
-            response = await self._handle_add_note(result, user_id)
+            response = await self._handle_add_note(result, user_id, db_user.get('timezone'))
         elif action == "search_note":
             response = await self._handle_search(result, user_id)
         elif action == "list_notes":
-            notes = db.get_user_notes(user_id)
+            notes = await db.aio.get_user_notes(user_id)
             response = ai.format_notes_list(notes)
         elif action == "list_favorites":
-            notes = db.get_user_notes(user_id, favorites_only=True)
+            notes = await db.aio.get_user_notes(user_id, favorites_only=True)
             response = ai.format_notes_list(notes) if notes else "Favori not yok."
         elif action == "show_categories":
-            categories = db.get_categories(user_id)
+            categories = await db.aio.get_categories(user_id)
             response = ai.format_categories(categories)
         
         try:
@@ -73,7 +75,7 @@ Genel, Is, Kisisel, Okul, Fikir
         except:
             await update.message.reply_text(response.replace('*', '').replace('_', ''))
     
-    async def _handle_add_note(self, result: dict, user_id: int) -> str:
+    async def _handle_add_note(self, result: dict, user_id: int, timezone: str = None) -> str:
         baslik = result.get('baslik', '')
         icerik = result.get('icerik', '')
         kategori = result.get('kategori', 'Genel')
@@ -81,7 +83,7 @@ Genel, Is, Kisisel, Okul, Fikir
         if not baslik or not icerik:
             return "Baslik ve icerik gerekli."
         
-        db.add_note(user_id, baslik, icerik, kategori)
+        await db.aio.add_note(user_id, baslik, icerik, kategori, timezone)
         
         return f"*Not eklendi!*\n\n*{baslik}*\n{kategori}\n\n{icerik}"
     
@@ -93,9 +95,9 @@ Genel, Is, Kisisel, Okul, Fikir
             return "Arama kelimesi veya kategori belirt."
         
         if keyword:
-            notes = db.search_notes(user_id, keyword, kategori)
+            notes = await db.aio.search_notes(user_id, keyword, kategori)
         else:
-            notes = db.get_user_notes(user_id, kategori=kategori)
+            notes = await db.aio.get_user_notes(user_id, kategori=kategori)
         
         if not notes:
             return f"'{keyword}' icin sonuc yok."
@@ -110,6 +112,7 @@ Genel, Is, Kisisel, Okul, Fikir
         application.add_handler(CommandHandler("favorilerim", self.favorites_cmd))
         application.add_handler(CommandHandler("not_ara", self.search_cmd))
         application.add_handler(CommandHandler("kategoriler", self.categories_cmd))
+        application.add_handler(CommandHandler("gunluk_serim", self.journal_stats_cmd))
     
     async def add_note_cmd(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text(
@@ -119,13 +122,13 @@ Genel, Is, Kisisel, Okul, Fikir
     
     async def list_notes_cmd(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         user_id = update.effective_user.id
-        notes = db.get_user_notes(user_id)
+        notes = await db.aio.get_user_notes(user_id)
         response = ai.format_notes_list(notes)
         await update.message.reply_text(response, parse_mode='Markdown')
     
     async def favorites_cmd(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         user_id = update.effective_user.id
-        notes = db.get_user_notes(user_id, favorites_only=True)
+        notes = await db.aio.get_user_notes(user_id, favorites_only=True)
         response = ai.format_notes_list(notes) if notes else "Favori not yok."
         await update.message.reply_text(response, parse_mode='Markdown')
     
@@ -137,6 +140,13 @@ Genel, Is, Kisisel, Okul, Fikir
     
     async def categories_cmd(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         user_id = update.effective_user.id
-        categories = db.get_categories(user_id)
+        categories = await db.aio.get_categories(user_id)
         response = ai.format_categories(categories)
         await update.message.reply_text(response, parse_mode='Markdown')
+    
+    async def journal_stats_cmd(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        user_id = update.effective_user.id
+        user = await database.aio.get_user_by_telegram_id(user_id)
+        stats = await db.aio.get_journal_stats(user_id, timezone=user.get('timezone') if user else None)
+        response = ai.format_journal_stats(stats)
+        await update.message.reply_text(response, parse_mode='Markdown')
@@ -5,14 +5,28 @@ import sqlite3
 from datetime import datetime, date
 from typing import Optional, List, Dict, Any
 import os
+import storage
+import text_utils
 
 DB_DIR = os.path.dirname(os.path.abspath(__file__))
 DATABASE_PATH = os.path.join(DB_DIR, "proje.db")
 
+_db = storage.register('proje', DATABASE_PATH)
+
+# Async handler'lar için: await <modül>.aio.<fonksiyon>(...)
+aio = storage.AsyncFacade(__name__)
+
 def get_connection():
-    conn = sqlite3.connect(DATABASE_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    return _db.connection()
+
+# Yeni migrasyonlar listenin sonuna, artan versiyon numarasıyla eklenir
+MIGRATIONS = [
+    (1, "Sorgu indeksleri", """
+        CREATE INDEX IF NOT EXISTS idx_projects_user_status ON projects(user_id, status);
+        CREATE INDEX IF NOT EXISTS idx_milestones_project ON milestones(project_id, completed);
+        CREATE INDEX IF NOT EXISTS idx_tasks_milestone ON tasks(milestone_id);
+    """),
+]
 
 def init_proje_database():
     conn = get_connection()
@@ -57,19 +71,17 @@ def init_proje_database():
     """)
     
     conn.commit()
-    conn.close()
+    
+    storage.migrate(conn, MIGRATIONS)
 
 # Proje fonksiyonları
 def add_project(user_id: int, name: str, description: str = None, deadline: date = None):
     conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute("INSERT INTO projects (user_id, name, description, deadline) VALUES (?, ?, ?, ?)",
-                   (user_id, name, description, deadline.isoformat() if deadline else None))
-    conn.commit()
-    project_id = cursor.lastrowid
-    cursor.execute("SELECT * FROM projects WHERE id = ?", (project_id,))
-    project = cursor.fetchone()
-    conn.close()
+    with conn:
+        cursor.execute("INSERT INTO projects (user_id, name, description, deadline) VALUES (?, ?, ?, ?) RETURNING *",
+                       (user_id, name, description, deadline.isoformat() if deadline else None))
+        project = cursor.fetchone()
     return dict(project)
 
 def get_user_projects(user_id: int, status: str = None):
@@ -80,38 +92,30 @@ def get_user_projects(user_id: int, status: str = None):
     else:
         cursor.execute("SELECT * FROM projects WHERE user_id = ? ORDER BY created_at DESC", (user_id,))
     projects = cursor.fetchall()
-    conn.close()
     return [dict(p) for p in projects]
 
 def add_milestone(project_id: int, name: str, deadline: date = None):
     conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute("INSERT INTO milestones (project_id, name, deadline) VALUES (?, ?, ?)",
-                   (project_id, name, deadline.isoformat() if deadline else None))
-    conn.commit()
-    milestone_id = cursor.lastrowid
-    cursor.execute("SELECT * FROM milestones WHERE id = ?", (milestone_id,))
-    milestone = cursor.fetchone()
-    conn.close()
+    with conn:
+        cursor.execute("INSERT INTO milestones (project_id, name, deadline) VALUES (?, ?, ?) RETURNING *",
+                       (project_id, name, deadline.isoformat() if deadline else None))
+        milestone = cursor.fetchone()
     return dict(milestone)
 
 def add_task(milestone_id: int, name: str):
     conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute("INSERT INTO tasks (milestone_id, name) VALUES (?, ?)", (milestone_id, name))
-    conn.commit()
-    task_id = cursor.lastrowid
-    cursor.execute("SELECT * FROM tasks WHERE id = ?", (task_id,))
-    task = cursor.fetchone()
-    conn.close()
+    with conn:
+        cursor.execute("INSERT INTO tasks (milestone_id, name) VALUES (?, ?) RETURNING *", (milestone_id, name))
+        task = cursor.fetchone()
     return dict(task)
 
 def complete_task(task_id: int):
     conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute("UPDATE tasks SET completed = 1 WHERE id = ?", (task_id,))
-    conn.commit()
-    conn.close()
+    with conn:
+        cursor.execute("UPDATE tasks SET completed = 1 WHERE id = ?", (task_id,))
 
 def get_project_progress(project_id: int):
     conn = get_connection()
@@ -123,7 +127,6 @@ def get_project_progress(project_id: int):
     cursor.execute("SELECT COUNT(*) as completed FROM milestones WHERE project_id = ? AND completed = 1", (project_id,))
     completed_milestones = cursor.fetchone()['completed']
 
-    conn.close()
 
     progress = int((completed_milestones / total_milestones) * 100) if total_milestones > 0 else 0
 
@@ -137,21 +140,20 @@ def get_project_progress(project_id: int):
 # ==================== EKSİK FONKSİYONLAR ====================
 
 def get_project_by_name(user_id: int, name: str) -> Optional[Dict[str, Any]]:
-    """İsme göre proje bul"""
+    """İsme göre proje bul (aynı eşleşme seviyesinde en yeni proje)"""
     conn = get_connection()
     cursor = conn.cursor()
 
     cursor.execute("""
         SELECT * FROM projects
-        WHERE user_id = ? AND UPPER(name) LIKE ?
+        WHERE user_id = ?
         ORDER BY created_at DESC
-        LIMIT 1
-    """, (user_id, f"%{name.upper()}%"))
+    """, (user_id,))
 
-    project = cursor.fetchone()
-    conn.close()
+    projects = {row['id']: dict(row) for row in cursor.fetchall()}
+    project_id = text_utils.best_match(name, ((pid, p['name']) for pid, p in projects.items()))
 
-    return dict(project) if project else None
+    return projects.get(project_id)
 
 
 def add_project_task(project_id: int, name: str) -> Dict[str, Any]:
@@ -159,37 +161,33 @@ def add_project_task(project_id: int, name: str) -> Dict[str, Any]:
     conn = get_connection()
     cursor = conn.cursor()
 
-    # Projenin varsayılan milestone'unu bul veya oluştur
-    cursor.execute("""
-        SELECT id FROM milestones
-        WHERE project_id = ? AND name = 'Genel'
-        LIMIT 1
-    """, (project_id,))
-
-    milestone = cursor.fetchone()
-
-    if milestone:
-        milestone_id = milestone['id']
-    else:
-        # Varsayılan milestone oluştur
+    with conn:
+        # Projenin varsayılan milestone'unu bul veya oluştur
         cursor.execute("""
-            INSERT INTO milestones (project_id, name)
-            VALUES (?, 'Genel')
+            SELECT id FROM milestones
+            WHERE project_id = ? AND name = 'Genel'
+            LIMIT 1
         """, (project_id,))
-        milestone_id = cursor.lastrowid
 
-    # Görevi ekle
-    cursor.execute("""
-        INSERT INTO tasks (milestone_id, name)
-        VALUES (?, ?)
-    """, (milestone_id, name))
+        milestone = cursor.fetchone()
 
-    conn.commit()
-    task_id = cursor.lastrowid
+        if milestone:
+            milestone_id = milestone['id']
+        else:
+            # Varsayılan milestone oluştur
+            cursor.execute("""
+                INSERT INTO milestones (project_id, name)
+                VALUES (?, 'Genel')
+            """, (project_id,))
+            milestone_id = cursor.lastrowid
 
-    cursor.execute("SELECT * FROM tasks WHERE id = ?", (task_id,))
-    task = cursor.fetchone()
-    conn.close()
+        # Görevi ekle
+        cursor.execute("""
+            INSERT INTO tasks (milestone_id, name)
+            VALUES (?, ?)
+            RETURNING *
+        """, (milestone_id, name))
+        task = cursor.fetchone()
 
     return dict(task)
 
@@ -208,7 +206,6 @@ def get_project_tasks(project_id: int) -> List[Dict[str, Any]]:
     """, (project_id,))
 
     tasks = cursor.fetchall()
-    conn.close()
 
     return [dict(t) for t in tasks]
 
@@ -218,11 +215,9 @@ def complete_project_task(task_id: int) -> bool:
     conn = get_connection()
     cursor = conn.cursor()
 
-    cursor.execute("UPDATE tasks SET completed = 1 WHERE id = ?", (task_id,))
-
-    conn.commit()
+    with conn:
+        cursor.execute("UPDATE tasks SET completed = 1 WHERE id = ?", (task_id,))
     affected = cursor.rowcount
-    conn.close()
 
     return affected > 0
 
@@ -244,7 +239,6 @@ def get_project_stats(user_id: int) -> Dict[str, Any]:
     cursor.execute("SELECT COUNT(*) as tamamlanan FROM projects WHERE user_id = ? AND status = 'completed'", (user_id,))
     tamamlanan_proje = cursor.fetchone()['tamamlanan']
 
-    conn.close()
 
     return {
         'toplam_proje': toplam_proje,
@@ -258,22 +252,20 @@ def delete_project(project_id: int) -> bool:
     conn = get_connection()
     cursor = conn.cursor()
 
-    # Önce milestone'lara ait task'ları sil
-    cursor.execute("""
-        DELETE FROM tasks WHERE milestone_id IN (
-            SELECT id FROM milestones WHERE project_id = ?
-        )
-    """, (project_id,))
-
-    # Milestone'ları sil
-    cursor.execute("DELETE FROM milestones WHERE project_id = ?", (project_id,))
+    with conn:
+        # Önce milestone'lara ait task'ları sil
+        cursor.execute("""
+            DELETE FROM tasks WHERE milestone_id IN (
+                SELECT id FROM milestones WHERE project_id = ?
+            )
+        """, (project_id,))
 
-    # Projeyi sil
-    cursor.execute("DELETE FROM projects WHERE id = ?", (project_id,))
+        # Milestone'ları sil
+        cursor.execute("DELETE FROM milestones WHERE project_id = ?", (project_id,))
 
-    conn.commit()
+        # Projeyi sil
+        cursor.execute("DELETE FROM projects WHERE id = ?", (project_id,))
     affected = cursor.rowcount
-    conn.close()
 
     return affected > 0
 
@@ -20,7 +20,7 @@ class ProjeBot(BaseModule):
     
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         user_id = update.effective_user.id
-        projects = db.get_user_projects(user_id)
+        projects = await db.aio.get_user_projects(user_id)
         
         welcome = f"""
 {self.module_emoji} *Proje Modulune Hos Geldin!*
@@ -57,11 +57,11 @@ class ProjeBot(BaseModule):
         if action == "add_project":
             project_name = result.get('project_name', '')
             if project_name:
-                db.add_project(user_id, project_name)
+                await db.aio.add_project(user_id, project_name)
                 response = f"*{project_name}* projesi olusturuldu!"
         
         elif action == "list_projects":
-            projects = db.get_user_projects(user_id)
+            projects = await db.aio.get_user_projects(user_id)
             response = ai.format_projects(projects)
         
         try:
@@ -79,6 +79,6 @@ class ProjeBot(BaseModule):
     
     async def list_projects_cmd(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         user_id = update.effective_user.id
-        projects = db.get_user_projects(user_id)
+        projects = await db.aio.get_user_projects(user_id)
         response = ai.format_projects(projects)
         await update.message.reply_text(response, parse_mode='Markdown')
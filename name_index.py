@@ -0,0 +1,189 @@
+"""
+İsim indeksi - Kullanıcı başına normalize edilmiş isimler için token/trigram indeksi
+Alışkanlık, görev, hatırlatma, not ve kitap adı aramalarında tüm satırları
+taramak yerine bellekteki indeks kullanılır.
+"""
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+import text_utils
+# Eşleşme seviyeleri text_utils ile ortak (büyük olan daha iyi)
+from text_utils import EXACT, PREFIX, CONTAINS, CONTAINED, TOKEN, FUZZY
+
+# Bellekte indeksi tutulan en fazla kullanıcı sayısı (indeks başına)
+MAX_USERS = 1000
+
+
+def trigrams(text: str) -> Set[str]:
+    """Metnin 3'lü karakter parçaları"""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class _UserEntry:
+    """Tek kullanıcının isimleri ve posting listeleri"""
+
+    def __init__(self):
+        self.names: Dict[int, str] = {}
+        self.exact: Dict[str, Set[int]] = {}
+        self.tokens: Dict[str, Set[int]] = {}
+        self.grams: Dict[str, Set[int]] = {}
+        self.short: Set[int] = set()  # 3 karakterden kısa isimler (trigramı yok)
+
+    def add(self, item_id: int, norm: str):
+        self.remove(item_id)
+        self.names[item_id] = norm
+        self.exact.setdefault(norm, set()).add(item_id)
+        for token in norm.split():
+            self.tokens.setdefault(token, set()).add(item_id)
+        grams = trigrams(norm)
+        if not grams:
+            self.short.add(item_id)
+        for gram in grams:
+            self.grams.setdefault(gram, set()).add(item_id)
+
+    def remove(self, item_id: int):
+        norm = self.names.pop(item_id, None)
+        if norm is None:
+            return
+        self.short.discard(item_id)
+        for postings, keys in ((self.exact, [norm]), (self.tokens, norm.split()), (self.grams, trigrams(norm))):
+            for key in keys:
+                ids = postings.get(key)
+                if ids is not None:
+                    ids.discard(item_id)
+                    if not ids:
+                        del postings[key]
+
+
+class NameIndex:
+    """Kullanıcı başına isim indeksi
+
+    loader(user_id) -> [(id, normalize_edilmiş_isim), ...]
+    İlk aramada kullanıcının isimleri yüklenir; yazma işlemlerinde add/remove
+    ile güncel tutulur.
+    """
+
+    def __init__(self, loader: Callable[[int], Iterable[Tuple[int, str]]], newest_first: bool = False):
+        self._loader = loader
+        self._newest_first = newest_first
+        self._users: "OrderedDict[int, _UserEntry]" = OrderedDict()
+        self._owners: Dict[int, int] = {}  # item id -> user_id
+        self._lock = threading.Lock()
+
+    def _entry(self, user_id: int) -> _UserEntry:
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is not None:
+                self._users.move_to_end(user_id)
+                return entry
+
+        rows = list(self._loader(user_id))
+
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is None:
+                entry = _UserEntry()
+                for item_id, norm in rows:
+                    entry.add(item_id, norm or "")
+                    self._owners[item_id] = user_id
+                self._users[user_id] = entry
+                while len(self._users) > MAX_USERS:
+                    _, evicted = self._users.popitem(last=False)
+                    for item_id in evicted.names:
+                        self._owners.pop(item_id, None)
+            return entry
+
+    def add(self, user_id: int, item_id: int, norm: str):
+        """Yeni/güncellenen kaydı indekse ekle (kullanıcı yüklü değilse bir şey yapmaz)"""
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is not None:
+                entry.add(item_id, norm or "")
+                self._owners[item_id] = user_id
+
+    def remove(self, item_id: int):
+        """Kaydı indeksten çıkar"""
+        with self._lock:
+            user_id = self._owners.pop(item_id, None)
+            entry = self._users.get(user_id)
+            if entry is not None:
+                entry.remove(item_id)
+
+    def invalidate(self, user_id: int = None):
+        """Kullanıcının (veya herkesin) indeksini at, sonraki aramada yeniden yüklenir"""
+        with self._lock:
+            users = [user_id] if user_id is not None else list(self._users)
+            for uid in users:
+                entry = self._users.pop(uid, None)
+                if entry is not None:
+                    for item_id in entry.names:
+                        self._owners.pop(item_id, None)
+
+    def search(self, user_id: int, query: str, min_level: int = TOKEN) -> List[Tuple[int, int]]:
+        """Adayları (id, seviye) olarak en iyi eşleşme önce gelecek şekilde döndür
+
+        Seviyeler text_utils.match_level ile aynıdır:
+        EXACT > PREFIX > CONTAINS > CONTAINED > TOKEN > FUZZY. min_level altındakiler dönmez.
+        Aynı seviyede eski kayıt önce gelir (newest_first ise yeni kayıt).
+        """
+        if not query:
+            return []
+
+        entry = self._entry(user_id)
+
+        with self._lock:
+            levels: Dict[int, int] = {}
+
+            for item_id in entry.exact.get(query, ()):
+                levels[item_id] = EXACT
+
+            query_grams = trigrams(query)
+            if query_grams:
+                # query isimde geçiyorsa ismin trigramları query'ninkileri kapsar
+                postings = sorted((entry.grams.get(g, set()) for g in query_grams), key=len)
+                contains = set.intersection(*postings) if postings[0] else set()
+                # isim query'de geçiyorsa en az bir ortak trigram vardır (veya isim kısadır)
+                contained = set().union(*postings) | entry.short
+            else:
+                contains = set(entry.names)
+                contained = set(entry.names)
+
+            for item_id in contains:
+                name = entry.names[item_id]
+                if item_id not in levels and query in name:
+                    levels[item_id] = PREFIX if name.startswith(query) else CONTAINS
+
+            if min_level <= CONTAINED:
+                for item_id in contained:
+                    if item_id not in levels and entry.names[item_id] and entry.names[item_id] in query:
+                        levels[item_id] = CONTAINED
+
+            if min_level <= TOKEN:
+                for token in set(query.split()):
+                    for item_id in entry.tokens.get(token, ()):
+                        levels.setdefault(item_id, TOKEN)
+
+            # Yazım hatası toleransı sadece başka eşleşme yoksa (tüm isimler taranır)
+            if min_level <= FUZZY and not levels:
+                for item_id, name in entry.names.items():
+                    if text_utils.is_fuzzy_match(query, name):
+                        levels[item_id] = FUZZY
+
+        ranked = [(item_id, level) for item_id, level in levels.items() if level >= min_level]
+        ranked.sort(key=lambda r: (-r[1], -r[0] if self._newest_first else r[0]))
+        return ranked
+
+    def best(self, user_id: int, query: str, min_level: int = TOKEN) -> Optional[int]:
+        """En iyi eşleşen kaydın id'si"""
+        if not query:
+            return None
+
+        # Tam eşleşme varsa diğer seviyelere bakmaya gerek yok
+        entry = self._entry(user_id)
+        with self._lock:
+            exact = entry.exact.get(query)
+            if exact:
+                return max(exact) if self._newest_first else min(exact)
+
+        ranked = self.search(user_id, query, min_level)
+        return ranked[0][0] if ranked else None
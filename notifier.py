@@ -0,0 +1,201 @@
+"""
+Bildirim gönderici - Telegram hız sınırlarına uyan eşzamanlı mesaj gönderimi
+Zamanlayıcı işleri mesajları tek tek beklemek yerine enqueue() ile kuyruğa atar;
+sınırlı sayıda işçi, genel ve sohbet başına token bucket'larla gönderir.
+"""
+import asyncio
+import itertools
+import logging
+import time
+from datetime import timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+
+logger = logging.getLogger(__name__)
+
+# Telegram sınırları: toplamda ~30 mesaj/sn, aynı sohbete ~1 mesaj/sn (kısa patlamalara izin var)
+GLOBAL_RATE = 30.0
+GLOBAL_BURST = 30
+CHAT_RATE = 1.0
+CHAT_BURST = 3
+
+# Aynı anda bekleyen API çağrısı sayısı
+MAX_CONCURRENCY = 16
+
+# Ağ hatası / RetryAfter sonrası en fazla tekrar deneme
+MAX_RETRIES = 5
+RETRY_BASE_SECONDS = 1.0
+
+# Bu kadar süredir kullanılmayan sohbet bucket'ları silinir
+CHAT_BUCKET_IDLE_SECONDS = 300
+
+# Kuyruk öncelikleri: acil mesajlar (saniyesinde hatırlatma) toplu gönderimlerin önüne geçer
+URGENT = 0
+NORMAL = 1
+
+
+class TokenBucket:
+    """Rezervasyonlu token bucket: reserve() token'ı hemen düşer, ne kadar beklenmesi gerektiğini döner"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float = None):
+        if now is None:
+            now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, now: float = None) -> float:
+        self._refill(now)
+        self.tokens -= 1
+        return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+    def pause(self, seconds: float, now: float = None):
+        """Bucket'ı boşalt: sonraki token en erken `seconds` sonra"""
+        self._refill(now)
+        self.tokens = min(self.tokens, -seconds * self.rate)
+
+
+def _retry_seconds(error: RetryAfter) -> float:
+    retry_after = error.retry_after
+    if isinstance(retry_after, timedelta):  # yeni python-telegram-bot sürümleri
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+
+class Notifier:
+    """Eşzamanlılığı sınırlı, hız sınırlı mesaj gönderici
+
+    send(**kwargs) gerçek API çağrısıdır (ör. bot.send_message).
+    enqueue(...) mesajı kuyruğa atar ve gönderilince sonuçlanan bir Future döner;
+    beklenirse gönderim sonucu (veya son hata) alınır. urgent=True mesajlar kuyrukta
+    bekleyen normal mesajlardan önce gönderilir; aynı öncelikte sıra korunur.
+    """
+
+    def __init__(self, send: Callable[..., Awaitable[Any]], rate: float = None, burst: int = None,
+                 chat_rate: float = None, chat_burst: int = None, concurrency: int = None):
+        self._send = send
+        self._global = TokenBucket(rate or GLOBAL_RATE, burst or GLOBAL_BURST)
+        self._chat_rate = chat_rate or CHAT_RATE
+        self._chat_burst = chat_burst or CHAT_BURST
+        self._chats: Dict[Any, TokenBucket] = {}
+        self._concurrency = concurrency or MAX_CONCURRENCY
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._sequence = itertools.count()
+        self._workers = []
+        self._retrying = 0  # call_later ile kuyruğa geri dönmeyi bekleyenler
+        self.stats = {'sent': 0, 'failed': 0, 'retried': 0, 'rate_limited': 0}
+
+    def _ensure_started(self):
+        if self._workers:
+            return
+        self._queue = asyncio.PriorityQueue()
+        self._workers = [asyncio.ensure_future(self._worker()) for _ in range(self._concurrency)]
+
+    def enqueue(self, chat_id: Any, text: str, urgent: bool = False, **kwargs) -> "asyncio.Future":
+        """Mesajı gönderim kuyruğuna at (çalışan event loop içinden çağrılmalı)"""
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        self._put(URGENT if urgent else NORMAL, future, dict(chat_id=chat_id, text=text, **kwargs), 0)
+        return future
+
+    def _put(self, priority: int, future: "asyncio.Future", message: dict, attempt: int):
+        # Sıra numarası: aynı öncelikte FIFO, Future/dict karşılaştırılmaz
+        self._queue.put_nowait((priority, next(self._sequence), future, message, attempt))
+
+    async def join(self):
+        """Kuyruktaki (ve tekrar denenecek) tüm mesajlar gönderilene veya düşene kadar bekle"""
+        if self._queue is None:
+            return
+        await self._queue.join()
+        while self._retrying:
+            await asyncio.sleep(0.1)
+            await self._queue.join()
+
+    def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        self._workers = []
+
+    def _chat_bucket(self, chat_id: Any, now: float) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) > 10000:
+                self._chats = {
+                    cid: b for cid, b in self._chats.items()
+                    if now - b.updated < CHAT_BUCKET_IDLE_SECONDS
+                }
+            bucket = self._chats[chat_id] = TokenBucket(self._chat_rate, self._chat_burst)
+        return bucket
+
+    def _retry_later(self, item: tuple, delay: float):
+        priority, _, future, message, attempt = item
+        self.stats['retried'] += 1
+        self._retrying += 1
+
+        def requeue():
+            self._retrying -= 1
+            self._put(priority, future, message, attempt + 1)
+
+        asyncio.get_running_loop().call_later(delay, requeue)
+
+    async def _worker(self):
+        while True:
+            item = await self._queue.get()
+            _, _, future, message, attempt = item
+            try:
+                if future.cancelled():
+                    continue
+
+                # Önce sohbet, sonra genel sınır: sohbeti bekleyen mesaj genel token'ı boşa tutmaz
+                now = time.monotonic()
+                wait = self._chat_bucket(message['chat_id'], now).reserve(now)
+                if wait:
+                    await asyncio.sleep(wait)
+                wait = self._global.reserve()
+                if wait:
+                    await asyncio.sleep(wait)
+
+                try:
+                    result = await self._send(**message)
+                except RetryAfter as e:
+                    # Telegram bekleme istedi: herkes bekler, mesaj düşürülmez
+                    self.stats['rate_limited'] += 1
+                    delay = _retry_seconds(e)
+                    self._global.pause(delay)
+                    if attempt < MAX_RETRIES:
+                        self._retry_later(item, delay)
+                    elif not future.done():
+                        self.stats['failed'] += 1
+                        future.set_exception(e)
+                except (BadRequest, Forbidden) as e:
+                    # Kalıcı hata (bot engellenmiş, mesaj hatalı): tekrar denenmez
+                    self.stats['failed'] += 1
+                    if not future.done():
+                        future.set_exception(e)
+                except NetworkError as e:
+                    if attempt < MAX_RETRIES:
+                        self._retry_later(item, RETRY_BASE_SECONDS * 2 ** attempt)
+                    elif not future.done():
+                        self.stats['failed'] += 1
+                        future.set_exception(e)
+                except Exception as e:
+                    self.stats['failed'] += 1
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    self.stats['sent'] += 1
+                    if not future.done():
+                        future.set_result(result)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Bildirim işçisi hatası: {e}")
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                self._queue.task_done()
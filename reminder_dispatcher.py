@@ -0,0 +1,163 @@
+"""
+Hatırlatma dağıtıcısı - Bellekteki zaman yığını (heap) ile saniye hassasiyetinde gönderim
+Dakikada bir tabloyu taramak yerine sıradaki hatırlatmanın anına kadar uyunur;
+hatırlatma eklenince/silinince/ertelenince uyandırılır.
+"""
+import asyncio
+import heapq
+import logging
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+import pytz
+import storage
+import time_utils
+
+logger = logging.getLogger(__name__)
+
+# Bellekteki kuyruk bu aralıkla veritabanından yeniden yüklenir (kaçan güncellemelere karşı)
+RESYNC_SECONDS = 3600
+
+# Geçersiz (silinmiş/ertelenmiş) kayıtlar geçerlilerin bu katını aşınca yığın yeniden kurulur
+COMPACT_RATIO = 2
+
+
+class ReminderDispatcher:
+    """Çalma anı (UTC) sırasına göre hatırlatmaları zamanında gönderen asyncio görevi
+
+    load() -> [(id, next_fire_utc), ...]  (senkron, executor'da çalışır)
+    dispatch(ids) -> zamanı gelen hatırlatmaları gönderir (async)
+
+    Yığında geçersiz kalan kayıtlar hemen silinmez; tepeye geldiklerinde
+    `_fire` sözlüğüyle karşılaştırılıp atlanır. Yeniden yükleme sürerken gelen
+    güncellemeler saklanır ve yüklenen görüntünün üstüne yeniden uygulanır.
+    """
+
+    def __init__(self, load: Callable[[], Iterable[Tuple[int, str]]],
+                 dispatch: Callable[[List[int]], Awaitable[None]]):
+        self._load = load
+        self._dispatch = dispatch
+        self._heap: List[Tuple[str, int]] = []
+        self._fire: Dict[int, str] = {}  # id -> geçerli çalma anı
+        self._reload_log: Optional[List[Tuple[int, Optional[str]]]] = None  # yükleme sürerken gelenler
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {'wakeups': 0, 'dispatched': 0, 'reloads': 0}
+
+    def start(self):
+        """Çalışan event loop'ta dağıtıcı görevini başlat"""
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = self._loop.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._loop = None
+
+    def schedule(self, reminder_id: int, next_fire_utc: Optional[str]):
+        """Hatırlatmanın çalma anını güncelle (None: kuyruktan çıkar); her thread'den çağrılabilir"""
+        loop = self._loop
+        if loop is None:
+            return
+        try:
+            loop.call_soon_threadsafe(self._apply, reminder_id, next_fire_utc)
+        except RuntimeError:
+            pass  # loop kapanmış
+
+    def _apply(self, reminder_id: int, next_fire_utc: Optional[str]):
+        if self._reload_log is not None:
+            self._reload_log.append((reminder_id, next_fire_utc))
+        if next_fire_utc is None:
+            if self._fire.pop(reminder_id, None) is None:
+                return
+        else:
+            self._fire[reminder_id] = next_fire_utc
+            heapq.heappush(self._heap, (next_fire_utc, reminder_id))
+            if len(self._heap) > COMPACT_RATIO * len(self._fire) + 64:
+                self._rebuild()
+        self._wakeup.set()
+
+    def _rebuild(self):
+        self._heap = [(fire, reminder_id) for reminder_id, fire in self._fire.items()]
+        heapq.heapify(self._heap)
+
+    async def _reload(self):
+        # Sorgu, yazan taraf commit etmeden önce çalışmış olabilir: bu sırada gelen
+        # güncellemeler kaybolmasın diye görüntünün üstüne sırayla yeniden uygulanır
+        self._reload_log = []
+        try:
+            rows = await storage.run(lambda: list(self._load()))
+            loaded = {reminder_id: fire for reminder_id, fire in rows}
+            for reminder_id, next_fire_utc in self._reload_log:
+                if next_fire_utc is None:
+                    loaded.pop(reminder_id, None)
+                else:
+                    loaded[reminder_id] = next_fire_utc
+        finally:
+            self._reload_log = None
+        self._fire = loaded
+        self._rebuild()
+        self.stats['reloads'] += 1
+
+    def _pop_due(self, now: str) -> List[Tuple[str, int]]:
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            fire, reminder_id = heapq.heappop(self._heap)
+            if self._fire.get(reminder_id) == fire:
+                del self._fire[reminder_id]
+                due.append((fire, reminder_id))
+        return due
+
+    def _restore(self, due: List[Tuple[str, int]]):
+        """Gönderilemeyenleri kuyruğa geri koy (bu arada yeni anı gelmemişse)"""
+        for fire, reminder_id in due:
+            if reminder_id not in self._fire:
+                self._fire[reminder_id] = fire
+                heapq.heappush(self._heap, (fire, reminder_id))
+
+    def _next_fire(self) -> Optional[str]:
+        while self._heap and self._fire.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        resync_at = 0.0
+        while True:
+            try:
+                if loop.time() >= resync_at:
+                    await self._reload()
+                    resync_at = loop.time() + RESYNC_SECONDS
+
+                due = self._pop_due(time_utils.utc_now_str())
+                if due:
+                    try:
+                        await self._dispatch([reminder_id for _, reminder_id in due])
+                    except Exception:
+                        # Gönderim veritabanındaki anı yeniden kontrol eder; tekrar denemek güvenli
+                        self._restore(due)
+                        raise
+                    self.stats['dispatched'] += len(due)
+                    continue
+
+                timeout = resync_at - loop.time()
+                next_fire = self._next_fire()
+                if next_fire is not None:
+                    delay = (time_utils.from_utc_str(next_fire) - datetime.now(pytz.utc)).total_seconds()
+                    timeout = min(timeout, max(delay, 0))
+
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                self.stats['wakeups'] += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Hatırlatma dağıtıcısı hatası: {e}")
+                await asyncio.sleep(1)
@@ -2,15 +2,29 @@
 Zamanlayıcı - Saatlik hatırlatmalar ve kullanıcı tanımlı hatırlatmalar için APScheduler
 Tüm modüller için merkezi hatırlatma sistemi
 """
+import asyncio
+from itertools import groupby
+from operator import itemgetter
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
-from datetime import timedelta
-from config import REMINDER_START_HOUR, REMINDER_END_HOUR, REMINDER_ENABLED, TIMEZONE
+from apscheduler.triggers.interval import IntervalTrigger
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Collection, Dict, List, Optional, Tuple
+from config import (
+    REMINDER_START_HOUR, REMINDER_END_HOUR, REMINDER_ENABLED, TIMEZONE,
+    HOMEWORK_REMINDER_TIME, HOMEWORK_LEAD_DAYS, LESSON_REMINDER_LEAD_MINUTES,
+    VOCAB_REMINDER_TIME, WORD_GOAL_REMINDER_TIME, JOURNAL_REMINDER_TIME
+)
 import database
 import time_utils
+import module_queries
+from reminder_dispatcher import ReminderDispatcher
+from notifier import Notifier
+from telegram.error import BadRequest, Forbidden
 from ai_service import format_reminder_message, format_reminder_notification
 import os
 import logging
+import sqlite3
 import pytz
 
 # Logging
@@ -29,441 +43,761 @@ def set_bot_application(app):
     bot_application = app
 
 
-async def send_reminders():
-    """Tüm kullanıcılara tamamlanmamış alışkanlıklar için hatırlatma gönder (Kullanıcı saatine göre)"""
-    if not REMINDER_ENABLED:
-        return
+async def _bot_send(**kwargs):
+    return await bot_application.bot.send_message(**kwargs)
+
+
+# Zamanlayıcı mesajları sırayla beklenmez; hız sınırlı, eşzamanlı gönderici kuyruğuna atılır
+notifications = Notifier(_bot_send)
+
+
+# ==================== BİLDİRİM KUYRUĞU ====================
+
+# Modül bildirimleri önce notification_outbox'a yazılır, oradan gönderilir:
+# yeniden başlatmada kaybolmaz, (chat_id, kind, yerel gün) anahtarıyla iki kez gönderilmez.
+OUTBOX_POLL_SECONDS = 30
+OUTBOX_BATCH = 500
+OUTBOX_MAX_ATTEMPTS = 6
+OUTBOX_RETRY_BASE_SECONDS = 30  # 30 sn, 1 dk, 2 dk, 4 dk, 8 dk
+OUTBOX_KEEP_DAYS = 7
+# Gönderici kuyruğuna verilen satır bu kadar süre tekrar alınmaz; sonucu yazılamadan
+# bot kapanırsa süre dolunca yeniden gönderilir
+OUTBOX_LEASE_SECONDS = 900
+
+# Bu türlerin bildirimleri gönderici kuyruğunda toplu bildirimlerin önüne geçer
+URGENT_KINDS = ('hatirlatma:', 'ders:')
+
+# Bildirimin geçerlilik süresi (dakika): bundan sonra gönderilmez; ana tik de en fazla
+# bu kadar geriye dönük kaçırılan dakikaları yeniden oynatır
+DAILY_TTL_MINUTES = 180
+HOURLY_TTL_MINUTES = 50
+LESSON_TTL_MINUTES = min(10, LESSON_REMINDER_LEAD_MINUTES)  # ders başladıktan sonra gitmesin
+USER_REMINDER_TTL_MINUTES = 60
+
+# Özeti açık kullanıcıların bildirimleri bu kadar bekletilir; pencerede biriken
+# bildirimler (ör. saat başında alışkanlık + hatırlatma + ödev) tek mesajda gider
+DIGEST_WINDOW_SECONDS = 3
+DIGEST_HEADER = "🔔 *Bildirim Özeti*\n\n"
+DIGEST_SEPARATOR = "\n\n➖➖➖➖➖\n\n"
+MAX_MESSAGE_LENGTH = 4096
+
+_outbox_lock = asyncio.Lock()
+_outbox_stats = {'sent': 0, 'retried': 0, 'failed': 0, 'expired': 0, 'duplicates': 0,
+                 'digests': 0, 'coalesced': 0}
+_digest_timer: Optional[asyncio.TimerHandle] = None
+_delivery_wakeup: Optional[asyncio.Event] = None
+_delivery_task: Optional[asyncio.Task] = None
+_in_flight = set()  # gönderici kuyruğundaki kuyruk (outbox) satırları
+_pending_updates: List[tuple] = []  # yazılmayı bekleyen gönderim sonuçları
+_flush_task: Optional[asyncio.Task] = None
+
+
+def wake_delivery():
+    """Teslim döngüsünü uyandır (beklemez)"""
+    if _delivery_wakeup is not None:
+        _delivery_wakeup.set()
+
+
+def _schedule_digest():
+    """Özet penceresi bitince kuyruğu işle (her yeni bildirim pencereyi uzatır)"""
+    global _digest_timer
     
-    if not bot_application:
-        logger.warning("Bot application henüz set edilmedi")
+    if _digest_timer:
+        _digest_timer.cancel()
+    # +1 sn: kuyruktaki anlar saniyeye yuvarlanarak yazılıyor
+    _digest_timer = asyncio.get_running_loop().call_later(DIGEST_WINDOW_SECONDS + 1, wake_delivery)
+
+
+async def _notify(label: str, items: List[Tuple[int, str, str, str]], ttl_minutes: int):
+    """(chat_id, kind, yerel_tarih, metin) bildirimlerini kuyruğa yaz ve teslim döngüsünü uyandır
+
+    Gönderim beklenmez: iş kuyruğa yazınca döner. Özeti açık kullanıcıların bildirimleri
+    pencere sonuna kadar bekletilir, diğerleri hemen gider.
+    """
+    if not items:
         return
     
-    users = database.get_all_users()
+    now = datetime.now(pytz.utc)
+    expires = time_utils.to_utc_str(now + timedelta(minutes=ttl_minutes))
+    digest_chats = await database.aio.get_digest_chat_ids()
+    
+    direct = [item for item in items if item[0] not in digest_chats]
+    digest = [item for item in items if item[0] in digest_chats]
+    new_ids = await database.aio.enqueue_notifications(direct, expires)
+    digest_ids = await database.aio.enqueue_notifications(
+        digest, expires, time_utils.to_utc_str(now + timedelta(seconds=DIGEST_WINDOW_SECONDS))
+    )
     
-    for user in users:
+    duplicates = len(items) - len(new_ids) - len(digest_ids)
+    if duplicates:
+        _outbox_stats['duplicates'] += duplicates
+        logger.info(f"{label}: {duplicates} bildirim bugün zaten kuyruğa alınmış, atlandı")
+    if digest_ids:
+        _schedule_digest()
+    if new_ids:
+        wake_delivery()
+
+
+def _render_digest(rows: List[Dict[str, Any]]) -> str:
+    if len(rows) == 1:
+        return rows[0]['text']
+    return DIGEST_HEADER + DIGEST_SEPARATOR.join(row['text'] for row in rows)
+
+
+def _digest_batches(rows: List[Dict[str, Any]], digest_chats: frozenset) -> List[Tuple[int, str, list]]:
+    """Gönderim grupları: (chat_id, metin, kuyruk satırları)
+
+    Özeti açık sohbetin bildirimleri tek mesajda birleşir (Telegram sınırını aşarsa birkaç mesaj).
+    """
+    groups = []
+    open_groups = {}  # chat_id -> doldurulan grup
+    for row in rows:
+        chat_id = row['chat_id']
+        if chat_id not in digest_chats:
+            groups.append([row])
+            continue
+        group = open_groups.get(chat_id)
+        if group is None or len(_render_digest(group + [row])) > MAX_MESSAGE_LENGTH:
+            group = open_groups[chat_id] = []
+            groups.append(group)
+        group.append(row)
+    return [(group[0]['chat_id'], _render_digest(group), group) for group in groups]
+
+
+def _send_batch(chat_id: int, text: str, rows: List[Dict[str, Any]]):
+    """Mesajı gönderici kuyruğuna at; sonuç Future tamamlanınca işlenir"""
+    _in_flight.update(row['id'] for row in rows)
+    urgent = any(row['kind'].startswith(URGENT_KINDS) for row in rows)
+    future = notifications.enqueue(chat_id, text, urgent=urgent, parse_mode='Markdown')
+    future.add_done_callback(lambda done: _on_sent(rows, done))
+
+
+def _on_sent(rows: List[Dict[str, Any]], future: "asyncio.Future"):
+    """Gönderim sonucunu kuyruk durumlarına çevir (yazma toplu yapılır)"""
+    _in_flight.difference_update(row['id'] for row in rows)
+    if future.cancelled():
+        return  # gönderici durduruldu: satırlar kiralama süresi dolunca yeniden gönderilir
+    
+    error = future.exception()
+    if isinstance(error, BadRequest) and len(rows) > 1:
+        # Bir parça Markdown'u bozuyor olabilir: diğerleri yanmasın, tek tek gönderilir
+        for row in rows:
+            _send_batch(row['chat_id'], row['text'], [row])
+        return
+    if len(rows) > 1 and error is None:
+        _outbox_stats['digests'] += 1
+        _outbox_stats['coalesced'] += len(rows)
+    
+    now = datetime.now(pytz.utc)
+    updates = []
+    for row in rows:
+        if error is None:
+            logger.info(f"Bildirim gönderildi ({row['kind']}): {row['chat_id']}")
+            updates.append((row['id'], database.OUTBOX_SENT, None, None))
+            _outbox_stats['sent'] += 1
+        elif isinstance(error, (BadRequest, Forbidden)) or row['attempts'] + 1 >= OUTBOX_MAX_ATTEMPTS:
+            # Bot engellenmiş / mesaj hatalı ya da denemeler bitti: bir daha denenmez
+            logger.error(f"Bildirim gönderilemedi ({row['kind']}, {row['chat_id']}): {error}")
+            updates.append((row['id'], database.OUTBOX_FAILED, None, str(error)))
+            _outbox_stats['failed'] += 1
+        else:
+            retry_at = now + timedelta(seconds=OUTBOX_RETRY_BASE_SECONDS * 2 ** row['attempts'])
+            logger.warning(f"Bildirim tekrar denenecek ({row['kind']}, {row['chat_id']}): {error}")
+            updates.append((row['id'], database.OUTBOX_PENDING, time_utils.to_utc_str(retry_at), str(error)))
+            _outbox_stats['retried'] += 1
+    _record_updates(updates)
+
+
+def _record_updates(updates: List[tuple]):
+    global _flush_task
+    _pending_updates.extend(updates)
+    if _flush_task is None or _flush_task.done():
+        _flush_task = asyncio.ensure_future(_flush_updates())
+
+
+async def _flush_updates():
+    """Biriken gönderim sonuçlarını yaz; yazma sürerken gelenler sonraki turda birlikte yazılır"""
+    while _pending_updates:
+        updates = _pending_updates[:]
+        del _pending_updates[:]
         try:
-            user_tz = user.get('timezone', TIMEZONE)
-            user_now = time_utils.get_user_now(user_tz)
-            
-            # Kullanıcının saati hatırlatma aralığında mı?
-            if user_now.hour < REMINDER_START_HOUR or user_now.hour >= REMINDER_END_HOUR:
-                continue
-
-            # Bu kullanıcının tamamlanmamış alışkanlıklarını kontrol et
-            uncompleted = database.get_uncompleted_habits_for_user(user['id'])
-            
-            if uncompleted:
-                message = format_reminder_message(uncompleted)
-                if message:
-                    await bot_application.bot.send_message(
-                        chat_id=user['telegram_id'],
-                        text=message,
-                        parse_mode='Markdown'
-                    )
-                    logger.info(f"Hatırlatma gönderildi: {user['telegram_id']}")
+            await database.aio.update_notifications(updates)
         except Exception as e:
-            logger.error(f"Hatırlatma gönderilemedi ({user.get('telegram_id')}): {e}")
+            # Durum yazılamazsa satırlar kiralama süresi dolunca yeniden gönderilir
+            logger.error(f"Bildirim durumları yazılamadı: {e}")
 
 
-async def check_user_reminders():
-    """Kullanıcı tanımlı hatırlatmaları kontrol et ve gönder (Kullanıcı bazlı)"""
+async def deliver_outbox():
+    """Zamanı gelmiş bekleyen bildirimleri gönderici kuyruğuna at (gönderimleri beklemez)
+
+    Sonuçlar her mesajın Future'ı tamamlanınca toplanıp toplu yazılır; başarısızlar
+    üstel beklemeyle yeniden kurulur.
+    """
     if not bot_application:
         return
     
-    users = database.get_all_users()
-    
-    for user in users:
-        try:
-            user_id = user['id']
-            user_tz = user.get('timezone', TIMEZONE)
-            user_now = time_utils.get_user_now(user_tz)
+    async with _outbox_lock:
+        while True:
+            try:
+                rows = await database.aio.claim_notifications(OUTBOX_BATCH, OUTBOX_LEASE_SECONDS)
+            except Exception as e:
+                logger.error(f"Bildirim kuyruğu okunamadı: {e}")
+                return
+            if not rows:
+                return
             
-            user_time_str = user_now.strftime("%H:%M")
-            user_date_str = user_now.date().isoformat()
+            now_str = time_utils.utc_now_str()
+            expired = []
+            live = []
+            for row in rows:
+                if row['id'] in _in_flight:
+                    continue  # önceki gönderimi hâlâ gönderici kuyruğunda
+                if row['expires_utc'] and row['expires_utc'] < now_str:
+                    expired.append((row['id'], database.OUTBOX_EXPIRED, None, None))
+                    _outbox_stats['expired'] += 1
+                else:
+                    live.append(row)
+            _record_updates(expired)
             
-            # Bu kullanıcı için o anki saatte gönderilmesi gereken hatırlatmaları bul
-            pending_reminders = database.get_pending_reminders_for_user(user_id, user_time_str, user_date_str)
+            try:
+                digest_chats = await database.aio.get_digest_chat_ids()
+            except Exception as e:
+                logger.error(f"Özet tercihleri okunamadı: {e}")
+                digest_chats = frozenset()
             
-            for reminder in pending_reminders:
-                try:
-                    message = format_reminder_notification(reminder)
-                    await bot_application.bot.send_message(
-                        chat_id=user['telegram_id'],
-                        text=message,
-                        parse_mode='Markdown'
-                    )
-                    logger.info(f"Kullanıcı hatırlatması gönderildi: {user['telegram_id']} - {reminder['title']}")
-                    
-                    # Hatırlatmayı işaretle veya sil
-                    database.mark_reminder_sent(reminder['id'], reminder.get('is_recurring', False))
-                    
-                except Exception as e:
-                    logger.error(f"Kullanıcı hatırlatması gönderilemedi ({user['telegram_id']}): {e}")
-                    
+            for chat_id, text, batch_rows in _digest_batches(live, digest_chats):
+                _send_batch(chat_id, text, batch_rows)
+            
+            if len(rows) < OUTBOX_BATCH:
+                return
+
+
+async def _delivery_loop():
+    """Bildirim kuyruğunu ayrı görevde boşalt: işler yalnızca kuyruğa yazıp uyandırır"""
+    while True:
+        try:
+            await asyncio.wait_for(_delivery_wakeup.wait(), OUTBOX_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass  # yeniden denemesi gelenler için periyodik tur
+        _delivery_wakeup.clear()
+        try:
+            await deliver_outbox()
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
-            logger.error(f"Kullanıcı kontrol döngüsü hatası (user {user.get('id')}): {e}")
+            logger.error(f"Bildirim teslim döngüsü hatası: {e}")
 
 
-async def reset_recurring_reminders():
-    """Gece yarısı tekrarlayan hatırlatmaları sıfırla"""
-    database.reset_daily_reminders()
-    logger.info("Tekrarlayan hatırlatmalar sıfırlandı")
+def start_delivery():
+    """Teslim döngüsünü başlat; ilk tur hemen (önceki çalışmadan kalan bekleyenler)"""
+    global _delivery_wakeup, _delivery_task
+    if _delivery_task is not None:
+        return
+    _delivery_wakeup = asyncio.Event()
+    _delivery_wakeup.set()
+    _delivery_task = asyncio.ensure_future(_delivery_loop())
 
 
-# ==================== DERS MODÜLÜ HATIRLATMALARI ====================
+def stop_delivery():
+    global _delivery_task
+    if _delivery_task is not None:
+        _delivery_task.cancel()
+        _delivery_task = None
+
 
-async def homework_deadline_reminder():
-    """DERS MODÜLÜ: Ödev teslim hatırlatması - Her gün 18:00 (Kullanıcı saatine göre)"""
+async def purge_notification_outbox():
+    """Gönderilmiş/düşmüş eski kuyruk kayıtlarını sil"""
+    try:
+        deleted = await database.aio.purge_notifications(OUTBOX_KEEP_DAYS)
+        if deleted:
+            logger.info(f"Bildirim kuyruğu temizlendi: {deleted} kayıt silindi")
+    except Exception as e:
+        logger.error(f"Bildirim kuyruğu temizlenemedi: {e}")
+
+
+async def send_reminders(clocks: list = None, users: Collection[int] = None, exclude: Collection[int] = ()):
+    """Tamamlanmamış alışkanlıklar için hatırlatma gönder (yerel saat başı, sessiz saatler dışında)"""
+    if not REMINDER_ENABLED:
+        return
+    
     if not bot_application:
+        logger.warning("Bot application henüz set edilmedi")
         return
+    
+    try:
+        # Tek sorgu: saati gelen kullanıcıların bugün tamamlanmamış alışkanlıkları
+        rows = await module_queries.aio.get_uncompleted_habits(
+            REMINDER_START_HOUR, REMINDER_END_HOUR, clocks=clocks, users=users, exclude=exclude
+        )
+    except Exception as e:
+        logger.error(f"Alışkanlık hatırlatma sorgusu hatası: {e}")
+        return
+    
+    habits_by_user = {}
+    for habit in rows:
+        habits_by_user.setdefault(habit['telegram_id'], []).append(habit)
+    
+    items = []
+    for telegram_id, uncompleted in habits_by_user.items():
+        message = format_reminder_message(uncompleted)
+        if message:
+            # Saat başına bir hatırlatma: anahtar yerel saati içerir
+            first = uncompleted[0]
+            items.append((telegram_id, f"aliskanlik:{first['local_time'][:2]}", first['local_date'], message))
+    
+    await _notify("Hatırlatma", items, HOURLY_TTL_MINUTES)
 
-    import sqlite3
-    ders_db = os.path.join(os.path.dirname(__file__), 'modules', 'ders', 'ders.db')
 
-    try:
-        conn = sqlite3.connect(ders_db)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
+def _reminder_item(reminder: Dict[str, Any]) -> Tuple[int, str, str, str]:
+    """Hatırlatmanın kuyruk satırı; anahtar saati içerir (saati değişen tekrarlayan hatırlatma aynı gün yine çalar)"""
+    fire = time_utils.from_utc_str(reminder['next_fire_utc']).astimezone(
+        time_utils.get_timezone(reminder['timezone'])
+    )
+    return (
+        reminder['telegram_id'],
+        f"hatirlatma:{reminder['id']}:{reminder['remind_at']}",
+        fire.date().isoformat(),
+        format_reminder_notification(reminder)
+    )
 
-        users = database.get_all_users()
 
-        for user in users:
-            # Kullanıcı saati kontrolü
-            user_tz = user.get('timezone', TIMEZONE)
-            user_now = time_utils.get_user_now(user_tz)
-            
-            # Sadece saat 18'de gönder
-            if user_now.hour != 18 or user_now.minute != 0:
-                continue
+async def _send_user_reminders(reminders: list):
+    """Hatırlatmaları bildirim kuyruğuna al; her biri sıradaki güne kurulur veya silinir
 
-            user_tg_id = user['telegram_id']
-            today = user_now.date()
-            tomorrow = today + timedelta(days=1)
-            next_3_days = today + timedelta(days=3)
-
-            # Yarın ve 3 gün içinde teslim edilecek ödevleri al
-            cursor.execute("""
-                SELECT h.*, l.ders_adi
-                FROM homeworks h
-                LEFT JOIN lessons l ON h.lesson_id = l.id
-                WHERE h.user_id = ?
-                AND h.tamamlandi = 0
-                AND h.bitis_tarihi BETWEEN ? AND ?
-                ORDER BY h.bitis_tarihi ASC
-            """, (user_tg_id, today.isoformat(), next_3_days.isoformat()))
-
-            homeworks = cursor.fetchall()
-
-            if homeworks:
-                urgent_hw = []
-                upcoming_hw = []
-
-                for hw in homeworks:
-
-                    # sqlite'dan gelen tarih string formatında (YYYY-MM-DD)
-                    try:
-                        y, m, d = map(int, hw['bitis_tarihi'].split('-'))
-                        hw_date = today.replace(year=y, month=m, day=d)
-                    except:
-                        continue
-                        
-                    ders_adi = hw['ders_adi'] or "Genel"
-
-                    if hw_date == today:
-                        urgent_hw.append(f"🔴 **{hw['baslik']}** ({ders_adi}) - BUGÜN!")
-                    elif hw_date == tomorrow:
-                        urgent_hw.append(f"🟠 **{hw['baslik']}** ({ders_adi}) - Yarın")
-                    else:
-                        days_left = (hw_date - today).days
-                        upcoming_hw.append(f"🟡 **{hw['baslik']}** ({ders_adi}) - {days_left} gün kaldı")
-
-                message_parts = ["📚 *DERS MODÜLÜ: Ödev Hatırlatması*\n"]
-
-                if urgent_hw:
-                    message_parts.append("⚠️ *ACİL ÖDEVLER:*")
-                    message_parts.extend(urgent_hw)
-                    message_parts.append("")
-
-                if upcoming_hw:
-                    message_parts.append("📋 *Yaklaşan Ödevler:*")
-                    message_parts.extend(upcoming_hw)
-
-                message_parts.append("\n💪 Ödevleri tamamlamak için `/ders` modülüne geç!")
-
-                try:
-                    await bot_application.bot.send_message(
-                        chat_id=user_tg_id,
-                        text="\n".join(message_parts),
-                        parse_mode='Markdown'
-                    )
-                    logger.info(f"Ödev hatırlatma gönderildi: {user_tg_id}")
-                except Exception as e:
-                    logger.error(f"Ödev hatırlatma hatası (user {user_tg_id}): {e}")
-
-        conn.close()
+    Kuyruğa yazılan hatırlatma gönderilene kadar orada bekler (tekrar denemeler dahil),
+    bu yüzden işaretleme gönderimin sonucunu beklemez.
+    """
+    if not reminders:
+        return
+    
+    try:
+        await _notify("Kullanıcı hatırlatması", [_reminder_item(r) for r in reminders], USER_REMINDER_TTL_MINUTES)
     except Exception as e:
-        logger.error(f"Ödev hatırlatma genel hata: {e}")
+        logger.error(f"Hatırlatmalar kuyruğa alınamadı: {e}")
+        return
+    
+    # Tüm işaretlemeler grup commit ile birkaç transaction'da yazılır
+    marks = [
+        database.aio.mark_reminder_sent(reminder['id'], reminder.get('is_recurring', False))
+        for reminder in reminders
+    ]
+    for result in await asyncio.gather(*marks, return_exceptions=True):
+        if isinstance(result, Exception):
+            logger.error(f"Hatırlatma işaretlenemedi: {result}")
+
 
+async def check_user_reminders():
+    """Çalma anı gelmiş kullanıcı hatırlatmalarını gönder (next_fire_utc üzerinden tek sorgu)
 
-async def lesson_start_reminder():
-    """DERS MODÜLÜ: Ders başlangıç hatırlatması - Her 15 dakikada bir kontrol"""
+    Normalde reminder_dispatcher zamanı gelince gönderir; bu fonksiyon elle tetikleme içindir.
+    """
     if not bot_application:
         return
+    
+    try:
+        due_reminders = await database.aio.get_due_reminders()
+    except Exception as e:
+        logger.error(f"Hatırlatma sorgusu hatası: {e}")
+        return
+    
+    await _send_user_reminders(due_reminders)
 
-    import sqlite3
-    ders_db = os.path.join(os.path.dirname(__file__), 'modules', 'ders', 'ders.db')
+
+async def dispatch_reminders(reminder_ids: list):
+    """Dağıtıcının zamanı geldi dediği hatırlatmaları gönder (veritabanındaki an esas alınır)"""
+    if not bot_application:
+        return
+    
+    reminders = await database.aio.get_reminders_by_ids(reminder_ids)
+    now = time_utils.utc_now_str()
+    
+    due = []
+    for reminder in reminders:
+        if reminder['next_fire_utc'] and reminder['next_fire_utc'] <= now:
+            due.append(reminder)
+        else:
+            # Bu arada ertelenmiş: kuyruğa güncel anıyla geri koy
+            reminders_dispatcher.schedule(reminder['id'], reminder['next_fire_utc'])
     
-    gun_map = {
-        0: 'pazartesi', 1: 'sali', 2: 'carsamba',
-        3: 'persembe', 4: 'cuma', 5: 'cumartesi', 6: 'pazar'
-    }
+    await _send_user_reminders(due)
+
+
+# Hatırlatmalar dakikalık tarama yerine bellekteki zaman yığınıyla, saniyesinde gönderilir
+reminders_dispatcher = ReminderDispatcher(database.get_scheduled_reminders, dispatch_reminders)
+database.add_reminder_listener(reminders_dispatcher.schedule)
+
+
+# ==================== DERS MODÜLÜ HATIRLATMALARI ====================
+
+def _homework_message(homeworks: List[Dict[str, Any]]) -> str:
+    """Bir kullanıcının ödev satırlarından (days_left'e göre) hatırlatma mesajı"""
+    urgent_hw = []
+    upcoming_hw = []
+
+    for hw in homeworks:
+        ders_adi = hw['ders_adi'] or "Genel"
+
+        if hw['days_left'] == 0:
+            urgent_hw.append(f"🔴 **{hw['baslik']}** ({ders_adi}) - BUGÜN!")
+        elif hw['days_left'] == 1:
+            urgent_hw.append(f"🟠 **{hw['baslik']}** ({ders_adi}) - Yarın")
+        else:
+            upcoming_hw.append(f"🟡 **{hw['baslik']}** ({ders_adi}) - {hw['days_left']} gün kaldı")
+
+    message_parts = ["📚 *DERS MODÜLÜ: Ödev Hatırlatması*\n"]
+
+    if urgent_hw:
+        message_parts.append("⚠️ *ACİL ÖDEVLER:*")
+        message_parts.extend(urgent_hw)
+        message_parts.append("")
+
+    if upcoming_hw:
+        message_parts.append("📋 *Yaklaşan Ödevler:*")
+        message_parts.extend(upcoming_hw)
+
+    message_parts.append("\n💪 Ödevleri tamamlamak için `/ders` modülüne geç!")
+    return "\n".join(message_parts)
+
+
+async def homework_deadline_reminder(clocks: list = None, users: Collection[int] = None,
+                                     exclude: Collection[int] = ()):
+    """DERS MODÜLÜ: Ödev teslim hatırlatması - Her gün HOMEWORK_REMINDER_TIME (Kullanıcı saatine göre)
+
+    Teslimine HOMEWORK_LEAD_DAYS günden biri kadar kalmış ödevler hatırlatılır.
+    """
+    if not bot_application:
+        return
 
     try:
-        conn = sqlite3.connect(ders_db)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
+        # Tek sorgu; satırlar kullanıcıya göre sıralı, tek geçişte mesajlara dönüşür
+        rows = await module_queries.aio.get_due_homeworks(
+            HOMEWORK_REMINDER_TIME, lead_days=HOMEWORK_LEAD_DAYS, clocks=clocks, users=users, exclude=exclude
+        )
 
-        users = database.get_all_users()
+        items = [
+            (user_tg_id, 'odev', homeworks[0]['today'], _homework_message(homeworks))
+            for user_tg_id, homeworks in (
+                (key, list(group)) for key, group in groupby(rows, key=itemgetter('telegram_id'))
+            )
+        ]
+
+        await _notify("Ödev hatırlatma", items, DAILY_TTL_MINUTES)
+
+    except sqlite3.Error as e:
+        # Yalnızca veritabanı hataları yutulur; sorgu/kod hataları tetikleyiciye yükselir
+        logger.error(f"Ödev hatırlatma veritabanı hatası: {e}")
+
+
+async def lesson_start_reminder(clocks: list = None, users: Collection[int] = None,
+                                exclude: Collection[int] = ()):
+    """DERS MODÜLÜ: Ders başlangıç hatırlatması - LESSON_REMINDER_LEAD_MINUTES dakika sonra başlayan dersler"""
+    if not bot_application:
+        return
+
+    try:
+        # Haftalık program indeksinden; o dakikada ders yoksa veritabanına gidilmez
+        lessons = await module_queries.aio.get_lessons_starting(
+            lead_minutes=LESSON_REMINDER_LEAD_MINUTES, clocks=clocks, users=users, exclude=exclude
+        )
+
+        items = [
+            (lesson['telegram_id'], f"ders:{lesson['id']}", lesson['local_date'],
+             f"📚 *DERS HATIRLATMA*\n\n"
+             f"⏰ {LESSON_REMINDER_LEAD_MINUTES} dakika sonra dersin başlıyor!\n\n"
+             f"📖 **{lesson['ders_adi']}**\n"
+             f"🕐 Saat: {lesson['baslangic_saati']} - {lesson['bitis_saati']}\n"
+             f"👨‍🏫 Öğretmen: {lesson['ogretmen'] or '-'}\n\n"
+             f"Hazırlan! 💪")
+            for lesson in lessons
+        ]
+        await _notify("Ders hatırlatma", items, LESSON_TTL_MINUTES)
 
-        for user in users:
-            user_tz = user.get('timezone', TIMEZONE)
-            user_now = time_utils.get_user_now(user_tz)
-            
-            # Saati kontrol et: Sadece 7-22 arası
-            if not (7 <= user_now.hour <= 22):
-                continue
-                
-            current_day = gun_map[user_now.weekday()]
-            
-            # 15 dakika sonrası
-            check_time = (user_now + timedelta(minutes=15)).strftime("%H:%M")
-
-            user_tg_id = user['telegram_id']
-
-            # Bu saatte dersi var mı kontrol et
-            cursor.execute("""
-                SELECT s.*, l.ders_adi, l.ogretmen
-                FROM schedule s
-                JOIN lessons l ON s.lesson_id = l.id
-                WHERE s.user_id = ? AND s.gun = ? AND s.baslangic_saati = ?
-            """, (user_tg_id, current_day, check_time))
-
-            lesson = cursor.fetchone()
-
-            if lesson:
-                try:
-                    await bot_application.bot.send_message(
-                        chat_id=user_tg_id,
-                        text=f"📚 *DERS HATIRLATMA*\n\n"
-                             f"⏰ 15 dakika sonra dersin başlıyor!\n\n"
-                             f"📖 **{lesson['ders_adi']}**\n"
-                             f"🕐 Saat: {lesson['baslangic_saati']} - {lesson['bitis_saati']}\n"
-                             f"👨‍🏫 Öğretmen: {lesson['ogretmen'] or '-'}\n\n"
-                             f"Hazırlan! 💪",
-                        parse_mode='Markdown'
-                    )
-                    logger.info(f"Ders hatırlatma gönderildi: {user_tg_id} - {lesson['ders_adi']}")
-                except Exception as e:
-                    logger.error(f"Ders hatırlatma hatası: {e}")
-
-        conn.close()
     except Exception as e:
         logger.error(f"Ders hatırlatma genel hata: {e}")
 
 
 # ==================== İNGİLİZCE MODÜLÜ HATIRLATMALARI ====================
 
-async def vocabulary_review_reminder():
-    """İNGİLİZCE MODÜLÜ: Kelime tekrar hatırlatması - Her gün 10:00 (Kullanıcı saati)"""
+async def vocabulary_review_reminder(clocks: list = None, users: Collection[int] = None,
+                                     exclude: Collection[int] = ()):
+    """İNGİLİZCE MODÜLÜ: Kelime tekrar hatırlatması - Her gün VOCAB_REMINDER_TIME (Kullanıcı saati)"""
     if not bot_application:
         return
 
-    import sqlite3
-    ingilizce_db = os.path.join(os.path.dirname(__file__), 'modules', 'ingilizce', 'ingilizce.db')
-
     try:
-        conn = sqlite3.connect(ingilizce_db)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-
-        users = database.get_all_users()
-
-        for user in users:
-            user_tz = user.get('timezone', TIMEZONE)
-            user_now = time_utils.get_user_now(user_tz)
-            
-            if user_now.hour != 10 or user_now.minute != 0:
-                continue
+        # Saati gelen ve bugün tekrar edilecek kelimesi olan kullanıcılar
+        rows = await module_queries.aio.get_review_counts(
+            VOCAB_REMINDER_TIME, clocks=clocks, users=users, exclude=exclude
+        )
+
+        items = []
+        for row in rows:
+            review_count = row['review_count']
+
+            goal_text = ""
+            if row['goal']:
+                goal_text = f"\n🎯 Günlük Hedefin: {row['goal']} kelime"
+
+            items.append((
+                row['telegram_id'], 'kelime_tekrar', row['local_date'],
+                f"🇬🇧 *İNGİLİZCE: Tekrar Zamanı!*\n\n"
+                f"📚 Bugün **{review_count} kelime** tekrar bekliyor!\n"
+                f"{goal_text}\n\n"
+                f"Tekrar için `/ingilizce` modülüne geç ve:\n"
+                f"• 'Tekrar edilecek kelimeleri göster'\n\n"
+                f"🧠 Spaced Repetition ile öğrenme kalıcı olur!"
+            ))
+
+        await _notify("Kelime tekrar hatırlatma", items, DAILY_TTL_MINUTES)
 
-            user_tg_id = user['telegram_id']
-            today_str = user_now.date().isoformat()
-
-            # Bugün tekrar edilmesi gereken kelimeleri al
-            cursor.execute("""
-                SELECT COUNT(*) as count FROM words
-                WHERE user_id = ?
-                AND durum = 'ogreniyor'
-                AND next_review <= ?
-            """, (user_tg_id, today_str))
-
-            result = cursor.fetchone()
-            review_count = result['count'] if result else 0
-
-            if review_count > 0:
-                # Günlük hedefi kontrol et
-                cursor.execute("""
-                    SELECT gunluk_kelime_sayisi FROM daily_goals
-                    WHERE user_id = ?
-                    ORDER BY created_at DESC LIMIT 1
-                """, (user_tg_id,))
-
-                goal_result = cursor.fetchone()
-                goal_text = ""
-                if goal_result:
-                    goal_text = f"\n🎯 Günlük Hedefin: {goal_result['gunluk_kelime_sayisi']} kelime"
-
-                try:
-                    await bot_application.bot.send_message(
-                        chat_id=user_tg_id,
-                        text=f"🇬🇧 *İNGİLİZCE: Tekrar Zamanı!*\n\n"
-                             f"📚 Bugün **{review_count} kelime** tekrar bekliyor!\n"
-                             f"{goal_text}\n\n"
-                             f"Tekrar için `/ingilizce` modülüne geç ve:\n"
-                             f"• 'Tekrar edilecek kelimeleri göster'\n\n"
-                             f"🧠 Spaced Repetition ile öğrenme kalıcı olur!",
-                        parse_mode='Markdown'
-                    )
-                    logger.info(f"Kelime tekrar hatırlatma gönderildi: {user_tg_id}")
-                except Exception as e:
-                    logger.error(f"Kelime tekrar hatırlatma hatası (user {user_tg_id}): {e}")
-
-        conn.close()
     except Exception as e:
         logger.error(f"Kelime tekrar hatırlatma genel hata: {e}")
 
 
-async def daily_word_goal_reminder():
-    """İNGİLİZCE MODÜLÜ: Günlük kelime hedefi hatırlatması - Her gün 20:00"""
+async def daily_word_goal_reminder(clocks: list = None, users: Collection[int] = None,
+                                   exclude: Collection[int] = ()):
+    """İNGİLİZCE MODÜLÜ: Günlük kelime hedefi hatırlatması - Her gün WORD_GOAL_REMINDER_TIME"""
     if not bot_application:
         return
 
-    import sqlite3
-    ingilizce_db = os.path.join(os.path.dirname(__file__), 'modules', 'ingilizce', 'ingilizce.db')
+    try:
+        # Saati gelen ve bugün hedefinin gerisinde kalan kullanıcılar (tek GROUP BY)
+        rows = await module_queries.aio.get_word_goal_progress(
+            WORD_GOAL_REMINDER_TIME, behind_only=True, clocks=clocks, users=users, exclude=exclude
+        )
+
+        items = []
+        for row in rows:
+            goal = row['goal']
+            learned = row['learned']
+            remaining = goal - learned
+            items.append((
+                row['telegram_id'], 'kelime_hedef', row['local_date'],
+                f"🇬🇧 *İNGİLİZCE: Günlük Hedef Hatırlatması*\n\n"
+                f"🎯 Günlük Hedef: {goal} kelime\n"
+                f"✅ Öğrenilen: {learned} kelime\n"
+                f"⏳ Kalan: **{remaining} kelime**\n\n"
+                f"Gün bitmeden hedefini tamamla! 💪\n"
+                f"`/ingilizce` modülüne geç!"
+            ))
+
+        await _notify("Günlük hedef hatırlatma", items, DAILY_TTL_MINUTES)
 
+    except Exception as e:
+        logger.error(f"Günlük hedef hatırlatma genel hata: {e}")
+
+
+# ==================== NOT DEFTERİ MODÜLÜ HATIRLATMALARI ====================
+
+async def daily_journal_reminder(clocks: list = None, users: Collection[int] = None,
+                                 exclude: Collection[int] = ()):
+    """NOT DEFTERİ HATIRLATMA: Günlük yazma - Her gün JOURNAL_REMINDER_TIME (sadece yazmayanlar)"""
+    if not bot_application:
+        return
+    
     try:
-        conn = sqlite3.connect(ingilizce_db)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
+        # Saati gelen ve bugün günlük yazmamış kullanıcılar
+        rows = await module_queries.aio.get_users_without_journal(
+            JOURNAL_REMINDER_TIME, clocks=clocks, users=users, exclude=exclude
+        )
+        
+        message = (
+            f"📔 *NOT DEFTERİ HATIRLATMA: Günlük Zamanı!*\n\n"
+            f"🌙 Bugün henüz günlük yazmadın.\n\n"
+            f"Günlüğünü yazmak için `/notdefteri` modülüne geç:\n"
+            f"• 'Günlük kategorisinde not: Bugün...'\n\n"
+            f"💭 Bugünü değerlendir, düşüncelerini paylaş!"
+        )
+        await _notify(
+            "Günlük hatırlatma",
+            [(row['telegram_id'], 'gunluk', row['local_date'], message) for row in rows],
+            DAILY_TTL_MINUTES
+        )
+        
+    except Exception as e:
+        logger.error(f"Günlük hatırlatma genel hata: {e}")
 
-        users = database.get_all_users()
 
-        for user in users:
-            user_tz = user.get('timezone', TIMEZONE)
-            user_now = time_utils.get_user_now(user_tz)
-            
-            if user_now.hour != 20 or user_now.minute != 0:
-                continue
+# ==================== ANA TİK ====================
 
-            user_tg_id = user['telegram_id']
-            today_str = user_now.date().isoformat()
-
-            cursor.execute("""
-                SELECT gunluk_kelime_sayisi FROM daily_goals
-                WHERE user_id = ?
-                ORDER BY created_at DESC LIMIT 1
-            """, (user_tg_id,))
-
-            goal_result = cursor.fetchone()
-
-            if goal_result:
-                goal = goal_result['gunluk_kelime_sayisi']
-
-                # Bugün öğrenilen kelime sayısı
-                cursor.execute("""
-                    SELECT COUNT(*) as count FROM words
-                    WHERE user_id = ? AND DATE(learn_date) = ?
-                """, (user_tg_id, today_str))
-
-                learned = cursor.fetchone()['count']
-
-                if learned < goal:
-                    remaining = goal - learned
-                    try:
-                        await bot_application.bot.send_message(
-                            chat_id=user_tg_id,
-                            text=f"🇬🇧 *İNGİLİZCE: Günlük Hedef Hatırlatması*\n\n"
-                                 f"🎯 Günlük Hedef: {goal} kelime\n"
-                                 f"✅ Öğrenilen: {learned} kelime\n"
-                                 f"⏳ Kalan: **{remaining} kelime**\n\n"
-                                 f"Gün bitmeden hedefini tamamla! 💪\n"
-                                 f"`/ingilizce` modülüne geç!",
-                            parse_mode='Markdown'
-                        )
-                        logger.info(f"Günlük hedef hatırlatma gönderildi: {user_tg_id}")
-                    except Exception as e:
-                        logger.error(f"Günlük hedef hatırlatma hatası: {e}")
-
-        conn.close()
+# Yerel saate bağlı tetikleyiciler:
+# (isim, predicate(yerel_zaman), handler(clocks, users, exclude), lead_minutes, catch_up_minutes, kind)
+_local_triggers: List[Tuple[str, Callable[[datetime], bool], Callable[..., Awaitable[None]], int, int, Optional[str]]] = []
+
+_tick_stats = {'ticks': 0, 'dispatches': 0, 'replayed_minutes': 0}
+
+# Son işlenen dakika scheduler_state'te saklanır; kaçırılan dakikalar en fazla bu kadar geriye oynatılır
+TICK_STATE_KEY = 'master_tick'
+MAX_CATCH_UP_MINUTES = DAILY_TTL_MINUTES
+
+
+def register_local_trigger(name: str, predicate: Callable[[datetime], bool],
+                           handler: Callable[..., Awaitable[None]], lead_minutes: int = 0,
+                           catch_up_minutes: int = 0, kind: str = None):
+    """Ana tikte, yerel zamanı predicate'i sağlayan timezone'lar için handler(clocks) çağrılsın
+
+    clocks: module_queries.local_clock satırları (lead_minutes sonrasına göre).
+    catch_up_minutes: tik gecikirse / bot kapalıyken kaçırılan dakika en fazla bu kadar
+    geç çalıştırılır (handler'lar bildirim kuyruğuna yazdığı için tekrar gönderim olmaz).
+    kind: database.NOTIFICATION_TYPES türü. Verilirse predicate varsayılan saattir ve
+    handler(clocks, exclude=...) modülü susturan / kendi saatini seçen kullanıcıları atlar;
+    kendi saati gelenler ayrıca handler(clocks, users=...) ile çalışır.
+    """
+    _local_triggers.append((name, predicate, handler, lead_minutes, catch_up_minutes, kind))
+
+
+def at_local_time(hhmm: str) -> Callable[[datetime], bool]:
+    """Yerel saati tam olarak HH:MM olan timezone'ları seç"""
+    hour, minute = map(int, hhmm.split(':'))
+    return lambda local_now: local_now.hour == hour and local_now.minute == minute
+
+
+async def _run_trigger(name: str, handler: Callable[..., Awaitable[None]], clocks: list, **audience):
+    try:
+        await handler(clocks, **audience)
+    except Exception:
+        # Tik diğer tetikleyicilerle devam eder; hata yığın iziyle görünür kalır
+        logger.exception(f"Tetikleyici hatası ({name})")
+
+
+async def _pending_minutes(now: datetime) -> List[datetime]:
+    """Bu tikte işlenecek dakikalar: son işlenen dakikadan sonrası, şimdi dahil"""
+    try:
+        last = await database.aio.get_scheduler_state(TICK_STATE_KEY)
     except Exception as e:
-        logger.error(f"Günlük hedef hatırlatma genel hata: {e}")
+        logger.error(f"Son tik okunamadı: {e}")
+        last = None
+    
+    if not last:
+        return [now]
+    
+    start = max(time_utils.from_utc_str(last) + timedelta(minutes=1),
+                now - timedelta(minutes=MAX_CATCH_UP_MINUTES))
+    count = int((now - start).total_seconds() // 60) + 1
+    return [start + timedelta(minutes=i) for i in range(count)]  # aynı dakikada ikinci tik: boş
 
 
-# ==================== NOT DEFTERİ MODÜLÜ HATIRLATMALARI ====================
+async def master_tick(now: datetime = None):
+    """Dakikada bir: timezone'ları yerel dakikaya göre grupla, sadece saati gelen tetikleyicileri çalıştır
 
-async def daily_journal_reminder():
-    """NOT DEFTERİ HATIRLATMA: Günlük yazma - Her gün 21:30 (sadece yazmayanlar)"""
+    Kullanıcılar yerine timezone'lar dolaşılır; modül sorguları yalnızca en az bir
+    timezone eşleştiğinde, o timezone'lardaki kullanıcılar için çalışır. Kendi bildirim
+    saatini seçen kullanıcılar bellekteki (timezone, yerel dakika) indeksinden bulunur.
+    Geciken tik veya yeniden başlatma yüzünden kaçırılan dakikalar, tetikleyicinin
+    catch_up_minutes penceresi içindeyse yeniden oynatılır.
+    """
     if not bot_application:
         return
     
-    import sqlite3
-    notdefteri_db = os.path.join(os.path.dirname(__file__), 'modules', 'notdefteri', 'notdefteri.db')
+    if now is None:
+        now = datetime.now(pytz.utc)
+    now = now.replace(second=0, microsecond=0)
     
     try:
-        conn = sqlite3.connect(notdefteri_db)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
+        # timezone -> kullanıcı indeksi bellekte; kullanıcı sayısından bağımsız
+        timezones = await database.aio.get_user_timezones()
+        slots, exclusions = await database.aio.get_notification_schedule()
+    except Exception as e:
+        logger.error(f"Timezone listesi / bildirim tercihleri alınamadı: {e}")
+        return
+    
+    minutes = await _pending_minutes(now)
+    
+    jobs = []
+    for minute in minutes:
+        late = int((now - minute).total_seconds() // 60)
+        triggers = [t for t in _local_triggers if t[4] >= late]
+        if not triggers:
+            continue
         
-        users = database.get_all_users()
+        # Aynı yerel dakikayı paylaşan timezone'lar (ör. Europe/Istanbul, Europe/Moscow) bir grup
+        groups = {}
+        for tz in timezones:
+            local_now = minute.astimezone(time_utils.get_timezone(tz))
+            groups.setdefault(local_now.replace(tzinfo=None), []).append((tz, local_now))
         
-        for user in users:
-            user_tz = user.get('timezone', TIMEZONE)
-            user_now = time_utils.get_user_now(user_tz)
-            
-            if user_now.hour != 21 or user_now.minute != 30:
+        for name, predicate, handler, lead_minutes, _, kind in triggers:
+            clocks = [
+                module_queries.local_clock(tz, local_now, lead_minutes)
+                for members in groups.values() if predicate(members[0][1])
+                for tz, local_now in members
+            ]
+            if not kind:
+                if clocks:
+                    jobs.append(_run_trigger(name, handler, clocks))
                 continue
-
-            user_tg_id = user['telegram_id']
-            today_str = user_now.date().isoformat()
-            
-            # Bugün günlük yazdı mı kontrol et
-            cursor.execute("""
-                SELECT COUNT(*) as count FROM notes
-                WHERE user_id = ? 
-                AND kategori_path LIKE '%Günlük%'
-                AND DATE(created_at) = ?
-            """, (user_tg_id, today_str))
             
-            result = cursor.fetchone()
+            if clocks:
+                jobs.append(_run_trigger(name, handler, clocks, exclude=exclusions[kind]))
             
-            # Eğer bugün günlük yazmadıysa hatırlat
-            if result and result['count'] == 0:
-                try:
-                    await bot_application.bot.send_message(
-                        chat_id=user_tg_id,
-                        text=f"📔 *NOT DEFTERİ HATIRLATMA: Günlük Zamanı!*\n\n"
-                             f"🌙 Bugün henüz günlük yazmadın.\n\n"
-                             f"Günlüğünü yazmak için `/notdefteri` modülüne geç:\n"
-                             f"• 'Günlük kategorisinde not: Bugün...'\n\n"
-                             f"💭 Bugünü değerlendir, düşüncelerini paylaş!",
-                        parse_mode='Markdown'
-                    )
-                    logger.info(f"Günlük hatırlatma gönderildi: {user_tg_id}")
-                except Exception as e:
-                    logger.error(f"Günlük hatırlatma hatası (user {user_tg_id}): {e}")
-        
-        conn.close()
+            # Kendi saati bu yerel dakikaya denk gelenler (bir kullanıcı tek timezone'dadır)
+            custom_clocks, users = [], set()
+            for members in groups.values():
+                for tz, local_now in members:
+                    ids = slots.get((tz, local_now.hour * 60 + local_now.minute), {}).get(kind)
+                    if ids:
+                        custom_clocks.append(module_queries.local_clock(tz, local_now, lead_minutes))
+                        users |= ids
+            if users:
+                jobs.append(_run_trigger(name, handler, custom_clocks, users=users))
+    
+    _tick_stats['ticks'] += 1
+    _tick_stats['replayed_minutes'] += max(0, len(minutes) - 1)
+    _tick_stats['dispatches'] += len(jobs)
+    await asyncio.gather(*jobs)
+    
+    if minutes:
+        try:
+            await database.aio.set_scheduler_state(TICK_STATE_KEY, time_utils.to_utc_str(now))
+        except Exception as e:
+            logger.error(f"Son tik kaydedilemedi: {e}")
+
+
+register_local_trigger(
+    'hourly_habit_check',
+    lambda t: t.minute == 0 and not database.is_quiet_hour(t.hour),
+    send_reminders,
+    catch_up_minutes=HOURLY_TTL_MINUTES,
+    kind='habits'
+)
+# Ders saatleri herhangi bir dakika olabilir (09:25 gibi): yerel saat 7-22 arasında
+# her dakika program indeksine bakılır
+register_local_trigger('lesson_start', lambda t: 7 <= t.hour <= 22, lesson_start_reminder,
+                       lead_minutes=LESSON_REMINDER_LEAD_MINUTES, catch_up_minutes=LESSON_TTL_MINUTES,
+                       kind='lessons')
+register_local_trigger('hw_deadline', at_local_time(HOMEWORK_REMINDER_TIME), homework_deadline_reminder,
+                       catch_up_minutes=DAILY_TTL_MINUTES, kind='homework')
+register_local_trigger('vocab_review', at_local_time(VOCAB_REMINDER_TIME), vocabulary_review_reminder,
+                       catch_up_minutes=DAILY_TTL_MINUTES, kind='vocab')
+register_local_trigger('word_goal', at_local_time(WORD_GOAL_REMINDER_TIME), daily_word_goal_reminder,
+                       catch_up_minutes=DAILY_TTL_MINUTES, kind='goal')
+register_local_trigger('journal_rem', at_local_time(JOURNAL_REMINDER_TIME), daily_journal_reminder,
+                       catch_up_minutes=DAILY_TTL_MINUTES, kind='journal')
+
+
+# ==================== BAKIM İŞLERİ ====================
+
+# Konuşma tamponunun veritabanına yazılma aralığı (saniye)
+CONVERSATION_FLUSH_SECONDS = 5
+
+
+async def flush_conversation_history():
+    """Bellekteki konuşma mesajlarını veritabanına toplu yaz"""
+    try:
+        await database.aio.flush_conversation_messages()
     except Exception as e:
-        logger.error(f"Günlük hatırlatma genel hata: {e}")
+        logger.error(f"Konuşma geçmişi yazılamadı: {e}")
+
+
+async def trim_conversation_history():
+    """Konuşma geçmişini tüm kullanıcılar için tek seferde kırp (son 20 mesaj kalır)"""
+    try:
+        await database.aio.flush_conversation_messages()
+        deleted = await database.aio.trim_conversation_history()
+        if deleted:
+            logger.info(f"Konuşma geçmişi kırpıldı: {deleted} mesaj silindi")
+    except Exception as e:
+        logger.error(f"Konuşma geçmişi kırpılamadı: {e}")
 
 
 def start_scheduler():
@@ -471,54 +805,41 @@ def start_scheduler():
     
     logger.info(f"Zamanlayıcı başlatılıyor. Server Timezone: {TIMEZONE}")
 
-    # Not: CronTrigger'ları "her dakika" çalışacak şekilde ayarlıyoruz.
-    # Çünkü her kullanıcının saati farklı olabilir, bu yüzden dakikada bir kontrol edip
-    # "Kullanıcının saati X mi?" diye bakmamız lazım.
-    
-    # 1. Her Dakika Kontrol Edilecekler
-    # - Alışkanlıklar (Saat başı mı kontrol edeceğiz? Evet, kullanıcının saat başıysa)
-    # - Dersler (15 dk bir) -> Dakikalık kontrolde (dk % 15 == 0) bakılabilir
-    # - Kullanıcı hatırlatmaları (Tam saatinde)
-    # - Diğer günlük hatırlatmalar (Belirli saatlerde)
-
-    # Performans için: Tek bir "master" job her dakika çalışıp hepsini tetikleyebilir.
-    # Ama APScheduler ile ayrı joblar daha temiz.
-    
-    # Her dakika çalışıp, kullanıcının saatine göre işlem yapacak ana döngüler
+    # Kullanıcı hatırlatmaları: sıradaki hatırlatmanın saniyesine kadar uyuyan dağıtıcı
+    reminders_dispatcher.start()
     
+    # Yerel saate bağlı tüm modül hatırlatmaları tek bir dakikalık tikten dağıtılır
+    # (tetikleyiciler register_local_trigger ile kaydedilir)
+    # İlk tik hemen: bot kapalıyken kaçırılan dakikalar beklemeden yakalanır
     scheduler.add_job(
-        check_user_reminders,
-        CronTrigger(minute='*'), # Her dakika
-        id='user_reminders',
-        replace_existing=True
+        master_tick,
+        CronTrigger(minute='*'),
+        id='master_tick',
+        replace_existing=True,
+        next_run_time=datetime.now(pytz.utc)
     )
-    
+
+    # Bildirim kuyruğu kendi döngüsünde gönderilir (yeni bildirimler, yeniden denemeler
+    # ve önceki çalışmadan kalan bekleyenler); tik ve dağıtıcı gönderimi beklemez
+    start_delivery()
     scheduler.add_job(
-        send_reminders,
-        CronTrigger(minute='0'), # Her saat başı
-        id='hourly_habit_check',
+        purge_notification_outbox,
+        CronTrigger(hour=4, minute=15),
+        id='outbox_purge',
         replace_existing=True
     )
 
+    # Konuşma geçmişi: birkaç saniyede bir toplu yazma, saatte bir toplu kırpma
     scheduler.add_job(
-        lesson_start_reminder,
-        args=[],
-        trigger=CronTrigger(minute='0,15,30,45'),
-        id='lesson_start',
+        flush_conversation_history,
+        IntervalTrigger(seconds=CONVERSATION_FLUSH_SECONDS),
+        id='conversation_flush',
         replace_existing=True
     )
-
-    # Günlük modül hatırlatmaları için dakikalık kontrol (sadece saati gelenlere atacak)
-    scheduler.add_job(homework_deadline_reminder, CronTrigger(minute='*'), id='hw_deadline', replace_existing=True)
-    scheduler.add_job(vocabulary_review_reminder, CronTrigger(minute='*'), id='vocab_review', replace_existing=True)
-    scheduler.add_job(daily_word_goal_reminder, CronTrigger(minute='*'), id='word_goal', replace_existing=True)
-    scheduler.add_job(daily_journal_reminder, CronTrigger(minute='*'), id='journal_rem', replace_existing=True)
-
-    # Gece yarısı reset (UTC 00:00'da çalışsa da olur, ama user bazlı değil global reset. Sorun olmaz)
     scheduler.add_job(
-        reset_recurring_reminders,
-        CronTrigger(hour=0, minute=0),
-        id='reset_reminders',
+        trim_conversation_history,
+        CronTrigger(minute=30),
+        id='conversation_trim',
         replace_existing=True
     )
 
@@ -527,5 +848,8 @@ def start_scheduler():
 
 
 def stop_scheduler():
+    reminders_dispatcher.stop()
+    stop_delivery()
+    notifications.stop()
     scheduler.shutdown()
     logger.info("⏰ Hatırlatma zamanlayıcısı durduruldu")
@@ -0,0 +1,523 @@
+"""
+Ortak SQLite çalışma zamanı
+Tüm veritabanları (asistan + modüller) için thread başına havuzlanmış bağlantılar
+"""
+import asyncio
+import functools
+import logging
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+
+# PRAGMA ayarları - her bağlantı açılışında bir kez uygulanır
+JOURNAL_MODE = "WAL"
+SYNCHRONOUS = "NORMAL"
+CACHE_SIZE_KB = 8192          # Bağlantı başına sayfa önbelleği (KB)
+MMAP_SIZE = 64 * 1024 * 1024  # 64 MB memory-mapped I/O
+BUSY_TIMEOUT_MS = 5000
+
+# sqlite3 modülünün bağlantı başına hazırlanmış ifade (prepared statement) önbelleği
+STATEMENT_CACHE_SIZE = 256
+
+# Sorguları event loop dışında çalıştıran thread sayısı
+EXECUTOR_WORKERS = 4
+
+# Grup commit: bir transaction'da en fazla bu kadar yazma.
+# İlk yazmadan sonra diğerleri için bu kadar beklenir; 0 ise yalnızca önceki commit
+# sürerken kuyrukta birikenler alınır (synchronous=NORMAL'da commit ucuz, beklemek gecikme ekler)
+WRITE_BATCH_SIZE = 256
+WRITE_MAX_DELAY_MS = 0
+
+# Yeni açılan her bağlantıya uygulanacak ek kurulum fonksiyonları
+_connection_hooks: List[Callable[[sqlite3.Connection], None]] = []
+
+# Kayıtlı veritabanları (isim -> Database)
+_databases: Dict[str, "Database"] = {}
+_registry_lock = threading.Lock()
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+# Grup yazıcıda çalışan fonksiyonun commit sonrası işlemleri (yazıcı thread'ine ait)
+_commit_callbacks = threading.local()
+
+logger = logging.getLogger(__name__)
+
+
+def _open_connection(path: str) -> sqlite3.Connection:
+    """Yeni bağlantı aç ve PRAGMA ayarlarını uygula"""
+    conn = sqlite3.connect(
+        path,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        cached_statements=STATEMENT_CACHE_SIZE,
+        check_same_thread=False
+    )
+    conn.row_factory = sqlite3.Row
+
+    conn.execute(f"PRAGMA journal_mode = {JOURNAL_MODE}")
+    conn.execute(f"PRAGMA synchronous = {SYNCHRONOUS}")
+    conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+
+    for hook in _connection_hooks:
+        hook(conn)
+
+    return conn
+
+
+class Database:
+    """Tek bir SQLite dosyası için thread başına bağlantı havuzu"""
+
+    def __init__(self, name: str, path: str):
+        self.name = name
+        self.path = path
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self._writer: Optional["GroupCommitWriter"] = None
+
+    def connection(self) -> sqlite3.Connection:
+        """Bu thread'e ait bağlantıyı getir (yoksa aç)
+
+        Bağlantılar kapatılmaz, sonraki çağrılarda yeniden kullanılır.
+        Yazma işlemleri `with conn:` bloğunda yapılmalı; blok hata olursa
+        rollback yapar. Çıplak `conn.commit()` ile yazıp arada hata alan
+        bağlantı yazma kilidini tutmaya devam eder ve diğer thread'ler
+        "database is locked" alır.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._open()
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def _open(self) -> sqlite3.Connection:
+        return _open_connection(self.path)
+
+    def rollback_open_transaction(self) -> bool:
+        """Bu thread'in bağlantısında açık kalmış transaction varsa geri al"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or not conn.in_transaction:
+            return False
+        try:
+            conn.rollback()
+        except sqlite3.Error as e:
+            logger.error(f"Açık transaction geri alınamadı ({self.name}): {e}")
+        return True
+
+    def writer(self) -> "GroupCommitWriter":
+        """Bu veritabanının grup commit yazıcısı (ilk çağrıda oluşturulur)"""
+        if self._writer is None:
+            with self._lock:
+                if self._writer is None:
+                    self._writer = GroupCommitWriter(self)
+        return self._writer
+
+    def close(self):
+        """Bu veritabanına ait tüm havuzlanmış bağlantıları kapat"""
+        if self._writer is not None:
+            self._writer.stop()
+        with self._lock:
+            connections = self._connections
+            self._connections = []
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        self._local = threading.local()
+
+
+class AttachedDatabase(Database):
+    """Ana veritabanına diğer veritabanlarını ATTACH eden bağlantı havuzu
+
+    Modüller arası sorgular tek bağlantıda, şema adıyla yazılır:
+    `SELECT ... FROM main.users u JOIN ders.homeworks h ON h.user_id = u.telegram_id`
+    """
+
+    def __init__(self, name: str, main: Database, attached: List[Database]):
+        super().__init__(name, main.path)
+        self.attached = attached
+
+    def _open(self) -> sqlite3.Connection:
+        conn = _open_connection(self.path)
+        for db in self.attached:
+            conn.execute(f"ATTACH DATABASE ? AS {db.name}", (db.path,))
+        return conn
+
+
+def register(name: str, path: str) -> Database:
+    """Veritabanını kaydet (aynı isimle tekrar çağrılırsa mevcut olanı döndür)"""
+    with _registry_lock:
+        db = _databases.get(name)
+        if db is None:
+            db = Database(name, path)
+            _databases[name] = db
+        return db
+
+
+def get_database(name: str) -> Database:
+    """Kayıtlı veritabanını isme göre getir"""
+    return _databases[name]
+
+
+def register_attached(name: str, main: str, attached: Sequence[str]) -> AttachedDatabase:
+    """Kayıtlı veritabanlarını tek bağlantıda birleştiren havuzu kaydet"""
+    with _registry_lock:
+        db = _databases.get(name)
+        if db is None:
+            db = AttachedDatabase(
+                name,
+                _databases[main],
+                [_databases[other] for other in attached]
+            )
+            _databases[name] = db
+        return db
+
+
+def add_connection_hook(hook: Callable[[sqlite3.Connection], None]):
+    """Yeni açılacak tüm bağlantılara uygulanacak kurulum fonksiyonu ekle"""
+    _connection_hooks.append(hook)
+
+
+def close_all():
+    """Tüm kayıtlı veritabanlarının bağlantılarını kapat"""
+    for db in list(_databases.values()):
+        db.close()
+
+
+# ==================== GRUP COMMIT YAZICI ====================
+
+class GroupCommitWriter:
+    """Bir veritabanına yapılan küçük yazmaları tek transaction'da birleştiren yazıcı thread'i
+
+    Yazma fonksiyonları kuyruğa atılır; yazıcı kuyrukta biriken (ve WRITE_MAX_DELAY_MS
+    içinde gelen) yazmaları, en fazla WRITE_BATCH_SIZE, tek BEGIN IMMEDIATE ... COMMIT içinde çalıştırır ve
+    her birinin Future'ını commit'ten sonra tamamlar. Böylece fsync sayısı düşer
+    ve zamanlayıcı ile handler'lar aynı dosya kilidi için yarışmaz.
+
+    Fonksiyonlar yazıcı thread'inde çalışır; get_connection() yazıcının bağlantısını
+    döndürür. Fonksiyonlar commit/rollback yapmamalıdır. Her fonksiyon kendi
+    SAVEPOINT'inde çalışır, hata veren yalnızca kendi değişikliklerini geri alır.
+    Bellekteki indeks gibi yan etkiler after_commit() ile commit sonrasına bırakılır.
+    """
+
+    def __init__(self, db: "Database", batch_size: int = None, max_delay_ms: float = None):
+        self.db = db
+        self.batch_size = batch_size or WRITE_BATCH_SIZE
+        self.max_delay = (max_delay_ms if max_delay_ms is not None else WRITE_MAX_DELAY_MS) / 1000
+        self.stats = {'transactions': 0, 'operations': 0}
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self._run,
+                        name=f"db-writer-{self.db.name}",
+                        daemon=True
+                    )
+                    self._thread.start()
+
+    def submit(self, func: Callable[..., Any], *args, **kwargs) -> Future:
+        """Yazmayı kuyruğa at; Future transaction commit edilince sonuçlanır"""
+        if threading.current_thread() is self._thread:
+            # Yazıcının içinden çağrıldı (iç içe yazma): mevcut transaction'da çalıştır
+            future = Future()
+            try:
+                future.set_result(func(*args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+            return future
+
+        self._ensure_started()
+        future = Future()
+        self._queue.put((func, args, kwargs, future))
+        return future
+
+    def execute(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Yazmayı kuyruğa at ve commit edilene kadar bekle"""
+        return self.submit(func, *args, **kwargs).result()
+
+    def stop(self):
+        """Kuyruktakileri yazıp thread'i durdur"""
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            self._queue.put(None)
+            thread.join()
+        self._thread = None
+
+    def _run(self):
+        running = True
+        while running:
+            item = self._queue.get()
+            if item is None:
+                break
+
+            batch = [item]
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    running = False
+                    break
+                batch.append(item)
+
+            self._commit(batch)
+
+    def _commit(self, batch: list):
+        conn = self.db.connection()
+        outcomes = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for func, args, kwargs, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                conn.execute("SAVEPOINT grup_yazma")
+                _commit_callbacks.pending = callbacks = []
+                try:
+                    result = func(*args, **kwargs)
+                except Exception as e:
+                    conn.execute("ROLLBACK TO grup_yazma")
+                    conn.execute("RELEASE grup_yazma")
+                    outcomes.append((future, None, e, ()))
+                else:
+                    conn.execute("RELEASE grup_yazma")
+                    outcomes.append((future, result, None, callbacks))
+                finally:
+                    _commit_callbacks.pending = None
+            conn.commit()
+        except Exception as e:
+            # BEGIN/COMMIT başarısız: transaction'daki hiçbir yazma kalıcı değil
+            logger.error(f"Grup commit başarısız ({self.db.name}, {len(batch)} yazma): {e}")
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                pass
+            for _, _, _, future in batch:
+                if future.running() or (not future.done() and future.set_running_or_notify_cancel()):
+                    future.set_exception(e)
+            return
+
+        self.stats['transactions'] += 1
+        self.stats['operations'] += len(outcomes)
+        for future, result, error, callbacks in outcomes:
+            # Yan etkiler, çağıran sonucu görmeden önce uygulanır
+            for callback in callbacks:
+                try:
+                    callback()
+                except Exception as e:
+                    logger.error(f"Commit sonrası işlem hatası ({self.db.name}): {e}")
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+
+def after_commit(callback: Callable[[], Any]):
+    """Grup yazma fonksiyonunun içinden: callback'i yazma commit edildikten sonra çalıştır
+
+    Yazma geri alınırsa (fonksiyon hata verir ya da commit başarısız olur) çalışmaz.
+    Grup yazıcı dışında çağrılırsa hemen çalışır.
+    """
+    pending = getattr(_commit_callbacks, 'pending', None)
+    if pending is None:
+        callback()
+    else:
+        pending.append(callback)
+
+
+def group_write(db: "Database"):
+    """Fonksiyonu veritabanının grup commit yazıcısında çalıştıran dekoratör
+
+    Fonksiyon commit etmez; çağıran taraf commit'e kadar bekler ve sonucu alır.
+    `fonksiyon.submit(...)` beklemeden Future döndürür; AsyncFacade bunu
+    executor thread'i harcamadan await eder.
+    """
+    def decorator(func: Callable[..., Any]) -> Callable[..., Any]:
+        @functools.wraps(func)
+        def call(*args, **kwargs):
+            return db.writer().execute(func, *args, **kwargs)
+
+        call.submit = lambda *args, **kwargs: db.writer().submit(func, *args, **kwargs)
+        return call
+    return decorator
+
+
+# ==================== ŞEMA MİGRASYONLARI ====================
+
+# (versiyon, açıklama, adım) - adım bir SQL betiği ya da cursor alan fonksiyon olabilir
+Migration = Tuple[int, str, Union[str, Callable[[sqlite3.Cursor], None]]]
+
+
+def _split_statements(script: str) -> List[str]:
+    """SQL betiğini tek tek ifadelere böl (trigger gövdelerindeki ';' korunur)"""
+    statements = []
+    buffer = ""
+    for line in script.splitlines(keepends=True):
+        buffer += line
+        if sqlite3.complete_statement(buffer):
+            if buffer.strip():
+                statements.append(buffer.strip())
+            buffer = ""
+    if buffer.strip():
+        statements.append(buffer.strip())
+    return statements
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """Veritabanına uygulanmış en son migrasyon versiyonu"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+
+def migrate(conn: sqlite3.Connection, migrations: Sequence[Migration]) -> int:
+    """Henüz uygulanmamış migrasyonları sırayla uygula
+
+    Her migrasyon kendi transaction'ında çalışır; hata olursa o migrasyon
+    geri alınır ve hata yukarı fırlatılır. Uygulanan versiyon döndürülür.
+    """
+    current = get_schema_version(conn)
+    conn.commit()
+
+    for version, description, step in sorted(migrations, key=lambda m: m[0]):
+        if version <= current:
+            continue
+
+        cursor = conn.cursor()
+        try:
+            cursor.execute("BEGIN")
+            if callable(step):
+                step(cursor)
+            else:
+                for statement in _split_statements(step):
+                    cursor.execute(statement)
+            cursor.execute(
+                "INSERT INTO schema_version (version, description) VALUES (?, ?)",
+                (version, description)
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        current = version
+
+    return current
+
+
+def column_exists(cursor: sqlite3.Cursor, table: str, column: str) -> bool:
+    """Tabloda kolon var mı kontrol et"""
+    cursor.execute(f"PRAGMA table_info({table})")
+    return any(row[1] == column for row in cursor.fetchall())
+
+
+def add_column(cursor: sqlite3.Cursor, table: str, column: str, definition: str):
+    """Kolon yoksa ekle (eski veritabanları için)"""
+    if not column_exists(cursor, table, column):
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+# ==================== ASYNC ERİŞİM ====================
+
+def get_executor() -> ThreadPoolExecutor:
+    """Veritabanı sorgularına ayrılmış thread havuzunu getir"""
+    global _executor
+    if _executor is None:
+        with _registry_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=EXECUTOR_WORKERS,
+                    thread_name_prefix="db"
+                )
+    return _executor
+
+
+def rollback_open_transactions():
+    """Bu thread'in tüm havuz bağlantılarında açık kalmış transaction'ları geri al
+
+    Hata veren bir yazma commit'e ulaşamadıysa bağlantı yazma kilidini
+    tutmaya devam eder; bağlantı havuza dönmeden önce kilit bırakılır.
+    """
+    for db in list(_databases.values()):
+        if db.rollback_open_transaction():
+            logger.warning(f"Hata sonrası açık kalan transaction geri alındı ({db.name})")
+
+
+def _call(func: Callable[..., Any], *args, **kwargs) -> Any:
+    try:
+        return func(*args, **kwargs)
+    except BaseException:
+        rollback_open_transactions()
+        raise
+
+
+async def run(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """Senkron veritabanı fonksiyonunu event loop'u bloklamadan çalıştır
+
+    Fonksiyon hata verirse thread'in bağlantılarında açık kalan transaction geri alınır.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), functools.partial(_call, func, *args, **kwargs))
+
+
+class AsyncFacade:
+    """Bir veritabanı modülünün fonksiyonlarını awaitable olarak sunar
+
+    Örnek: `await database.aio.get_user_habits(user_id)`
+    Fonksiyon modülden çağrı anında çözülür, bu yüzden modülün en başında
+    oluşturulabilir.
+    """
+
+    def __init__(self, module_name: str):
+        self._module_name = module_name
+
+    def __getattr__(self, name: str):
+        func = getattr(sys.modules[self._module_name], name)
+        if not callable(func):
+            return func
+
+        submit = getattr(func, 'submit', None)
+        if submit is not None:
+            # group_write fonksiyonu: doğrudan yazıcı kuyruğuna at
+            async def call(*args, **kwargs):
+                return await asyncio.wrap_future(submit(*args, **kwargs))
+        else:
+            async def call(*args, **kwargs):
+                return await run(func, *args, **kwargs)
+
+        call.__name__ = name
+        call.__doc__ = func.__doc__
+        self.__dict__[name] = call
+        return call
+
+
+def shutdown():
+    """Thread havuzunu durdur, bekleyen grup yazmaları bitir ve tüm bağlantıları kapat"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+    close_all()
@@ -0,0 +1,24 @@
+"""
+Testler gerçek veritabanı dosyalarına dokunmasın: modüller import edilirken şemalarını
+kurduğu için kayıtlar, hiçbir modül import edilmeden önce geçici dizine yönlendirilir.
+"""
+import os
+import shutil
+import tempfile
+
+import storage
+
+_TEST_DB_DIR = tempfile.mkdtemp(prefix="asistan-test-")
+_register = storage.register
+
+
+def _register_in_test_dir(name: str, path: str) -> storage.Database:
+    return _register(name, os.path.join(_TEST_DB_DIR, os.path.basename(path)))
+
+
+storage.register = _register_in_test_dir
+
+
+def pytest_sessionfinish(session, exitstatus):
+    storage.close_all()
+    shutil.rmtree(_TEST_DB_DIR, ignore_errors=True)
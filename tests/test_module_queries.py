@@ -0,0 +1,27 @@
+"""
+Modüller arası zamanlayıcı sorguları (veritabanları conftest ile geçici dizinde)
+"""
+from datetime import date, datetime
+
+import pytz
+
+import database
+import module_queries
+from modules.ders import database as ders_db
+
+
+def test_get_due_homeworks():
+    user = database.get_or_create_user(1001, 'ogrenci', 'Ali')
+    database.update_user_timezone(user['id'], 'Europe/Istanbul')
+    # 15:00 UTC = 18:00 İstanbul, 2026-10-17
+    now = pytz.utc.localize(datetime(2026, 10, 17, 15, 0))
+
+    ders_db.add_homework(1001, 'Üç gün kaldı', date(2026, 10, 20))
+    ders_db.add_homework(1001, 'Bugün teslim', date(2026, 10, 17))
+    ders_db.add_homework(1001, 'İki gün kaldı', date(2026, 10, 19))
+
+    rows = module_queries.get_due_homeworks('18:00', lead_days=[3, 1, 0], now=now)
+
+    assert [(r['baslik'], r['days_left']) for r in rows] == [('Bugün teslim', 0), ('Üç gün kaldı', 3)]
+    assert all(r['telegram_id'] == 1001 and r['today'] == '2026-10-17' for r in rows)
+    assert module_queries.get_due_homeworks('09:00', now=now) == []
@@ -0,0 +1,207 @@
+"""
+Metin yardımcıları - Türkçe normalizasyon ve isim eşleştirme
+Tüm modüller isim/başlık aramalarında buradaki fonksiyonları kullanır.
+"""
+import re
+from functools import lru_cache
+from typing import Iterable, List, Optional, Sequence, Tuple, TypeVar, Union
+
+
+K = TypeVar('K')
+
+# Eşleşme seviyeleri (büyük olan daha iyi, 0 = eşleşme yok)
+EXACT = 6        # Birebir aynı
+PREFIX = 5       # İsim aranan ifadeyle başlıyor
+CONTAINS = 4     # Aranan ifade ismin içinde geçiyor
+CONTAINED = 3    # İsim aranan ifadenin içinde geçiyor ("matematik dersi" -> "matematik")
+TOKEN = 2        # En az bir ortak kelime
+FUZZY = 1        # Yazım hatası toleransı (düzenleme mesafesi)
+NO_MATCH = 0
+
+# Bu uzunluğa kadar olan metinler önbelleğe alınır (isimler, başlıklar)
+CACHE_MAX_LENGTH = 128
+
+# Büyük/küçük harf ve Türkçe karakter dönüşümleri tek tabloda:
+# I/İ/ı/i -> i, Ğ/ğ -> g, Ü/ü -> u, Ş/ş -> s, Ö/ö -> o, Ç/ç -> c
+# (U+0307 birleşik nokta, "İ".lower() sonucunda kalan nokta, silinir)
+_TR_TABLE = str.maketrans({
+    'I': 'i', 'İ': 'i', 'ı': 'i',
+    'Ğ': 'g', 'ğ': 'g',
+    'Ü': 'u', 'ü': 'u',
+    'Ş': 's', 'ş': 's',
+    'Ö': 'o', 'ö': 'o',
+    'Ç': 'c', 'ç': 'c',
+    '\u0307': None,
+})
+
+
+def _normalize(text: str) -> str:
+    # Önce tablo (İ -> i), sonra casefold: casefold 'İ'yi 'i̇' yapardı
+    return text.translate(_TR_TABLE).casefold().strip()
+
+
+_normalize_cached = lru_cache(maxsize=4096)(_normalize)
+
+
+def normalize_turkish(text: Optional[str]) -> str:
+    """Türkçe karakterleri sadeleştir ve küçük harfe çevir
+
+    "İlaç Al" -> "ilac al", "ISLIK" -> "islik". Kısa metinler (isimler)
+    önbellekten döner; uzun metinler (not içerikleri) önbelleği doldurmaz.
+    """
+    if not text:
+        return ""
+    if len(text) <= CACHE_MAX_LENGTH:
+        return _normalize_cached(text)
+    return _normalize(text)
+
+
+def fold_same_length(text: str) -> str:
+    """normalize_turkish'in karakter sayısını koruyan hali (i. karakter i. karaktere karşılık gelir)
+
+    Normalize metinde bulunan eşleşmelerin orijinal metindeki yerini bulmak için.
+    """
+    folded = text.translate(_TR_TABLE).lower()
+    if len(folded) == len(text):
+        return folded
+    # Nadir durum: uzunluğu değişen bir karakter var, karakter karakter katla
+    return "".join((c.translate(_TR_TABLE).lower() or " ")[0] for c in text)
+
+
+def search_terms(query: str) -> List[str]:
+    """Sorgudaki normalize edilmiş kelimeler (noktalama ve '_' ayırıcı sayılır)"""
+    return re.findall(r"[^\W_]+", normalize_turkish(query))
+
+
+def snippet(text: str, terms: Sequence[str], width: int = 100, marker: str = "*") -> str:
+    """Metnin, aranan kelimelerin ilk geçtiği yer çevresindeki parçası
+
+    Kelime başında eşleşen yerler marker ile işaretlenir ("ilac" -> "*İlaçlar*").
+    terms normalize edilmiş olmalı (search_terms).
+    """
+    text = text or ""
+    if not terms:
+        return text[:width] + ("..." if len(text) > width else "")
+
+    folded = fold_same_length(text)
+    pattern = re.compile(r"\b(?:" + "|".join(re.escape(t) for t in terms) + r")\w*")
+    spans = [m.span() for m in pattern.finditer(folded)]
+    if not spans:
+        return text[:width] + ("..." if len(text) > width else "")
+
+    start = max(0, spans[0][0] - width // 3)
+    if start > 0:
+        # Kelimenin ortasından başlama
+        space = text.find(" ", start, spans[0][0])
+        start = space + 1 if space != -1 else start
+    end = min(len(text), start + width)
+
+    parts = ["..." if start > 0 else ""]
+    position = start
+    for span_start, span_end in spans:
+        if span_start >= end:
+            break
+        end = max(end, span_end)  # işaretli kelimeyi bölme
+        parts.append(text[position:span_start])
+        parts.append(f"{marker}{text[span_start:span_end]}{marker}")
+        position = span_end
+    parts.append(text[position:end])
+    parts.append("..." if end < len(text) else "")
+    return "".join(parts)
+
+
+def edit_distance(a: str, b: str, limit: int = None) -> int:
+    """Levenshtein mesafesi; limit aşılırsa limit + 1 döner (erken çıkış)"""
+    if a == b:
+        return 0
+    if len(a) < len(b):
+        a, b = b, a
+    if limit is None:
+        limit = len(a)
+    if len(a) - len(b) > limit:
+        return limit + 1
+
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (ca != cb)
+            ))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return min(previous[-1], limit + 1)
+
+
+def fuzzy_limit(query: str) -> int:
+    """Sorgu uzunluğuna göre kabul edilen en fazla yazım hatası (kısa sorgularda 0)"""
+    if len(query) < 4:
+        return 0
+    return max(1, len(query) // 5)
+
+
+def is_fuzzy_match(query: str, name: str) -> bool:
+    """Sorgu ismin tamamına veya bir kelimesine yazım hatası toleransıyla eşit mi?
+
+    İki taraf da normalize edilmiş olmalı.
+    """
+    limit = fuzzy_limit(query)
+    if not limit:
+        return False
+    if edit_distance(query, name, limit) <= limit:
+        return True
+    return any(edit_distance(query, token, limit) <= limit for token in name.split())
+
+
+def match_level(query: str, name: str) -> int:
+    """Normalize edilmiş sorgu ile isim arasındaki eşleşme seviyesi"""
+    if not query or not name:
+        return NO_MATCH
+    if query == name:
+        return EXACT
+    if name.startswith(query):
+        return PREFIX
+    if query in name:
+        return CONTAINS
+    if name in query:
+        return CONTAINED
+    if set(query.split()) & set(name.split()):
+        return TOKEN
+    if is_fuzzy_match(query, name):
+        return FUZZY
+    return NO_MATCH
+
+
+def rank_matches(query: str, candidates: Iterable[Tuple[K, Union[str, Sequence[str]]]],
+                 min_level: int = FUZZY) -> List[Tuple[K, int]]:
+    """Adayları (anahtar, seviye) olarak en iyi eşleşme önce gelecek şekilde sırala
+
+    candidates: [(anahtar, isim), ...] veya [(anahtar, [isim, kod, ...]), ...]
+    Bir anahtarın birden fazla ismi varsa en iyi seviyesi alınır.
+    Aynı seviyedekiler verilen sırayı korur.
+    """
+    query = normalize_turkish(query)
+    if not query:
+        return []
+
+    levels = {}
+    for key, names in candidates:
+        if isinstance(names, str):
+            names = (names,)
+        level = max((match_level(query, normalize_turkish(n)) for n in names), default=NO_MATCH)
+        if level >= min_level and level > levels.get(key, NO_MATCH):
+            levels[key] = level
+
+    ranked = list(levels.items())
+    ranked.sort(key=lambda r: -r[1])
+    return ranked
+
+
+def best_match(query: str, candidates: Iterable[Tuple[K, Union[str, Sequence[str]]]],
+               min_level: int = FUZZY) -> Optional[K]:
+    """En iyi eşleşen adayın anahtarı (yoksa None)"""
+    ranked = rank_matches(query, candidates, min_level)
+    return ranked[0][0] if ranked else None
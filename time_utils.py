@@ -3,11 +3,13 @@ Zaman ve Tarih Yardımcı Modülü
 Timezone ayarlı doğru zaman yönetimi için kullanılır.
 """
 from datetime import datetime, date, timedelta
+from functools import lru_cache
 import pytz
 from config import TIMEZONE
 
+@lru_cache(maxsize=512)
 def get_timezone(tz_name: str = None):
-    """Config'deki veya verilen timezone objesini döndür"""
+    """Config'deki veya verilen timezone objesini döndür (isim başına bir kez çözülür)"""
     try:
         return pytz.timezone(tz_name or TIMEZONE)
     except Exception:
@@ -44,3 +46,43 @@ def str_to_time(time_str: str) -> datetime:
         return now.replace(hour=hour, minute=minute, second=0, microsecond=0)
     except ValueError:
         return now
+
+# Veritabanında saklanan UTC anı biçimi (SQLite CURRENT_TIMESTAMP ile aynı, metin olarak sıralanır)
+UTC_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+def to_utc_str(moment: datetime) -> str:
+    """Timezone ayarlı datetime'ı UTC metnine çevir"""
+    return moment.astimezone(pytz.utc).strftime(UTC_FORMAT)
+
+def from_utc_str(text: str) -> datetime:
+    """Veritabanındaki UTC metnini timezone ayarlı datetime'a çevir"""
+    return pytz.utc.localize(datetime.strptime(text, UTC_FORMAT))
+
+def utc_now_str() -> str:
+    """Şimdiki UTC zamanını veritabanı biçiminde döndür"""
+    return datetime.now(pytz.utc).strftime(UTC_FORMAT)
+
+def next_fire_utc(remind_at: str, user_timezone: str = None, remind_date: str = None,
+                  after: datetime = None) -> str:
+    """Hatırlatmanın `after` anından (varsayılan: şimdi) sonraki ilk çalma anı, UTC metni
+
+    remind_at kullanıcının yerel saatidir (HH:MM veya HH:MM:SS). remind_date verilirse
+    o günün saati döner (geçmişte kalmış olsa bile); verilmezse yerel saatin
+    `after`dan sonraki ilk tekrarı. Yaz saati geçişlerinde pytz normalize eder.
+    """
+    tz = get_timezone(user_timezone)
+    if after is None:
+        after = datetime.now(pytz.utc)
+    parts = [int(p) for p in remind_at.split(':')]
+    hour, minute, second = (parts + [0, 0])[:3]
+
+    if remind_date:
+        day = date.fromisoformat(str(remind_date))
+    else:
+        day = after.astimezone(tz).date()
+
+    while True:
+        local = tz.normalize(tz.localize(datetime(day.year, day.month, day.day, hour, minute, second)))
+        if remind_date or local > after:
+            return to_utc_str(local)
+        day += timedelta(days=1)